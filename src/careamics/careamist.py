@@ -287,9 +287,10 @@ class CAREamist:
         Alternatively, the training data can be provided as arrays or paths.
 
         If `use_in_memory` is set to True, the source provided as Path or str will be
-        loaded in memory if it fits. Otherwise, training will be performed by loading
-        patches from the files one by one. Training on arrays is always performed
-        in memory.
+        loaded in memory if it fits in the memory budget (see `memory_budget_mb` in
+        the data configuration). Otherwise, as many files as the budget allows are kept
+        in memory and training will be performed by loading patches from the other
+        files one by one. Training on arrays is always performed in memory.
 
         If no validation source is provided, then the validation is extracted from
         the training data using `val_percentage` and `val_minimum_split`. In the case
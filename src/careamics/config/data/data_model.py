@@ -144,6 +144,108 @@ class DataConfig(BaseModel):
     val_dataloader_params: dict[str, Any] = Field(default={})
     """Dictionary of PyTorch validation dataloader parameters."""
 
+    in_memory_patching: Literal["array", "coordinates"] = "array"
+    """How patches are stored by the in-memory dataset. With "array", every patch is
+    extracted and stored in a single array. With "coordinates", only the images and a
+    compact array of patch coordinates are kept in memory, and the patches are sliced
+    from the images on the fly. The latter avoids duplicating the overlapping regions
+    of the patches."""
+
+    cache_patches: bool = False
+    """Whether to cache the patches and statistics computed from files on disk, in the
+    CAREamics home directory. Subsequent trainings on the same files, with the same
+    axes and patch size, then memory-map the cached arrays instead of reading and
+    patching the files again. The cache is invalidated if the files are modified."""
+
+    cache_max_size_mb: float = Field(default=10240, gt=0)
+    """Maximum size in MB of the patch cache. When a new entry exceeds it, the least
+    recently used entries are removed."""
+
+    num_loading_workers: int = Field(default=0, ge=0)
+    """Number of workers reading files in parallel when preparing an in-memory dataset
+    from files, or when computing the statistics of a dataset iterating over files.
+    Files are processed sequentially if 0 or 1."""
+
+    loading_pool: Literal["thread", "process"] = "thread"
+    """Type of pool used to read files in parallel. Threads are sufficient for readers
+    releasing the GIL (e.g. compressed TIFF), processes require a picklable read
+    function."""
+
+    prefetch_files: int = Field(default=0, ge=0)
+    """Number of files read ahead in a background thread by each worker of datasets
+    iterating over files, while the patches of the current file are yielded. Up to
+    `prefetch_files` additional decoded files are held in memory per worker. If 0,
+    files are read only when needed."""
+
+    shuffle_buffer_mb: float = Field(default=0, ge=0)
+    """Memory cap, in MB, of the buffer used by each worker of datasets iterating over
+    files to shuffle patches across consecutive files. Larger buffers span more files
+    and better decorrelate the batches. If 0, patches are yielded file by file."""
+
+    statistics_fraction: float = Field(default=1.0, gt=0, le=1)
+    """Fraction of the data, drawn at random, read to compute the normalization
+    statistics of datasets iterating over files: the files are subsampled first, then
+    the pages of the tiff files (e.g. along S, T or Z). For the next-generation
+    dataset, fraction of the regions of the lazily read image stacks (at most 64 per
+    stack) used to compute the statistics and the foreground indices. Values smaller
+    than 1 speed up the statistics computation on large datasets."""
+
+    memory_budget_mb: Optional[float] = Field(default=None, ge=0)
+    """Memory budget, in MB, for the decoded training files kept in memory. If the
+    decoded files, whose size is estimated from their headers, fit in the budget, the
+    in-memory dataset is used. Otherwise, as many files as the budget allows are kept
+    in memory and the others are read during training. If None, 80% of the available
+    RAM is used."""
+
+    storage_dtype: Literal["native", "float32", "float16"] = "native"
+    """Data type in which the patches (or images) are kept in memory by the in-memory
+    dataset, and in which the patches are extracted by datasets iterating over files.
+    With `native`, the data type of the data is kept (e.g. uint8 or uint16), with
+    `float16` the data is halved in size compared to float32. In all cases, patches
+    are cast to float32 when normalized, patch by patch, in the dataloader workers."""
+
+    shared_memory: bool = False
+    """Whether to keep the in-memory data (patches or images) in shared memory, so
+    that dataloader workers started with the spawn or forkserver methods receive a
+    handle to the data rather than a copy of it. The data is then held once in
+    memory, regardless of the number of workers."""
+
+    foreground_ratio: float = Field(default=0, ge=0, le=1)
+    """Expected fraction of the random training patches drawn among the patches
+    containing foreground, the others being drawn uniformly. The foreground patches
+    are found using a per-image index of the thresholded intensity. If 0, all patches
+    are drawn uniformly."""
+
+    foreground_threshold: Optional[float] = None
+    """Intensity above which pixels are considered foreground when `foreground_ratio`
+    is larger than 0. If None, the mean plus one standard deviation of each image is
+    used."""
+
+    device_transforms: bool = False
+    """Whether to apply the normalization and the random flips and rotations of the
+    training and validation patches to whole batches on the training device, in the
+    Lightning module, rather than to each patch in the dataloader workers. The
+    datasets then return the patches as they are read."""
+
+    use_next_gen_dataset: bool = False
+    """Whether to train on the next-generation map-style dataset, which extracts random
+    patches lazily from in-memory or memory-mapped image stacks and draws new patches
+    at every epoch. It replaces both the in-memory and the iterable datasets."""
+
+    patch_seed: Optional[int] = None
+    """Seed of the random patches drawn by the next-generation dataset. If None, a
+    random seed is drawn."""
+
+    chunk_aware_patching: bool = False
+    """Whether the next-generation dataset emits its random patches in runs of patches
+    sharing a chunk of the image stacks (e.g. zarr arrays), in a random order of the
+    chunks, so that each decoded chunk serves many patches before being evicted from
+    the chunk cache. The training dataloader then does not shuffle the patches, and
+    each run is read by a single dataloader worker, given the `batch_size` and the
+    `num_workers` of the `train_dataloader_params`. In a distributed setting, the
+    runs are split between the ranks assuming the default `DistributedSampler`
+    without shuffling."""
+
     @field_validator("patch_size")
     @classmethod
     def all_elements_power_of_2_minimum_8(
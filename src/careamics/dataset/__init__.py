@@ -1,6 +1,7 @@
 """Dataset module."""
 
 __all__ = [
+    "HybridIterableDataset",
     "InMemoryDataset",
     "InMemoryPredDataset",
     "InMemoryTiledPredDataset",
@@ -9,6 +10,7 @@ __all__ = [
     "PathIterableDataset",
 ]
 
+from .hybrid_dataset import HybridIterableDataset
 from .in_memory_dataset import InMemoryDataset
 from .in_memory_pred_dataset import InMemoryPredDataset
 from .in_memory_tiled_pred_dataset import InMemoryTiledPredDataset
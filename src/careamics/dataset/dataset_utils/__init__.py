@@ -1,19 +1,40 @@
 """Files and arrays utils used in the datasets."""
 
 __all__ = [
+    "SharedArray",
     "WelfordStatistics",
+    "cast_to_storage_dtype",
     "compute_normalization_stats",
+    "get_decoded_files_size",
+    "get_decoded_size",
     "get_files_size",
+    "get_number_of_patches",
     "iterate_over_files",
     "list_files",
+    "parallel_map",
+    "prefetch",
     "reshape_array",
+    "share_arrays",
+    "shuffle_buffer",
     "validate_source_target_files",
 ]
 
 
 from .dataset_utils import (
+    cast_to_storage_dtype,
     reshape_array,
 )
-from .file_utils import get_files_size, list_files, validate_source_target_files
+from .file_utils import (
+    get_decoded_files_size,
+    get_decoded_size,
+    get_files_size,
+    get_number_of_patches,
+    list_files,
+    validate_source_target_files,
+)
 from .iterate_over_files import iterate_over_files
+from .parallel_map import parallel_map
+from .prefetch import prefetch
 from .running_stats import WelfordStatistics, compute_normalization_stats
+from .shared_memory import SharedArray, share_arrays
+from .shuffle_buffer import shuffle_buffer
@@ -1,5 +1,7 @@
 """Dataset utilities."""
 
+from typing import Literal
+
 import numpy as np
 
 from careamics.utils.logging import get_logger
@@ -97,3 +99,42 @@ def reshape_array(x: np.ndarray, axes: str) -> np.ndarray:
         _x = np.expand_dims(_x, new_axes.index("S") + 1)
 
     return _x
+
+
+def cast_to_storage_dtype(
+    x: np.ndarray, storage_dtype: Literal["native", "float32", "float16"]
+) -> np.ndarray:
+    """Cast an array to the data type in which it is stored in memory.
+
+    The array is returned as is if it already has the requested data type, or if
+    `storage_dtype` is `native`.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Input array.
+    storage_dtype : {"native", "float32", "float16"}
+        Storage data type, `native` keeps the data type of the array.
+
+    Returns
+    -------
+    np.ndarray
+        Array in the storage data type.
+
+    Raises
+    ------
+    ValueError
+        If the values of the array exceed the range of float16.
+    """
+    if storage_dtype == "native" or x.dtype == storage_dtype:
+        return x
+
+    if storage_dtype == "float16" and x.size > 0:
+        max_value = np.finfo(np.float16).max
+        if np.abs(x).max() > max_value:
+            raise ValueError(
+                f"Data values exceed the range of float16 (+/-{max_value}), use the "
+                f"`native` or `float32` storage data type instead."
+            )
+
+    return x.astype(storage_dtype)
@@ -1,12 +1,14 @@
 """File utilities."""
 
+from collections.abc import Sequence
 from fnmatch import fnmatch
 from pathlib import Path
-from typing import Union
+from typing import Callable, Optional, Union
 
 import numpy as np
 
 from careamics.config.support import SupportedData
+from careamics.file_io.read import read_metadata
 from careamics.utils.logging import get_logger
 
 logger = get_logger(__name__)
@@ -28,6 +30,125 @@ def get_files_size(files: list[Path]) -> float:
     return np.sum([f.stat().st_size / 1024**2 for f in files])
 
 
+def get_decoded_size(
+    file: Path,
+    read_metadata_func: Optional[Callable] = None,
+    axes: Optional[str] = None,
+) -> float:
+    """Get the size in MB of the data of a file once decoded.
+
+    The size is computed from the shape and data type of the image, read from the
+    header of TIFF files and zarr arrays, or with `read_metadata_func` for other
+    files (see `careamics.file_io.read.read_metadata`). This is accurate for
+    compressed files, contrary to the size of the file on disk. If the metadata
+    cannot be read, the size of the file on disk is returned.
+
+    Parameters
+    ----------
+    file : pathlib.Path
+        File.
+    read_metadata_func : Callable, optional
+        Function returning the metadata of custom files, by default None.
+    axes : str, optional
+        Axes of the data, passed to `read_metadata_func`, by default None.
+
+    Returns
+    -------
+    float
+        Size of the decoded data in MB.
+    """
+    is_tiff = fnmatch(
+        file.suffix, SupportedData.get_extension_pattern(SupportedData.TIFF)
+    )
+    try:
+        metadata = read_metadata(
+            file,
+            SupportedData.TIFF if is_tiff else SupportedData.CUSTOM,
+            read_metadata_func=read_metadata_func,
+            axes=axes,
+        )
+        return metadata.nbytes / 1024**2
+    except Exception as e:
+        if is_tiff or read_metadata_func is not None:
+            logger.warning(f"Could not read the metadata of {file}: {e}.")
+
+    return file.stat().st_size / 1024**2
+
+
+def get_decoded_files_size(
+    files: list[Path],
+    read_metadata_func: Optional[Callable] = None,
+    axes: Optional[str] = None,
+) -> float:
+    """Get the size in MB of the data of the files once decoded.
+
+    See `get_decoded_size`.
+
+    Parameters
+    ----------
+    files : list of pathlib.Path
+        List of files.
+    read_metadata_func : Callable, optional
+        Function returning the metadata of custom files, by default None.
+    axes : str, optional
+        Axes of the data, passed to `read_metadata_func`, by default None.
+
+    Returns
+    -------
+    float
+        Total size of the decoded data in MB.
+    """
+    return float(np.sum([get_decoded_size(f, read_metadata_func, axes) for f in files]))
+
+
+def get_number_of_patches(
+    file: Path,
+    axes: str,
+    patch_size: Sequence[int],
+    read_metadata_func: Optional[Callable] = None,
+    read_source_func: Optional[Callable] = None,
+) -> int:
+    """Get the number of random patches extracted from a file in one epoch.
+
+    The number of patches is that of `extract_patches_random`, i.e. the number of
+    patches needed to cover each sample, and is computed from the shape of the file
+    read with `read_metadata` (see `get_decoded_size`). Custom files without
+    `read_metadata_func` are decoded with `read_source_func`.
+
+    Parameters
+    ----------
+    file : pathlib.Path
+        File.
+    axes : str
+        Axes of the data.
+    patch_size : sequence of int
+        Spatial size of the patches.
+    read_metadata_func : Callable, optional
+        Function returning the metadata of custom files, by default None.
+    read_source_func : Callable, optional
+        Function reading custom files, by default None.
+
+    Returns
+    -------
+    int
+        Number of patches of the file.
+    """
+    is_tiff = fnmatch(
+        file.suffix, SupportedData.get_extension_pattern(SupportedData.TIFF)
+    )
+    shape = read_metadata(
+        file,
+        SupportedData.TIFF if is_tiff else SupportedData.CUSTOM,
+        read_metadata_func=read_metadata_func,
+        read_source_func=read_source_func,
+        axes=axes,
+    ).shape
+
+    n_samples = int(np.prod([shape[axes.index(a)] for a in "ST" if a in axes]))
+    n_pixels = int(np.prod([shape[axes.index(a)] for a in "ZYX" if a in axes]))
+    return n_samples * int(np.ceil(n_pixels / np.prod(patch_size)))
+
+
 def list_files(
     data_path: Union[str, Path],
     data_type: Union[str, SupportedData],
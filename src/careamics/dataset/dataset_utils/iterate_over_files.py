@@ -2,10 +2,12 @@
 
 from __future__ import annotations
 
+import heapq
 from collections.abc import Generator
 from pathlib import Path
-from typing import Callable, Optional, Union
+from typing import Any, Callable, Optional, Union
 
+import torch.distributed as dist
 from numpy.typing import NDArray
 from torch.utils.data import get_worker_info
 
@@ -14,18 +16,321 @@ from careamics.file_io.read import read_tiff
 from careamics.utils.logging import get_logger
 
 from .dataset_utils import reshape_array
+from .tiff_pages import read_tiff_samples
 
 logger = get_logger(__name__)
 
 
+def _get_file_sizes(data_files: list[Path]) -> list[int]:
+    """Return the size of the files in bytes, 0 if a file cannot be accessed.
+
+    Parameters
+    ----------
+    data_files : list of pathlib.Path
+        List of files.
+
+    Returns
+    -------
+    list of int
+        Size of each file.
+    """
+    sizes = []
+    for file in data_files:
+        try:
+            sizes.append(Path(file).stat().st_size)
+        except OSError:
+            sizes.append(0)
+    return sizes
+
+
+def balance_files(sizes: list[int], num_workers: int) -> list[list[int]]:
+    """Assign files to workers so as to balance the number of bytes per worker.
+
+    Files are assigned from the largest to the smallest to the least loaded worker
+    (longest processing time first). The assignment is deterministic, so that every
+    worker computes the same assignment. Within a worker, files are kept in their
+    original order.
+
+    Parameters
+    ----------
+    sizes : list of int
+        Size of each file.
+    num_workers : int
+        Number of workers.
+
+    Returns
+    -------
+    list of list of int
+        Indices of the files assigned to each worker.
+    """
+    assignment: list[list[int]] = [[] for _ in range(num_workers)]
+    loads = [(0, worker_id) for worker_id in range(num_workers)]
+
+    # stable sort, ties are broken by file index
+    for file_idx in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+        load, worker_id = heapq.heappop(loads)
+        assignment[worker_id].append(file_idx)
+        heapq.heappush(loads, (load + sizes[file_idx], worker_id))
+
+    return [sorted(files) for files in assignment]
+
+
+def get_distributed_info() -> tuple[int, int]:
+    """Return the rank of the current process and the number of processes.
+
+    Returns
+    -------
+    tuple of (int, int)
+        Rank and world size, (0, 1) if no distributed process group is initialized.
+    """
+    if dist.is_available() and dist.is_initialized():
+        return dist.get_rank(), dist.get_world_size()
+    return 0, 1
+
+
+def shard_across_ranks(
+    sizes: list[int], rank: int, world_size: int, repeat: bool = True
+) -> list[int]:
+    """Return the indices of the files assigned to a distributed rank.
+
+    Files are balanced across ranks according to their size, e.g. their number of
+    patches (see `balance_files`). If there are fewer files than ranks and `repeat` is
+    True, each rank receives a single file, files being repeated across ranks.
+    Otherwise, the ranks in excess receive no file.
+
+    The ranks do not receive the same amount of data, which must be equalized when
+    iterating over the files for training (see `PathIterableDataset`).
+
+    Parameters
+    ----------
+    sizes : list of int
+        Size of each file.
+    rank : int
+        Rank of the process.
+    world_size : int
+        Number of processes.
+    repeat : bool, optional
+        Whether to repeat files across ranks when there are fewer files than ranks,
+        by default True. Prediction requires every file to be assigned exactly once.
+
+    Returns
+    -------
+    list of int
+        Indices of the files assigned to the rank.
+    """
+    n_files = len(sizes)
+    if world_size <= 1 or n_files == 0:
+        return list(range(n_files))
+
+    if n_files < world_size and repeat:
+        return [rank % n_files]
+
+    return balance_files(sizes, world_size)[rank]
+
+
+def get_rank_files(
+    data_files: list[Path], distributed_info: tuple[int, int]
+) -> list[int]:
+    """Return the indices of the files predicted by a distributed rank.
+
+    Files are balanced across ranks by size in bytes, each file being assigned to a
+    single rank (see `shard_across_ranks`). The indices are sorted, so that the
+    predictions of the ranks can be put back in the order of the files after being
+    gathered.
+
+    Parameters
+    ----------
+    data_files : list of pathlib.Path
+        List of files.
+    distributed_info : tuple of (int, int)
+        Rank and world size (see `get_distributed_info`).
+
+    Returns
+    -------
+    list of int
+        Indices of the files assigned to the rank.
+    """
+    rank, world_size = distributed_info
+    if world_size <= 1:
+        return list(range(len(data_files)))
+
+    return shard_across_ranks(
+        _get_file_sizes(data_files), rank, world_size, repeat=False
+    )
+
+
+def get_worker_shard(
+    data_files: list[Path], worker_id: int, num_workers: int, split_samples: bool
+) -> list[tuple[int, slice]]:
+    """Return the files, and the samples within them, assigned to a worker.
+
+    If there are at least as many files as workers, the files are balanced across
+    workers by size (see `balance_files`) and all their samples are assigned to the
+    worker. Otherwise, if `split_samples` is True, each file is shared by several
+    workers, each of them receiving an interleaved subset of its samples.
+
+    Parameters
+    ----------
+    data_files : list of pathlib.Path
+        List of files.
+    worker_id : int
+        Index of the worker.
+    num_workers : int
+        Number of workers.
+    split_samples : bool
+        Whether to split the samples of the files between workers when there are
+        fewer files than workers.
+
+    Returns
+    -------
+    list of tuple of (int, slice)
+        Index of each file assigned to the worker, and slice of its samples.
+    """
+    n_files = len(data_files)
+    if num_workers <= 1:
+        return [(i, slice(None)) for i in range(n_files)]
+
+    if n_files < num_workers and split_samples and n_files > 0:
+        # workers sharing the same file receive every k-th sample
+        file_idx = worker_id % n_files
+        n_sharing = len(range(file_idx, num_workers, n_files))
+        return [(file_idx, slice(worker_id // n_files, None, n_sharing))]
+
+    assignment = balance_files(_get_file_sizes(data_files), num_workers)
+    return [(i, slice(None)) for i in assignment[worker_id]]
+
+
+class CachedReadFunc:
+    """
+    Read function returning the files kept in memory, and reading the other files.
+
+    Parameters
+    ----------
+    cache : dict of {pathlib.Path: numpy.ndarray}
+        Decoded files kept in memory.
+    read_source_func : Callable
+        Function reading the files that are not kept in memory.
+    """
+
+    def __init__(self, cache: dict[Path, NDArray], read_source_func: Callable) -> None:
+        """Constructor.
+
+        Parameters
+        ----------
+        cache : dict of {pathlib.Path: numpy.ndarray}
+            Decoded files kept in memory.
+        read_source_func : Callable
+            Function reading the files that are not kept in memory.
+        """
+        self.cache = cache
+        self.read_source_func = read_source_func
+
+    def __call__(self, file_path: Path, *args: Any, **kwargs: Any) -> NDArray:
+        """
+        Return a decoded file from memory, or read it if it is not cached.
+
+        Parameters
+        ----------
+        file_path : pathlib.Path
+            File to read.
+        *args : Any
+            Arguments of the read source function.
+        **kwargs : Any
+            Keyword arguments of the read source function.
+
+        Returns
+        -------
+        numpy.ndarray
+            Decoded file.
+        """
+        cached = self.cache.get(file_path)
+        if cached is not None:
+            return cached
+
+        return self.read_source_func(file_path, *args, **kwargs)
+
+
+def get_file_read_func(file_path: Path, read_source_func: Callable) -> Callable:
+    """
+    Return the function actually reading a file.
+
+    Files that are not kept in memory by a `CachedReadFunc` are read by its
+    underlying read function, e.g. so that tiff files can still be partially read.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        Path to the file.
+    read_source_func : Callable
+        Function to read the data.
+
+    Returns
+    -------
+    Callable
+        Function reading the file.
+    """
+    if (
+        isinstance(read_source_func, CachedReadFunc)
+        and file_path not in read_source_func.cache
+    ):
+        return read_source_func.read_source_func
+
+    return read_source_func
+
+
+def _read_samples(
+    file_path: Path, axes: str, read_source_func: Callable, samples: slice
+) -> NDArray:
+    """Read the samples of a file assigned to a worker, reshaped to SC(Z)YX.
+
+    Tiff files read with `read_tiff`, including those not kept in memory by a
+    `CachedReadFunc`, are partially read, decoding only the pages of the samples.
+    Other files are read entirely, then sliced.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        Path to the file.
+    axes : str
+        Axes of the data.
+    read_source_func : Callable
+        Function to read the data.
+    samples : slice
+        Samples of the file assigned to the worker.
+
+    Returns
+    -------
+    NDArray
+        Samples of shape (S, C, (Z), Y, X).
+    """
+    read_source_func = get_file_read_func(file_path, read_source_func)
+    if samples != slice(None) and read_source_func is read_tiff:
+        reshaped = read_tiff_samples(file_path, axes, samples)
+        if reshaped is not None:
+            return reshaped
+
+    return reshape_array(read_source_func(file_path, axes), axes)[samples]
+
+
 def iterate_over_files(
     data_config: Union[DataConfig, InferenceConfig],
     data_files: list[Path],
     target_files: Optional[list[Path]] = None,
     read_source_func: Callable = read_tiff,
+    split_samples: bool = False,
+    file_indices: Optional[list[int]] = None,
+    shard_workers: bool = True,
 ) -> Generator[tuple[NDArray, Optional[NDArray]], None, None]:
     """Iterate over data source and yield whole reshaped images.
 
+    When used in a dataloader with several workers, the files are balanced across
+    workers according to their size. If `split_samples` is True and there are fewer
+    files than workers, the samples (S and T axes) of the files are split between
+    workers instead, so that every worker receives data. Each worker then only
+    decodes the pages of its samples of tiff files read with `read_tiff`, while files
+    read with other functions are read entirely by every worker sharing them (i.e.
+    read as many times as there are workers sharing them).
+
     Parameters
     ----------
     data_config : CAREamics DataConfig or InferenceConfig
@@ -36,49 +341,120 @@ def iterate_over_files(
         List of target files, by default None.
     read_source_func : Callable, optional
         Function to read the source, by default read_tiff.
+    split_samples : bool, optional
+        Whether to split the samples of the files between workers when there are
+        fewer files than workers, by default False.
+    file_indices : list of int, optional
+        Indices of the files to iterate over, e.g. those of a distributed rank (see
+        `shard_across_ranks`), by default None. If None, all files are used.
+    shard_workers : bool, optional
+        Whether to split the files between dataloader workers, by default True. If
+        False, every worker iterates over all the files.
 
     Yields
     ------
     NDArray
         Image.
     """
+    for _, _, reshaped_sample, reshaped_target in iterate_over_worker_files(
+        data_config,
+        data_files,
+        target_files,
+        read_source_func,
+        split_samples,
+        file_indices,
+        shard_workers,
+    ):
+        yield reshaped_sample, reshaped_target
+
+
+def iterate_over_worker_files(
+    data_config: Union[DataConfig, InferenceConfig],
+    data_files: list[Path],
+    target_files: Optional[list[Path]] = None,
+    read_source_func: Callable = read_tiff,
+    split_samples: bool = False,
+    file_indices: Optional[list[int]] = None,
+    shard_workers: bool = True,
+) -> Generator[
+    tuple[int, slice, NDArray, Optional[NDArray]],
+    None,
+    None,
+]:
+    """Iterate over data source and yield whole reshaped images with their origin.
+
+    Same as `iterate_over_files`, but the index of the file and the slice of its
+    samples read by the worker are yielded alongside the images, e.g. to cache data
+    computed from the images.
+
+    Parameters
+    ----------
+    data_config : CAREamics DataConfig or InferenceConfig
+        Configuration.
+    data_files : list of pathlib.Path
+        List of data files.
+    target_files : list of pathlib.Path, optional
+        List of target files, by default None.
+    read_source_func : Callable, optional
+        Function to read the source, by default read_tiff.
+    split_samples : bool, optional
+        Whether to split the samples of the files between workers when there are
+        fewer files than workers, by default False.
+    file_indices : list of int, optional
+        Indices of the files to iterate over, by default None. If None, all files
+        are used.
+    shard_workers : bool, optional
+        Whether to split the files between dataloader workers, by default True.
+
+    Yields
+    ------
+    tuple of (int, slice, NDArray, NDArray or None)
+        Index of the file, slice of its samples, image and optional target.
+    """
     # When num_workers > 0, each worker process will have a different copy of the
     # dataset object
     # Configuring each copy independently to avoid having duplicate data returned
     # from the workers
     worker_info = get_worker_info()
-    worker_id = worker_info.id if worker_info is not None else 0
-    num_workers = worker_info.num_workers if worker_info is not None else 1
-
-    # iterate over the files
-    for i, filename in enumerate(data_files):
-        # retrieve file corresponding to the worker id
-        if i % num_workers == worker_id:
-            try:
-                # read data
-                sample = read_source_func(filename, data_config.axes)
-
-                # reshape array
-                reshaped_sample = reshape_array(sample, data_config.axes)
-
-                # read target, if available
-                if target_files is not None:
-                    if filename.name != target_files[i].name:
-                        raise ValueError(
-                            f"File {filename} does not match target file "
-                            f"{target_files[i]}. Have you passed sorted "
-                            f"arrays?"
-                        )
-
-                    # read target
-                    target = read_source_func(target_files[i], data_config.axes)
-
-                    # reshape target
-                    reshaped_target = reshape_array(target, data_config.axes)
-
-                    yield reshaped_sample, reshaped_target
-                else:
-                    yield reshaped_sample, None
-
-            except Exception as e:
-                logger.error(f"Error reading file {filename}: {e}")
+    if worker_info is None or not shard_workers:
+        worker_id, num_workers = 0, 1
+    else:
+        worker_id, num_workers = worker_info.id, worker_info.num_workers
+
+    if file_indices is None:
+        file_indices = list(range(len(data_files)))
+
+    # iterate over the files assigned to the worker
+    for j, samples in get_worker_shard(
+        [data_files[i] for i in file_indices], worker_id, num_workers, split_samples
+    ):
+        i = file_indices[j]
+        filename = data_files[i]
+        try:
+            # read data
+            reshaped_sample = _read_samples(
+                filename, data_config.axes, read_source_func, samples
+            )
+            if len(reshaped_sample) == 0:
+                continue
+
+            # read target, if available
+            if target_files is not None:
+                if filename.name != target_files[i].name:
+                    raise ValueError(
+                        f"File {filename} does not match target file "
+                        f"{target_files[i]}. Have you passed sorted "
+                        f"arrays?"
+                    )
+
+                # read target
+                reshaped_target = _read_samples(
+                    target_files[i], data_config.axes, read_source_func, samples
+                )
+
+                yield i, samples, reshaped_sample, reshaped_target
+            else:
+                yield i, samples, reshaped_sample, None
+
+        except Exception as e:
+            logger.error(f"Error reading file {filename}: {e}")
@@ -0,0 +1,61 @@
+"""Apply a function to a sequence of items using a pool of workers."""
+
+from collections.abc import Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Literal, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def parallel_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    num_workers: int = 0,
+    pool: Literal["thread", "process"] = "thread",
+) -> list[R]:
+    """Apply a function to each item, possibly in parallel.
+
+    The results are returned in the same order as the items, regardless of the order
+    in which the workers complete them.
+
+    Threads are well suited for functions releasing the GIL (e.g. file reading and
+    decompression), while processes are better suited for pure Python functions. Note
+    that with processes, the function and items must be picklable (e.g. functions
+    defined at the module level).
+
+    Parameters
+    ----------
+    func : Callable
+        Function applied to each item.
+    items : Iterable
+        Items.
+    num_workers : int, optional
+        Number of workers, by default 0. If 0 or 1, the items are processed
+        sequentially in the current thread.
+    pool : {"thread", "process"}, optional
+        Type of pool of workers, by default "thread".
+
+    Returns
+    -------
+    list
+        Results, in the order of the items.
+
+    Raises
+    ------
+    ValueError
+        If the pool type is not supported.
+    """
+    if num_workers <= 1:
+        return [func(item) for item in items]
+
+    executor: Executor
+    if pool == "thread":
+        executor = ThreadPoolExecutor(max_workers=num_workers)
+    elif pool == "process":
+        executor = ProcessPoolExecutor(max_workers=num_workers)
+    else:
+        raise ValueError(f"Unsupported pool type '{pool}'.")
+
+    with executor:
+        return list(executor.map(func, items))
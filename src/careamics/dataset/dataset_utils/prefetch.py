@@ -0,0 +1,78 @@
+"""Read-ahead of an iterator in a background thread."""
+
+from __future__ import annotations
+
+import queue
+import threading
+from collections.abc import Generator, Iterable
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+_END = object()
+"""Sentinel signalling that the iterator is exhausted."""
+
+
+def prefetch(iterable: Iterable[T], depth: int) -> Generator[T, None, None]:
+    """Iterate over an iterable while a background thread reads ahead.
+
+    The background thread consumes the iterable and stores up to `depth` items in a
+    bounded queue, so that producing the next items (e.g. reading and decoding files)
+    overlaps with the processing of the current one. Items are yielded in their
+    original order, and exceptions raised by the iterable are re-raised in the
+    consuming thread.
+
+    Parameters
+    ----------
+    iterable : Iterable
+        Iterable to read ahead.
+    depth : int
+        Maximum number of items read ahead. If 0, the iterable is consumed directly
+        without a background thread.
+
+    Yields
+    ------
+    Any
+        Items of the iterable.
+    """
+    if depth <= 0:
+        yield from iterable
+        return
+
+    buffer: queue.Queue[Any] = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def _put(item: Any) -> bool:
+        # block until there is room in the buffer, unless the consumer stopped
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _producer() -> None:
+        try:
+            for item in iterable:
+                if not _put(item):
+                    return
+        except Exception as e:
+            _put(e)
+        _put(_END)
+
+    thread = threading.Thread(target=_producer, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # stop the producer if the consumer is closed early
+        stop.set()
+        thread.join()
@@ -1,8 +1,13 @@
 """Computing data statistics."""
 
+from __future__ import annotations
+
 import numpy as np
 from numpy.typing import NDArray
 
+STATISTICS_BLOCK_SIZE = 2**18
+"""Number of pixels per channel processed at once by `WelfordStatistics.from_array`."""
+
 
 def compute_normalization_stats(image: NDArray) -> tuple[NDArray, NDArray]:
     """
@@ -131,6 +136,70 @@ class WelfordStatistics:
 
         self.sample_idx += 1
 
+    @classmethod
+    def from_array(cls, array: NDArray) -> WelfordStatistics:
+        """Create the Welford statistics of a whole array in a single pass.
+
+        The sums of squares are accumulated over blocks of pixels, such that the
+        temporary arrays do not scale with the size of the array.
+
+        Parameters
+        ----------
+        array : NDArray
+            Input array of shape (S, C, (Z), Y, X).
+
+        Returns
+        -------
+        WelfordStatistics
+            Statistics of the array.
+        """
+        num_channels = array.shape[1]
+        axes = tuple(np.delete(np.arange(array.ndim), 1))
+
+        stats = cls()
+        stats.sample_idx = array.shape[0]
+        stats.count = np.full(
+            num_channels, array.size // num_channels, dtype=np.float64
+        )
+        stats.mean = array.mean(axis=axes, dtype=np.float64)
+        stats.m2 = np.zeros(num_channels, dtype=np.float64)
+        for sample in array:
+            values = sample.reshape(num_channels, -1)
+            for start in range(0, values.shape[1], STATISTICS_BLOCK_SIZE):
+                block = values[:, start : start + STATISTICS_BLOCK_SIZE]
+                stats.m2 += np.sum(
+                    (block - stats.mean.reshape(num_channels, 1)) ** 2, axis=1
+                )
+        return stats
+
+    def merge(self, other: WelfordStatistics) -> None:
+        """Merge the statistics of another set of samples into these statistics.
+
+        The statistics are combined using the parallel algorithm of Chan et al., see
+        https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Parallel_algorithm
+
+        Parameters
+        ----------
+        other : WelfordStatistics
+            Statistics to merge.
+        """
+        if not hasattr(other, "count"):
+            return
+
+        if not hasattr(self, "count"):
+            self.sample_idx = other.sample_idx
+            self.count = other.count.copy()
+            self.mean = other.mean.copy()
+            self.m2 = other.m2.copy()
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.sample_idx += other.sample_idx
+
     def finalize(self) -> tuple[NDArray, NDArray]:
         """Finalize the Welford statistics.
 
@@ -0,0 +1,193 @@
+"""Arrays backed by shared memory, passed by handle to worker processes."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import torch
+from numpy.typing import NDArray
+
+
+class SharedArray:
+    """
+    Numpy array backed by shared memory.
+
+    The array is copied once into a shared memory segment owned by a torch tensor.
+    When pickled for a worker process (e.g. by a `DataLoader` using the spawn or
+    forkserver start methods), only a handle to the segment is sent, so that all
+    workers share the same copy of the array. Pickled with the standard pickler, the
+    array is serialized by value.
+
+    Parameters
+    ----------
+    array : numpy.ndarray
+        Array to copy into shared memory.
+
+    Attributes
+    ----------
+    array : numpy.ndarray
+        View of the shared memory as an array.
+    """
+
+    def __init__(self, array: NDArray) -> None:
+        """Constructor.
+
+        Parameters
+        ----------
+        array : numpy.ndarray
+            Array to copy into shared memory.
+        """
+        # the memory is allocated as bytes, to support all the numpy data types
+        self._buffer = torch.empty(array.nbytes, dtype=torch.uint8).share_memory_()
+        self._shape = array.shape
+        self._dtype = array.dtype
+        self.array = self._view()
+        self.array[...] = array
+
+    def _view(self) -> NDArray:
+        """
+        Return a view of the shared memory as an array.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array view.
+        """
+        return self._buffer.numpy().view(self._dtype).reshape(self._shape)
+
+    def __getstate__(self) -> dict[str, Any]:
+        """
+        Return the state, sending the shared memory instead of the array.
+
+        Returns
+        -------
+        dict
+            State of the object.
+        """
+        return {"_buffer": self._buffer, "_shape": self._shape, "_dtype": self._dtype}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """
+        Restore the state and the array view of the shared memory.
+
+        Parameters
+        ----------
+        state : dict
+            State of the object.
+        """
+        self.__dict__.update(state)
+        self.array = self._view()
+
+
+def share_arrays(obj: Any, names: list[str]) -> dict[str, Any]:
+    """
+    Move arrays, or lists of arrays, attributes of an object to shared memory.
+
+    The attributes are replaced by views of the shared memory, and the returned
+    handles are meant to be kept by the object and used by `get_shared_state` and
+    `set_shared_state` when it is pickled. Attributes that are None are ignored.
+
+    Parameters
+    ----------
+    obj : Any
+        Object holding the arrays.
+    names : list of str
+        Names of the attributes.
+
+    Returns
+    -------
+    dict of {str: SharedArray or list of SharedArray}
+        Shared arrays, by attribute name.
+    """
+    shared: dict[str, Any] = {}
+    for name in names:
+        value = getattr(obj, name)
+        if isinstance(value, np.ndarray):
+            shared[name] = SharedArray(value)
+            setattr(obj, name, shared[name].array)
+        elif isinstance(value, list):
+            shared[name] = [SharedArray(array) for array in value]
+            setattr(obj, name, [s.array for s in shared[name]])
+
+    return shared
+
+
+def _is_view(value: Any, shared: Any) -> bool:
+    """
+    Return whether a value is the view, or list of views, of shared arrays.
+
+    Parameters
+    ----------
+    value : Any
+        Attribute value.
+    shared : SharedArray or list of SharedArray
+        Shared arrays.
+
+    Returns
+    -------
+    bool
+        Whether the value is the view of the shared arrays.
+    """
+    if isinstance(shared, list):
+        return (
+            isinstance(value, list)
+            and len(value) == len(shared)
+            and all(v is s.array for v, s in zip(value, shared))
+        )
+    return value is shared.array
+
+
+def get_shared_state(state: dict[str, Any], shared: dict[str, Any]) -> dict[str, Any]:
+    """
+    Remove the views of shared arrays from a state, before pickling it.
+
+    Attributes that were reassigned since they were shared are kept as is.
+
+    Parameters
+    ----------
+    state : dict
+        State of the object (e.g. a copy of its `__dict__`).
+    shared : dict of {str: SharedArray or list of SharedArray}
+        Shared arrays, by attribute name.
+
+    Returns
+    -------
+    dict
+        State without the views, and the names of the removed attributes under the
+        `_shared_views` key.
+    """
+    state = dict(state)
+    state["_shared_views"] = [
+        name for name, arrays in shared.items() if _is_view(state.get(name), arrays)
+    ]
+    for name in state["_shared_views"]:
+        state[name] = None
+
+    return state
+
+
+def set_shared_state(state: dict[str, Any], shared: dict[str, Any]) -> dict[str, Any]:
+    """
+    Restore the views of shared arrays in a state, after unpickling it.
+
+    Parameters
+    ----------
+    state : dict
+        State returned by `get_shared_state`.
+    shared : dict of {str: SharedArray or list of SharedArray}
+        Unpickled shared arrays, by attribute name.
+
+    Returns
+    -------
+    dict
+        State with the views of the shared arrays.
+    """
+    state = dict(state)
+    for name in state.pop("_shared_views", []):
+        arrays = shared[name]
+        state[name] = (
+            [s.array for s in arrays] if isinstance(arrays, list) else arrays.array
+        )
+
+    return state
@@ -0,0 +1,83 @@
+"""Bounded shuffle buffer for streams of patches."""
+
+from __future__ import annotations
+
+from collections.abc import Generator, Iterable
+from typing import Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+PatchTuple = tuple[NDArray, Optional[NDArray]]
+
+
+def _nbytes(item: PatchTuple) -> int:
+    """Return the number of bytes of a patch and its optional target.
+
+    Parameters
+    ----------
+    item : tuple of (numpy.ndarray, numpy.ndarray or None)
+        Patch and target.
+
+    Returns
+    -------
+    int
+        Number of bytes.
+    """
+    return sum(array.nbytes for array in item if array is not None)
+
+
+def shuffle_buffer(
+    patches: Iterable[PatchTuple],
+    max_bytes: int,
+    rng: Optional[np.random.Generator] = None,
+) -> Generator[PatchTuple, None, None]:
+    """Shuffle a stream of patches using a bounded buffer.
+
+    The buffer is first filled with patches, then each incoming patch replaces a
+    randomly drawn patch of the buffer, which is yielded. When the stream is
+    exhausted, the remaining patches are yielded in random order. Patches from
+    consecutive files are thus mixed, as long as the buffer spans several files.
+
+    The number of patches held in the buffer is derived from the memory cap and the
+    size of the first patch.
+
+    Parameters
+    ----------
+    patches : Iterable of tuple of (numpy.ndarray, numpy.ndarray or None)
+        Stream of patches and optional targets.
+    max_bytes : int
+        Maximum memory, in bytes, occupied by the buffered patches. If it does not
+        allow buffering at least two patches, the stream is not shuffled.
+    rng : numpy.random.Generator, optional
+        Random number generator, by default None.
+
+    Yields
+    ------
+    tuple of (numpy.ndarray, numpy.ndarray or None)
+        Patches and optional targets, in shuffled order.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    iterator = iter(patches)
+    buffer: list[PatchTuple] = []
+    capacity: Optional[int] = None
+    for item in iterator:
+        if capacity is None:
+            capacity = max_bytes // max(_nbytes(item), 1)
+            if capacity < 2:
+                yield item
+                yield from iterator
+                return
+
+        if len(buffer) < capacity:
+            buffer.append(item)
+        else:
+            index = rng.integers(capacity)
+            yield buffer[index]
+            buffer[index] = item
+
+    # flush the remaining patches
+    for index in rng.permutation(len(buffer)):
+        yield buffer[index]
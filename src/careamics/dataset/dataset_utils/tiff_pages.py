@@ -0,0 +1,164 @@
+"""Partial reads of tiff files, decoding only some of their pages."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import tifffile
+from numpy.typing import NDArray
+
+from .dataset_utils import reshape_array
+
+
+def _get_page_layout(
+    file_path: Path, axes: str, position_axes: str
+) -> Optional[tuple[NDArray, str, tuple[int, ...]]]:
+    """Arrange the pages of a tiff file by positions along some of its axes.
+
+    The pages of a tiff file span its leading axes, the remaining axes being those of
+    each page (e.g. YX). The page indices are arranged in an array of shape
+    (N, P), with N the number of positions along the leading axes in `position_axes`
+    (ordered as STCZYX), and P the number of pages at each position, along the other
+    leading axes.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        Path to the tiff file.
+    axes : str
+        Axes of the data.
+    position_axes : str
+        Axes along which the positions are taken, ignored if they are not leading
+        axes of the file.
+
+    Returns
+    -------
+    tuple of (numpy.ndarray, str, tuple of int) or None
+        Page indices of shape (N, P), axes of the P pages of a position (leading
+        axes followed by the axes of a page), and shape of the pages of a position.
+        None if the pages cannot be matched to the axes, or if the file has no
+        leading position axis.
+    """
+    with tifffile.TiffFile(file_path) as tif:
+        series = tif.series[0]
+        shape = tuple(series.shape)
+        page_shape = tuple(series.keyframe.shape)
+
+    n_leading = len(shape) - len(page_shape)
+    leading_axes = axes[:n_leading]
+    page_axes = axes[n_leading:]
+    positions = [a for a in "STCZYX" if a in position_axes and a in leading_axes]
+    kept = [a for a in leading_axes if a not in positions]
+    if (
+        len(axes) != len(shape)
+        or len(positions) == 0
+        or not set(kept + list(page_axes)) <= set("CZYX")
+    ):
+        return None
+
+    page_ids = np.arange(int(np.prod(shape[:n_leading]))).reshape(shape[:n_leading])
+    page_ids = np.transpose(page_ids, [leading_axes.index(a) for a in positions + kept])
+    kept_shape = tuple(shape[leading_axes.index(a)] for a in kept)
+
+    return (
+        page_ids.reshape(-1, int(np.prod(kept_shape))),
+        "".join(kept) + page_axes,
+        kept_shape + page_shape,
+    )
+
+
+def _read_positions(
+    file_path: Path,
+    page_ids: NDArray,
+    position_shape: tuple[int, ...],
+    position_axes: str,
+) -> NDArray:
+    """Read the pages of some positions and reshape them to SC(Z)YX.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        Path to the tiff file.
+    page_ids : numpy.ndarray
+        Page indices of the positions, of shape (N, P).
+    position_shape : tuple of int
+        Shape of the pages of a position.
+    position_axes : str
+        Axes of the pages of a position.
+
+    Returns
+    -------
+    numpy.ndarray
+        Positions along S, of shape (N, C, (Z), Y, X).
+    """
+    pages = tifffile.imread(file_path, key=page_ids.ravel().tolist())
+    return reshape_array(
+        pages.reshape(len(page_ids), *position_shape), "S" + position_axes
+    )
+
+
+def read_tiff_samples(
+    file_path: Path, axes: str, samples: Union[slice, NDArray]
+) -> Optional[NDArray]:
+    """Read some samples of a tiff file, decoding only their pages.
+
+    The samples are indexed along the S and T axes, merged as in `reshape_array`.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        Path to the tiff file.
+    axes : str
+        Axes of the data.
+    samples : slice or numpy.ndarray
+        Samples to read.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        Samples of shape (S, C, (Z), Y, X), None if the samples cannot be read
+        separately (e.g. the file has a single page per sample axis).
+    """
+    layout = _get_page_layout(file_path, axes, "ST")
+    if layout is None:
+        return None
+
+    page_ids, position_axes, position_shape = layout
+    return _read_positions(file_path, page_ids[samples], position_shape, position_axes)
+
+
+def read_tiff_fraction(
+    file_path: Path, axes: str, fraction: float, rng: np.random.Generator
+) -> Optional[NDArray]:
+    """Read a random fraction of the pages of a tiff file.
+
+    The pages are drawn along the leading axes of the file (e.g. S, T or Z), keeping
+    all the channels of each drawn position.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        Path to the tiff file.
+    axes : str
+        Axes of the data.
+    fraction : float
+        Fraction of the pages to read.
+    rng : numpy.random.Generator
+        Random number generator used to draw the pages.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        Pages of shape (N, C, (Z), Y, X), with the drawn positions along N. None if
+        the pages cannot be drawn separately (e.g. the file has a single page).
+    """
+    layout = _get_page_layout(file_path, axes, "STZ")
+    if layout is None or len(layout[0]) <= 1:
+        return None
+
+    page_ids, position_axes, position_shape = layout
+    n_drawn = max(1, int(np.ceil(fraction * len(page_ids))))
+    drawn = np.sort(rng.choice(len(page_ids), n_drawn, replace=False))
+    return _read_positions(file_path, page_ids[drawn], position_shape, position_axes)
@@ -0,0 +1,256 @@
+"""Iterable dataset keeping part of the files in memory."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from careamics.config import DataConfig
+from careamics.file_io.read import read_tiff
+
+from ..utils.logging import get_logger
+from .dataset_utils import get_decoded_size, parallel_map, share_arrays
+from .dataset_utils.iterate_over_files import CachedReadFunc
+from .dataset_utils.shared_memory import get_shared_state, set_shared_state
+from .iterable_dataset import PathIterableDataset
+
+logger = get_logger(__name__)
+
+
+class HybridIterableDataset(PathIterableDataset):
+    """
+    Dataset keeping as many decoded files in memory as a budget allows.
+
+    The files are selected in order, using the size of their decoded data estimated
+    from their headers, as long as they fit in the memory budget. These files are
+    read once, when the dataset is created, while the other files are read during
+    training as in `PathIterableDataset`.
+
+    The decoded files are read before the dataloader workers are started. If
+    `shared_memory` is set in the data configuration, they are moved to shared memory
+    and only a handle is sent to the workers. Otherwise, each worker started with the
+    spawn or forkserver methods receives its own copy of the decoded files, such that
+    the memory used is up to `memory_budget` times the number of workers plus one.
+
+    Parameters
+    ----------
+    data_config : DataConfig
+        Data configuration.
+    src_files : list of pathlib.Path
+        List of data files.
+    target_files : list of pathlib.Path, optional
+        Optional list of target files, by default None.
+    read_source_func : Callable, optional
+        Read source function for custom types, by default read_tiff.
+    memory_budget : float, optional
+        Memory budget in MB for the decoded files, by default 0.
+    read_metadata_func : Callable, optional
+        Function returning the metadata of custom files, used to estimate their
+        decoded size, by default None.
+    """
+
+    def __init__(
+        self,
+        data_config: DataConfig,
+        src_files: list[Path],
+        target_files: Optional[list[Path]] = None,
+        read_source_func: Callable = read_tiff,
+        memory_budget: float = 0,
+        read_metadata_func: Optional[Callable] = None,
+    ) -> None:
+        """Constructor.
+
+        Parameters
+        ----------
+        data_config : GeneralDataConfig
+            Data configuration.
+        src_files : list[Path]
+            List of data files.
+        target_files : list[Path] or None, optional
+            Optional list of target files, by default None.
+        read_source_func : Callable, optional
+            Read source function for custom types, by default read_tiff.
+        memory_budget : float, optional
+            Memory budget in MB for the decoded files, by default 0.
+        read_metadata_func : Callable, optional
+            Function returning the metadata of custom files, used to estimate their
+            decoded size, by default None.
+        """
+        self.memory_budget = memory_budget
+
+        # the files are cached before computing the statistics, which then reuse them
+        cache = self._cache_files(
+            data_config,
+            src_files,
+            target_files,
+            read_source_func,
+            memory_budget,
+            read_metadata_func,
+        )
+        self._cached_files: list[Path] = list(cache)
+        self._cached_arrays: list[np.ndarray] = list(cache.values())
+
+        # move the decoded files to shared memory, to share them with the workers
+        self._shared: dict[str, Any] = {}
+        if data_config.shared_memory:
+            self._shared = share_arrays(self, ["_cached_arrays"])
+        self._cache: dict[Path, np.ndarray] = dict(
+            zip(self._cached_files, self._cached_arrays)
+        )
+
+        super().__init__(
+            data_config=data_config,
+            src_files=src_files,
+            target_files=target_files,
+            read_source_func=read_source_func,
+            read_metadata_func=read_metadata_func,
+        )
+
+    @staticmethod
+    def _cache_files(
+        data_config: DataConfig,
+        src_files: list[Path],
+        target_files: Optional[list[Path]],
+        read_source_func: Callable,
+        memory_budget: float,
+        read_metadata_func: Optional[Callable],
+    ) -> dict[Path, np.ndarray]:
+        """
+        Read the files fitting in the memory budget.
+
+        Parameters
+        ----------
+        data_config : DataConfig
+            Data configuration.
+        src_files : list of pathlib.Path
+            List of data files.
+        target_files : list of pathlib.Path, optional
+            Optional list of target files.
+        read_source_func : Callable
+            Read source function.
+        memory_budget : float
+            Memory budget in MB.
+        read_metadata_func : Callable, optional
+            Function returning the metadata of custom files.
+
+        Returns
+        -------
+        dict of {pathlib.Path: numpy.ndarray}
+            Decoded files.
+        """
+        selected: list[Path] = []
+        used = 0.0
+        for i, file in enumerate(src_files):
+            files = [file] if target_files is None else [file, target_files[i]]
+            size = sum(
+                get_decoded_size(f, read_metadata_func, data_config.axes) for f in files
+            )
+            if used + size > memory_budget:
+                continue
+
+            selected.extend(files)
+            used += size
+
+        arrays = parallel_map(
+            lambda f: read_source_func(f, data_config.axes),
+            selected,
+            num_workers=data_config.num_loading_workers,
+            pool="thread",
+        )
+
+        logger.info(
+            f"Keeping {len(selected)} decoded files ({used:.1f} MB) in memory, "
+            f"{len(src_files) + len(target_files or []) - len(selected)} files are "
+            f"read during training."
+        )
+
+        return dict(zip(selected, arrays))
+
+    def __getstate__(self) -> dict[str, Any]:
+        """
+        Return the state, sending the shared memory rather than the decoded files.
+
+        Returns
+        -------
+        dict
+            State of the dataset.
+        """
+        state = get_shared_state(self.__dict__, self._shared)
+
+        # rebuilt from the cached files and arrays
+        state["_cache"] = None
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """
+        Restore the state, with the decoded files in shared memory.
+
+        Parameters
+        ----------
+        state : dict
+            State of the dataset.
+        """
+        self.__dict__.update(set_shared_state(state, state["_shared"]))
+        self._cache = dict(zip(self._cached_files, self._cached_arrays))
+
+    def _get_read_func(self) -> Callable:
+        """
+        Return the function used to read the files, using the cached files.
+
+        Returns
+        -------
+        Callable
+            Read function, called with a file path and the axes.
+        """
+        return CachedReadFunc(self._cache, self.read_source_func)
+
+    def get_number_of_cached_files(self) -> int:
+        """
+        Return the number of data files kept in memory.
+
+        Returns
+        -------
+        int
+            Number of data files kept in memory.
+        """
+        return sum(file in self._cache for file in self.data_files)
+
+    def split_dataset(
+        self,
+        percentage: float = 0.1,
+        minimum_number: int = 5,
+    ) -> HybridIterableDataset:
+        """Split up dataset in two.
+
+        The decoded files are shared between the two datasets, rather than copied.
+
+        Parameters
+        ----------
+        percentage : float, optional
+            Percentage of files to split up, by default 0.1.
+        minimum_number : int, optional
+            Minimum number of files to split up, by default 5.
+
+        Returns
+        -------
+        HybridIterableDataset
+            Dataset containing the split data.
+        """
+        # the decoded files are not copied along with the dataset
+        cache_state = {
+            name: getattr(self, name)
+            for name in ("_cached_files", "_cached_arrays", "_shared", "_cache")
+        }
+        self.__dict__.update(_cached_files=[], _cached_arrays=[], _shared={}, _cache={})
+        try:
+            dataset = super().split_dataset(percentage, minimum_number)
+        finally:
+            self.__dict__.update(cache_state)
+
+        # mypy check
+        assert isinstance(dataset, HybridIterableDataset)
+
+        dataset.__dict__.update(cache_state)
+        return dataset
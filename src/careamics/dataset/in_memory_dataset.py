@@ -11,9 +11,20 @@ from torch.utils.data import Dataset
 
 from careamics.config import DataConfig
 from careamics.config.transformations import NormalizeModel
+from careamics.dataset.dataset_utils import cast_to_storage_dtype, share_arrays
+from careamics.dataset.dataset_utils.shared_memory import (
+    get_shared_state,
+    set_shared_state,
+)
+from careamics.dataset.patching.patch_cache import PatchCache, compute_cache_key
 from careamics.dataset.patching.patching import (
+    PatchCoordinatesOutput,
     PatchedOutput,
     Stats,
+    prepare_patch_coordinates_supervised,
+    prepare_patch_coordinates_supervised_array,
+    prepare_patch_coordinates_unsupervised,
+    prepare_patch_coordinates_unsupervised_array,
     prepare_patches_supervised,
     prepare_patches_supervised_array,
     prepare_patches_unsupervised,
@@ -29,6 +40,11 @@ logger = get_logger(__name__)
 class InMemoryDataset(Dataset):
     """Dataset storing data in memory and allowing generating patches from it.
 
+    Depending on `data_config.in_memory_patching`, the patches are either all
+    extracted and stored in `data` (and `data_targets`), or only their coordinates are
+    stored in `patch_coordinates` and the patches are sliced on the fly from the
+    reshaped images kept in `images` (and `image_targets`).
+
     Parameters
     ----------
     data_config : CAREamics DataConfig
@@ -79,11 +95,47 @@ class InMemoryDataset(Dataset):
 
         # generate patches
         supervised = self.input_targets is not None
-        patches_data = self._prepare_patches(supervised)
+        patches_data = self._prepare_cached(
+            supervised, coordinates=self.data_config.in_memory_patching == "coordinates"
+        )
 
         # unpack the dataclass
-        self.data = patches_data.patches
-        self.data_targets = patches_data.targets
+        self.data: Optional[np.ndarray] = None
+        self.data_targets: Optional[np.ndarray] = None
+        self.images: Optional[list[np.ndarray]] = None
+        self.image_targets: Optional[list[np.ndarray]] = None
+        self.patch_coordinates: Optional[np.ndarray] = None
+        # indices of the patches of `data` belonging to the dataset, shared patch
+        # arrays are indexed through it after a split
+        self.patch_indices: Optional[np.ndarray] = None
+        if isinstance(patches_data, PatchCoordinatesOutput):
+            self.images = patches_data.images
+            self.image_targets = patches_data.targets
+            self.patch_coordinates = patches_data.coordinates
+        else:
+            self.data = patches_data.patches
+            self.data_targets = patches_data.targets
+
+        # keep the patches (or images) in the storage data type, they are cast to
+        # float32 patch by patch during normalization
+        storage_dtype = self.data_config.storage_dtype
+        if self.images is not None:
+            self.images = [cast_to_storage_dtype(x, storage_dtype) for x in self.images]
+        if self.image_targets is not None:
+            self.image_targets = [
+                cast_to_storage_dtype(x, storage_dtype) for x in self.image_targets
+            ]
+        if self.data is not None:
+            self.data = cast_to_storage_dtype(self.data, storage_dtype)
+        if self.data_targets is not None:
+            self.data_targets = cast_to_storage_dtype(self.data_targets, storage_dtype)
+
+        # move the data to shared memory, to share it with the dataloader workers
+        self._shared: dict[str, Any] = {}
+        if self.data_config.shared_memory:
+            self._shared = share_arrays(
+                self, ["data", "data_targets", "images", "image_targets"]
+            )
 
         # set image statistics
         if self.data_config.image_means is None:
@@ -114,17 +166,108 @@ class InMemoryDataset(Dataset):
             target_stds=self.target_stats.stds,
         )
         # get transforms
+        # the normalization and augmentations can be applied to whole batches on the
+        # training device instead
         self.patch_transform = Compose(
-            transform_list=[
-                NormalizeModel(
-                    image_means=self.image_stats.means,
-                    image_stds=self.image_stats.stds,
-                    target_means=self.target_stats.means,
-                    target_stds=self.target_stats.stds,
-                )
-            ]
-            + list(self.data_config.transforms),
+            transform_list=(
+                []
+                if self.data_config.device_transforms
+                else [
+                    NormalizeModel(
+                        image_means=self.image_stats.means,
+                        image_stds=self.image_stats.stds,
+                        target_means=self.target_stats.means,
+                        target_stds=self.target_stats.stds,
+                    )
+                ]
+                + list(self.data_config.transforms)
+            ),
+        )
+
+    def __getstate__(self) -> dict[str, Any]:
+        """
+        Return the state, sending the shared memory rather than the data.
+
+        If the data is in shared memory, the input arrays, only used to prepare the
+        patches, are not sent either.
+
+        Returns
+        -------
+        dict
+            State of the dataset.
+        """
+        state = get_shared_state(self.__dict__, self._shared)
+        if self._shared:
+            for name in ("inputs", "input_targets"):
+                if isinstance(state[name], np.ndarray):
+                    state[name] = None
+
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """
+        Restore the state, with the data in shared memory.
+
+        Parameters
+        ----------
+        state : dict
+            State of the dataset.
+        """
+        self.__dict__.update(set_shared_state(state, state["_shared"]))
+
+    def _prepare_cached(
+        self, supervised: bool, coordinates: bool
+    ) -> Union[PatchedOutput, PatchCoordinatesOutput]:
+        """
+        Prepare patches or patch coordinates, using the on-disk cache if enabled.
+
+        The cache is only used for data read from files, and if `cache_patches` is
+        set in the data configuration.
+
+        Parameters
+        ----------
+        supervised : bool
+            Whether the dataset is supervised or not.
+        coordinates : bool
+            Whether to prepare patch coordinates rather than patches.
+
+        Returns
+        -------
+        PatchedOutput or PatchCoordinatesOutput
+            Dataclass holding the patches (or patch coordinates) and statistics.
+        """
+        prepare = (
+            self._prepare_patch_coordinates if coordinates else self._prepare_patches
         )
+        if not self.data_config.cache_patches or not isinstance(self.inputs, list):
+            return prepare(supervised)
+
+        cache = PatchCache(max_size_mb=self.data_config.cache_max_size_mb)
+        key = compute_cache_key(
+            self.inputs,
+            self.input_targets if isinstance(self.input_targets, list) else None,
+            self.axes,
+            self.patch_size,
+            read_source_func=self.read_source_func,
+            in_memory_patching=self.data_config.in_memory_patching,
+        )
+
+        cached: Optional[Union[PatchedOutput, PatchCoordinatesOutput]] = (
+            cache.load_patch_coordinates(key)
+            if coordinates
+            else cache.load_patches(key)
+        )
+        if cached is not None:
+            logger.info(f"Loaded patches from cache ({cache.cache_dir / key}).")
+            return cached
+
+        output = prepare(supervised)
+        if isinstance(output, PatchCoordinatesOutput):
+            cache.save_patch_coordinates(key, output)
+        else:
+            cache.save_patches(key, output)
+
+        return output
 
     def _prepare_patches(self, supervised: bool) -> PatchedOutput:
         """
@@ -157,6 +300,8 @@ class InMemoryDataset(Dataset):
                     self.axes,
                     self.patch_size,
                     self.read_source_func,
+                    num_workers=self.data_config.num_loading_workers,
+                    pool=self.data_config.loading_pool,
                 )
             else:
                 raise ValueError(
@@ -177,8 +322,97 @@ class InMemoryDataset(Dataset):
                     self.axes,
                     self.patch_size,
                     self.read_source_func,
+                    num_workers=self.data_config.num_loading_workers,
+                    pool=self.data_config.loading_pool,
+                )
+
+    def _prepare_patch_coordinates(self, supervised: bool) -> PatchCoordinatesOutput:
+        """
+        Iterate over data source and compute the coordinates of the patches.
+
+        Parameters
+        ----------
+        supervised : bool
+            Whether the dataset is supervised or not.
+
+        Returns
+        -------
+        PatchCoordinatesOutput
+            Dataclass holding the images, patch coordinates and statistics.
+        """
+        if supervised:
+            if isinstance(self.inputs, np.ndarray) and isinstance(
+                self.input_targets, np.ndarray
+            ):
+                return prepare_patch_coordinates_supervised_array(
+                    self.inputs,
+                    self.axes,
+                    self.input_targets,
+                    self.patch_size,
+                )
+            elif isinstance(self.inputs, list) and isinstance(self.input_targets, list):
+                return prepare_patch_coordinates_supervised(
+                    self.inputs,
+                    self.input_targets,
+                    self.axes,
+                    self.patch_size,
+                    self.read_source_func,
+                    num_workers=self.data_config.num_loading_workers,
+                    pool=self.data_config.loading_pool,
+                )
+            else:
+                raise ValueError(
+                    f"Data and target must be of the same type, either both numpy "
+                    f"arrays or both lists of paths, got {type(self.inputs)} (data) "
+                    f"and {type(self.input_targets)} (target)."
+                )
+        else:
+            if isinstance(self.inputs, np.ndarray):
+                return prepare_patch_coordinates_unsupervised_array(
+                    self.inputs,
+                    self.axes,
+                    self.patch_size,
+                )
+            else:
+                return prepare_patch_coordinates_unsupervised(
+                    self.inputs,
+                    self.axes,
+                    self.patch_size,
+                    self.read_source_func,
+                    num_workers=self.data_config.num_loading_workers,
+                    pool=self.data_config.loading_pool,
                 )
 
+    def _slice_patch(self, index: int) -> tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Slice the patch and its target from the images using the patch coordinates.
+
+        Parameters
+        ----------
+        index : int
+            Index of the patch to return.
+
+        Returns
+        -------
+        tuple of (numpy.ndarray, numpy.ndarray or None)
+            Patch and target, the target is None if the dataset is unsupervised.
+        """
+        # mypy checks
+        assert self.images is not None and self.patch_coordinates is not None
+
+        image_idx, sample_idx, *start = self.patch_coordinates[index]
+        patch_slice = (
+            sample_idx,
+            ...,
+            *[slice(s, s + p) for s, p in zip(start, self.patch_size)],
+        )
+
+        patch = self.images[image_idx][patch_slice]
+        if self.image_targets is not None:
+            return patch, self.image_targets[image_idx][patch_slice]
+
+        return patch, None
+
     def __len__(self) -> int:
         """
         Return the length of the dataset.
@@ -188,6 +422,15 @@ class InMemoryDataset(Dataset):
         int
             Length of the dataset.
         """
+        if self.patch_coordinates is not None:
+            return self.patch_coordinates.shape[0]
+
+        if self.patch_indices is not None:
+            return self.patch_indices.shape[0]
+
+        # mypy check
+        assert self.data is not None
+
         return self.data.shape[0]
 
     def __getitem__(self, index: int) -> tuple[np.ndarray, ...]:
@@ -209,12 +452,20 @@ class InMemoryDataset(Dataset):
         ValueError
             If dataset mean and std are not set.
         """
-        patch = self.data[index]
+        if self.patch_coordinates is not None:
+            patch, target = self._slice_patch(index)
+        else:
+            # mypy check
+            assert self.data is not None
+
+            if self.patch_indices is not None:
+                index = int(self.patch_indices[index])
+
+            patch = self.data[index]
+            target = self.data_targets[index] if self.data_targets is not None else None
 
         # if there is a target
-        if self.data_targets is not None:
-            # get target
-            target = self.data_targets[index]
+        if target is not None:
             return self.patch_transform(patch=patch, target=target)
 
         return self.patch_transform(patch=patch)
@@ -239,6 +490,8 @@ class InMemoryDataset(Dataset):
         """Split a new dataset away from the current one.
 
         This method is used to extract random validation patches from the dataset.
+        No patch is copied: both datasets share the same patches (or images), and
+        only hold the indices (or coordinates) of their own patches.
 
         Parameters
         ----------
@@ -278,25 +531,29 @@ class InMemoryDataset(Dataset):
         # get random indices
         indices = np.random.choice(total_patches, n_patches, replace=False)
 
-        # extract patches
-        val_patches = self.data[indices]
+        # split through a mask, without copying the patches or the images
+        val_mask = np.zeros(total_patches, dtype=bool)
+        val_mask[indices] = True
 
-        # remove patches from self.patch
-        self.data = np.delete(self.data, indices, axis=0)
+        # shallow copy, the patches or images are shared between the datasets
+        dataset = copy.copy(self)
+        dataset.patch_transform = copy.deepcopy(self.patch_transform)
 
-        # same for targets
-        if self.data_targets is not None:
-            val_targets = self.data_targets[indices]
-            self.data_targets = np.delete(self.data_targets, indices, axis=0)
+        if self.patch_coordinates is not None:
+            dataset.patch_coordinates = self.patch_coordinates[val_mask]
+            self.patch_coordinates = self.patch_coordinates[~val_mask]
 
-        # clone the dataset
-        dataset = copy.deepcopy(self)
+            return dataset
 
-        # reassign patches
-        dataset.data = val_patches
+        # mypy check
+        assert self.data is not None
 
-        # reassign targets
-        if self.data_targets is not None:
-            dataset.data_targets = val_targets
+        patch_indices = (
+            self.patch_indices
+            if self.patch_indices is not None
+            else np.arange(total_patches)
+        )
+        dataset.patch_indices = patch_indices[val_mask]
+        self.patch_indices = patch_indices[~val_mask]
 
         return dataset
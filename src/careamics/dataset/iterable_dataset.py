@@ -4,11 +4,13 @@ from __future__ import annotations
 
 import copy
 from collections.abc import Generator
+from functools import partial
+from itertools import islice
 from pathlib import Path
 from typing import Callable, Optional
 
 import numpy as np
-from torch.utils.data import IterableDataset
+from torch.utils.data import IterableDataset, get_worker_info
 
 from careamics.config import DataConfig
 from careamics.config.transformations import NormalizeModel
@@ -16,14 +18,133 @@ from careamics.file_io.read import read_tiff
 from careamics.transforms import Compose
 
 from ..utils.logging import get_logger
-from .dataset_utils import iterate_over_files
+from .dataset_utils import (
+    get_number_of_patches,
+    parallel_map,
+    prefetch,
+    reshape_array,
+    shuffle_buffer,
+)
+from .dataset_utils.iterate_over_files import (
+    get_distributed_info,
+    get_file_read_func,
+    iterate_over_worker_files,
+    shard_across_ranks,
+)
 from .dataset_utils.running_stats import WelfordStatistics
+from .dataset_utils.tiff_pages import read_tiff_fraction
+from .patching.foreground_sampling import ForegroundIndex
+from .patching.patch_cache import PatchCache, compute_cache_key
 from .patching.patching import Stats
 from .patching.random_patching import extract_patches_random
 
 logger = get_logger(__name__)
 
 
+def _read_statistics_sample(
+    file_path: Path,
+    axes: str,
+    read_source_func: Callable,
+    fraction: float,
+    seed: int,
+) -> np.ndarray:
+    """
+    Read a file, or a random subset of its pages, to compute its statistics.
+
+    Only tiff files read with `read_tiff`, including those not kept in memory by a
+    `CachedReadFunc`, are partially read (see `read_tiff_fraction`), other files are
+    read entirely.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        Path to the file.
+    axes : str
+        Axes of the data.
+    read_source_func : Callable
+        Function to read the data.
+    fraction : float
+        Fraction of the pages to read.
+    seed : int
+        Seed used to draw the pages, the same pages are drawn for the targets.
+
+    Returns
+    -------
+    numpy.ndarray
+        Data of shape (S, C, (Z), Y, X).
+    """
+    read_source_func = get_file_read_func(file_path, read_source_func)
+    if fraction < 1 and read_source_func is read_tiff:
+        sample = read_tiff_fraction(
+            file_path, axes, fraction, np.random.default_rng(seed)
+        )
+        if sample is not None:
+            return sample
+
+    return reshape_array(read_source_func(file_path, axes), axes)
+
+
+def _compute_file_statistics(
+    file_index: int,
+    data_files: list[Path],
+    target_files: Optional[list[Path]],
+    axes: str,
+    read_source_func: Callable,
+    fraction: float,
+) -> Optional[tuple[WelfordStatistics, Optional[WelfordStatistics]]]:
+    """
+    Compute the statistics of a single file and of its optional target.
+
+    Errors are logged and result in `None` being returned, in which case the file is
+    ignored.
+
+    Parameters
+    ----------
+    file_index : int
+        Index of the file, also used to seed the page subsampling.
+    data_files : list of pathlib.Path
+        List of data files.
+    target_files : list of pathlib.Path or None
+        List of target files.
+    axes : str
+        Axes of the data.
+    read_source_func : Callable
+        Function to read the data.
+    fraction : float
+        Fraction of the pages of tiff files read to compute the statistics.
+
+    Returns
+    -------
+    tuple of (WelfordStatistics, WelfordStatistics or None) or None
+        Statistics of the file and of its target, None if they could not be read.
+    """
+    filename = data_files[file_index]
+    try:
+        sample = _read_statistics_sample(
+            filename, axes, read_source_func, fraction, file_index
+        )
+        image_stats = WelfordStatistics.from_array(sample)
+
+        target_stats = None
+        if target_files is not None:
+            if filename.name != target_files[file_index].name:
+                raise ValueError(
+                    f"File {filename} does not match target file "
+                    f"{target_files[file_index]}. Have you passed sorted arrays?"
+                )
+
+            target = _read_statistics_sample(
+                target_files[file_index], axes, read_source_func, fraction, file_index
+            )
+            target_stats = WelfordStatistics.from_array(target)
+
+        return image_stats, target_stats
+
+    except Exception as e:
+        logger.error(f"Error reading file {filename}: {e}")
+        return None
+
+
 class PathIterableDataset(IterableDataset):
     """
     Dataset allowing extracting patches w/o loading whole data into memory.
@@ -38,6 +159,9 @@ class PathIterableDataset(IterableDataset):
         Optional list of target files, by default None.
     read_source_func : Callable, optional
         Read source function for custom types, by default read_tiff.
+    read_metadata_func : Callable, optional
+        Function returning the metadata of custom files, used to count their patches
+        in a distributed setting, by default None.
 
     Attributes
     ----------
@@ -53,6 +177,7 @@ class PathIterableDataset(IterableDataset):
         src_files: list[Path],
         target_files: Optional[list[Path]] = None,
         read_source_func: Callable = read_tiff,
+        read_metadata_func: Optional[Callable] = None,
     ) -> None:
         """Constructors.
 
@@ -66,11 +191,24 @@ class PathIterableDataset(IterableDataset):
             Optional list of target files, by default None.
         read_source_func : Callable, optional
             Read source function for custom types, by default read_tiff.
+        read_metadata_func : Callable, optional
+            Function returning the metadata of custom files, by default None.
         """
         self.data_config = data_config
         self.data_files = src_files
         self.target_files = target_files
         self.read_source_func = read_source_func
+        self.read_metadata_func = read_metadata_func
+
+        # number of patches of each file, only used in a distributed setting
+        self._patch_counts: dict[Path, int] = {}
+
+        # foreground indices of the samples read by the worker, built once for each
+        # file and range of samples, and kept across epochs with persistent workers
+        self._foreground_indices: dict[
+            tuple[Path, Optional[int], Optional[int], Optional[int]],
+            dict[int, ForegroundIndex],
+        ] = {}
 
         # compute mean and std over the dataset
         # only checking the image_mean because the DataConfig class ensures that
@@ -105,52 +243,133 @@ class PathIterableDataset(IterableDataset):
                 Stats(self.data_config.target_means, self.data_config.target_stds),
             )
 
-        # create transform composed of normalization and other transforms
+        # create transform composed of normalization and other transforms, unless
+        # they are applied to whole batches on the training device
         self.patch_transform = Compose(
-            transform_list=[
-                NormalizeModel(
-                    image_means=self.image_stats.means,
-                    image_stds=self.image_stats.stds,
-                    target_means=self.target_stats.means,
-                    target_stds=self.target_stats.stds,
-                )
-            ]
-            + list(data_config.transforms)
+            transform_list=(
+                []
+                if data_config.device_transforms
+                else [
+                    NormalizeModel(
+                        image_means=self.image_stats.means,
+                        image_stds=self.image_stats.stds,
+                        target_means=self.target_stats.means,
+                        target_stds=self.target_stats.stds,
+                    )
+                ]
+                + list(data_config.transforms)
+            )
         )
 
+        # the process group is not available in the dataloader workers, the rank is
+        # recorded, and the patches counted, before the dataset is sent to them
+        self._distributed_info = get_distributed_info()
+        if self._distributed_info[1] > 1:
+            self._get_patch_counts()
+
+    def _get_read_func(self) -> Callable:
+        """
+        Return the function used to read the files.
+
+        Returns
+        -------
+        Callable
+            Read function, called with a file path and the axes.
+        """
+        return self.read_source_func
+
     def _calculate_mean_and_std(self) -> tuple[Stats, Stats]:
         """
         Calculate mean and std of the dataset.
 
+        If `cache_patches` is set in the data configuration, the statistics are
+        loaded from the on-disk cache when available, and saved to it otherwise.
+
         Returns
         -------
         tuple of Stats and optional Stats
             Data classes containing the image and target statistics.
         """
-        num_samples = 0
-        image_stats = WelfordStatistics()
-        if self.target_files is not None:
-            target_stats = WelfordStatistics()
+        if not self.data_config.cache_patches:
+            return self._compute_mean_and_std()
+
+        cache = PatchCache(max_size_mb=self.data_config.cache_max_size_mb)
+        key = compute_cache_key(
+            self.data_files,
+            self.target_files,
+            self.data_config.axes,
+            read_source_func=self.read_source_func,
+            statistics_fraction=self.data_config.statistics_fraction,
+        )
 
-        for sample, target in iterate_over_files(
-            self.data_config, self.data_files, self.target_files, self.read_source_func
-        ):
-            # update the image statistics
-            image_stats.update(sample, num_samples)
+        cached = cache.load_statistics(key)
+        if cached is not None:
+            logger.info(f"Loaded statistics from cache ({cache.cache_dir / key}).")
+            return cached
+
+        image_stats, target_stats = self._compute_mean_and_std()
+        cache.save_statistics(key, image_stats, target_stats)
+
+        return image_stats, target_stats
 
-            # update the target statistics if target is available
-            if target is not None:
-                target_stats.update(target, num_samples)
+    def _compute_mean_and_std(self) -> tuple[Stats, Stats]:
+        """
+        Compute mean and std of the dataset.
+
+        The statistics of each file are computed independently, in parallel if
+        `num_loading_workers` is set in the data configuration, and merged
+        afterwards. If `statistics_fraction` is smaller than 1, the statistics are
+        computed on a random subset of the files and, for tiff files, of their pages,
+        such that only this fraction of the data is read.
 
-            num_samples += 1
+        Returns
+        -------
+        tuple of Stats and optional Stats
+            Data classes containing the image and target statistics.
+        """
+        # subsample the files, then the pages of the files to read the fraction
+        n_files = len(self.data_files)
+        fraction = self.data_config.statistics_fraction
+        file_indices = np.arange(n_files)
+        if fraction < 1:
+            n_selected = max(1, int(np.ceil(fraction * n_files)))
+            rng = np.random.default_rng(n_files)
+            file_indices = np.sort(rng.choice(n_files, n_selected, replace=False))
+            fraction = min(1.0, fraction * n_files / n_selected)
+
+        compute_func = partial(
+            _compute_file_statistics,
+            data_files=self.data_files,
+            target_files=self.target_files,
+            axes=self.data_config.axes,
+            read_source_func=self._get_read_func(),
+            fraction=fraction,
+        )
+        file_stats = parallel_map(
+            compute_func,
+            file_indices.tolist(),
+            num_workers=self.data_config.num_loading_workers,
+            pool=self.data_config.loading_pool,
+        )
 
-        if num_samples == 0:
+        image_stats = WelfordStatistics()
+        target_stats = WelfordStatistics()
+        num_files = 0
+        for stats in file_stats:
+            if stats is None:
+                continue
+
+            image_stats.merge(stats[0])
+            if stats[1] is not None:
+                target_stats.merge(stats[1])
+            num_files += 1
+
+        if num_files == 0:
             raise ValueError("No samples found in the dataset.")
 
-        # Average the means and stds per sample
         image_means, image_stds = image_stats.finalize()
 
-        if target is not None:
+        if self.target_files is not None:
             target_means, target_stds = target_stats.finalize()
 
             return (
@@ -175,26 +394,172 @@ class PathIterableDataset(IterableDataset):
             self.image_stats.means is not None and self.image_stats.stds is not None
         ), "Mean and std must be provided"
 
-        # iterate over files
-        for sample_input, sample_target in iterate_over_files(
-            self.data_config, self.data_files, self.target_files, self.read_source_func
+        # iterate over the patches, mixing those of several files if requested
+        patches = self._iterate_over_patches()
+        if self.data_config.shuffle_buffer_mb > 0:
+            patches = shuffle_buffer(
+                patches, max_bytes=int(self.data_config.shuffle_buffer_mb * 1024**2)
+            )
+
+        # patches are tuples of (patch, target) if target is available
+        # or (patch, None) only if no target is available
+        # patch is of dimensions (C)ZYX
+        for patch_data in patches:
+            yield self.patch_transform(
+                patch=patch_data[0],
+                target=patch_data[1],
+            )
+
+    def _get_patch_counts(self) -> list[int]:
+        """
+        Return the number of patches of each file, counted from their metadata.
+
+        Returns
+        -------
+        list of int
+            Number of patches of each file, 0 if it could not be counted.
+        """
+        for file in self.data_files:
+            if file not in self._patch_counts:
+                try:
+                    self._patch_counts[file] = get_number_of_patches(
+                        file,
+                        self.data_config.axes,
+                        self.data_config.patch_size,
+                        read_metadata_func=self.read_metadata_func,
+                        read_source_func=self._get_read_func(),
+                    )
+                except Exception as e:
+                    logger.error(f"Error reading the metadata of {file}: {e}")
+                    self._patch_counts[file] = 0
+
+        return [self._patch_counts[file] for file in self.data_files]
+
+    def _iterate_over_patches(
+        self,
+    ) -> Generator[tuple[np.ndarray, Optional[np.ndarray]], None, None]:
+        """
+        Iterate over the patches of the files, sharded across distributed ranks.
+
+        In a distributed setting (e.g. DDP), the files are balanced across ranks
+        according to their number of patches (see `shard_across_ranks`). Every rank
+        must however yield the same number of batches, otherwise the ranks would wait
+        for each other at the end of the epoch. Each rank therefore yields as many
+        patches as the rank with the most patches, which are split evenly between
+        the dataloader workers so that every rank yields the same number of batches.
+        The patches of each worker are repeated, i.e. its files are read again, until
+        its share is reached. Workers without files, e.g. if a single image is shared
+        by several workers, draw their patches from all the files of the rank.
+
+        As the process group is not available in the dataloader workers, the rank
+        is that of the process in which the dataset was created, or last iterated.
+
+        Yields
+        ------
+        tuple of (numpy.ndarray, numpy.ndarray or None)
+            Patch and optional target, before transformation.
+        """
+        worker_info = get_worker_info()
+        if worker_info is None:
+            self._distributed_info = get_distributed_info()
+        rank, world_size = self._distributed_info
+        if world_size <= 1:
+            yield from self._iterate_over_file_patches()
+            return
+
+        patch_counts = self._get_patch_counts()
+        shards = [
+            shard_across_ranks(patch_counts, r, world_size) for r in range(world_size)
+        ]
+        n_patches = max(sum(patch_counts[i] for i in shard) for shard in shards)
+
+        # share of the worker, identical across ranks
+        worker_id = worker_info.id if worker_info is not None else 0
+        num_workers = worker_info.num_workers if worker_info is not None else 1
+        n_worker_patches = n_patches // num_workers + int(
+            worker_id < n_patches % num_workers
+        )
+
+        yield from islice(self._cycle_over_file_patches(shards[rank]), n_worker_patches)
+
+    def _cycle_over_file_patches(
+        self, file_indices: list[int]
+    ) -> Generator[tuple[np.ndarray, Optional[np.ndarray]], None, None]:
+        """
+        Iterate indefinitely over the random patches of some files.
+
+        If the worker does not receive any patch from the files, it iterates over the
+        patches of all the files instead. The iteration stops if none of the files
+        can be read.
+
+        Parameters
+        ----------
+        file_indices : list of int
+            Indices of the files.
+
+        Yields
+        ------
+        tuple of (numpy.ndarray, numpy.ndarray or None)
+            Patch and optional target, before transformation.
+        """
+        shard_workers = True
+        while True:
+            n_yielded = 0
+            for patch in self._iterate_over_file_patches(file_indices, shard_workers):
+                n_yielded += 1
+                yield patch
+
+            if n_yielded == 0:
+                if not shard_workers:
+                    return
+                shard_workers = False
+
+    def _iterate_over_file_patches(
+        self, file_indices: Optional[list[int]] = None, shard_workers: bool = True
+    ) -> Generator[tuple[np.ndarray, Optional[np.ndarray]], None, None]:
+        """
+        Iterate over the files and yield their random patches, file by file.
+
+        Parameters
+        ----------
+        file_indices : list of int, optional
+            Indices of the files, by default None. If None, all files are used.
+        shard_workers : bool, optional
+            Whether to split the files between dataloader workers, by default True.
+
+        Yields
+        ------
+        tuple of (numpy.ndarray, numpy.ndarray or None)
+            Patch and optional target, before transformation.
+        """
+        # iterate over files, reading the next ones in the background
+        for file_idx, samples, sample_input, sample_target in prefetch(
+            iterate_over_worker_files(
+                self.data_config,
+                self.data_files,
+                self.target_files,
+                self._get_read_func(),
+                split_samples=True,
+                file_indices=file_indices,
+                shard_workers=shard_workers,
+            ),
+            depth=self.data_config.prefetch_files,
         ):
-            patches = extract_patches_random(
+            key = (self.data_files[file_idx], samples.start, samples.stop, samples.step)
+            yield from extract_patches_random(
                 arr=sample_input,
                 patch_size=self.data_config.patch_size,
                 target=sample_target,
+                dtype=(
+                    None
+                    if self.data_config.storage_dtype == "native"
+                    else self.data_config.storage_dtype
+                ),
+                foreground_ratio=self.data_config.foreground_ratio,
+                foreground_threshold=self.data_config.foreground_threshold,
+                foreground_indices=self._foreground_indices.setdefault(key, {}),
             )
 
-            # iterate over patches
-            # patches are tuples of (patch, target) if target is available
-            # or (patch, None) only if no target is available
-            # patch is of dimensions (C)ZYX
-            for patch_data in patches:
-                yield self.patch_transform(
-                    patch=patch_data[0],
-                    target=patch_data[1],
-                )
-
     def get_data_statistics(self) -> tuple[list[float], list[float]]:
         """Return training data statistics.
 
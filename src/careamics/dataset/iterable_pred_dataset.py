@@ -7,7 +7,7 @@ from pathlib import Path
 from typing import Any, Callable
 
 from numpy.typing import NDArray
-from torch.utils.data import IterableDataset
+from torch.utils.data import IterableDataset, get_worker_info
 
 from careamics.file_io.read import read_tiff
 from careamics.transforms import Compose
@@ -15,6 +15,7 @@ from careamics.transforms import Compose
 from ..config import InferenceConfig
 from ..config.transformations import NormalizeModel
 from .dataset_utils import iterate_over_files
+from .dataset_utils.iterate_over_files import get_distributed_info, get_rank_files
 
 
 class IterablePredDataset(IterableDataset):
@@ -43,6 +44,9 @@ class IterablePredDataset(IterableDataset):
         Expected standard deviation of the dataset, by default None.
     patch_transform : Optional[Callable], optional
         Patch transform callable, by default None.
+    file_indices : list of int
+        Indices of the files predicted by the current distributed rank, all files
+        if the prediction is not distributed.
     """
 
     def __init__(
@@ -75,6 +79,10 @@ class IterablePredDataset(IterableDataset):
         self.axes = prediction_config.axes
         self.read_source_func = read_source_func
 
+        # in a distributed setting (e.g. DDP), each file is predicted by a single
+        # rank, the rank is recorded before the dataset is sent to the workers
+        self.file_indices = get_rank_files(self.data_files, get_distributed_info())
+
         # check mean and std and create normalize transform
         if (
             self.prediction_config.image_means is None
@@ -110,10 +118,14 @@ class IterablePredDataset(IterableDataset):
             self.image_means is not None and self.image_stds is not None
         ), "Mean and std must be provided"
 
+        if get_worker_info() is None:
+            self.file_indices = get_rank_files(self.data_files, get_distributed_info())
+
         for sample, _ in iterate_over_files(
             self.prediction_config,
             self.data_files,
             read_source_func=self.read_source_func,
+            file_indices=self.file_indices,
         ):
             # sample has S dimension
             for i in range(sample.shape[0]):
@@ -7,7 +7,7 @@ from pathlib import Path
 from typing import Any, Callable
 
 from numpy.typing import NDArray
-from torch.utils.data import IterableDataset
+from torch.utils.data import IterableDataset, get_worker_info
 
 from careamics.file_io.read import read_tiff
 from careamics.transforms import Compose
@@ -16,6 +16,7 @@ from ..config import InferenceConfig
 from ..config.tile_information import TileInformation
 from ..config.transformations import NormalizeModel
 from .dataset_utils import iterate_over_files
+from .dataset_utils.iterate_over_files import get_distributed_info, get_rank_files
 from .tiling import extract_tiles
 
 
@@ -45,6 +46,9 @@ class IterableTiledPredDataset(IterableDataset):
         Expected standard deviation of the dataset, by default None.
     patch_transform : Callable, optional
         Patch transform callable, by default None.
+    file_indices : list of int
+        Indices of the files predicted by the current distributed rank, all files
+        if the prediction is not distributed.
     """
 
     def __init__(
@@ -87,6 +91,10 @@ class IterableTiledPredDataset(IterableDataset):
         self.tile_overlap = prediction_config.tile_overlap
         self.read_source_func = read_source_func
 
+        # in a distributed setting (e.g. DDP), each file is predicted by a single
+        # rank, the rank is recorded before the dataset is sent to the workers
+        self.file_indices = get_rank_files(self.data_files, get_distributed_info())
+
         # check mean and std and create normalize transform
         if (
             self.prediction_config.image_means is None
@@ -122,10 +130,14 @@ class IterableTiledPredDataset(IterableDataset):
             self.image_means is not None and self.image_stds is not None
         ), "Mean and std must be provided"
 
+        if get_worker_info() is None:
+            self.file_indices = get_rank_files(self.data_files, get_distributed_info())
+
         for sample, _ in iterate_over_files(
             self.prediction_config,
             self.data_files,
             read_source_func=self.read_source_func,
+            file_indices=self.file_indices,
         ):
             # generate patches, return a generator of single tiles
             patch_gen = extract_tiles(
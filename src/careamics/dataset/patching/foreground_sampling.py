@@ -0,0 +1,226 @@
+"""Foreground-aware sampling of random patch coordinates."""
+
+from __future__ import annotations
+
+import itertools
+from collections.abc import Sequence
+from typing import Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+class ForegroundIndex:
+    """
+    Index of the patch positions of an image containing foreground.
+
+    The index is built once per image, by thresholding its intensity (maximum over the
+    channels) and averaging the foreground mask over blocks of a quarter of the patch
+    size. The foreground fraction of every block-aligned patch position is then
+    computed from the integral image of the downsampled mask, and the positions with
+    enough foreground are recorded. The fraction is computed without the first block
+    along each axis, so that the foreground stays in the patch when it is shifted by
+    less than a block.
+
+    Parameters
+    ----------
+    coords : numpy.ndarray
+        Block coordinates of the foreground patch positions, shape (N, D).
+    block_size : tuple of int
+        Size of the blocks, in pixels.
+    max_coords : tuple of int
+        Largest valid patch coordinates, in pixels.
+    """
+
+    def __init__(
+        self,
+        coords: NDArray,
+        block_size: Sequence[int],
+        max_coords: Sequence[int],
+    ) -> None:
+        """Constructor.
+
+        Parameters
+        ----------
+        coords : numpy.ndarray
+            Block coordinates of the foreground patch positions, shape (N, D).
+        block_size : tuple of int
+            Size of the blocks, in pixels.
+        max_coords : tuple of int
+            Largest valid patch coordinates, in pixels.
+        """
+        self.coords = coords
+        self.block_size = tuple(block_size)
+        self.max_coords = tuple(max_coords)
+
+    @classmethod
+    def from_array(
+        cls,
+        array: NDArray,
+        patch_size: Sequence[int],
+        threshold: Optional[float] = None,
+        min_fraction: float = 0.05,
+    ) -> ForegroundIndex:
+        """
+        Build the foreground index of an image.
+
+        Parameters
+        ----------
+        array : numpy.ndarray
+            Image, with the spatial dimensions last (e.g. C(Z)YX).
+        patch_size : sequence of int
+            Size of the patches.
+        threshold : float, optional
+            Intensity above which pixels are considered foreground, by default None.
+            If None, the mean plus one standard deviation of the image is used.
+        min_fraction : float, optional
+            Minimum fraction of foreground pixels of a foreground patch, by default
+            0.05.
+
+        Returns
+        -------
+        ForegroundIndex
+            Foreground index of the image.
+        """
+        n_dims = len(patch_size)
+        spatial_shape = np.array(array.shape[-n_dims:])
+        patch = np.array(patch_size)
+
+        # foreground mask of the maximum intensity over the non-spatial axes
+        intensity = array.max(axis=tuple(range(array.ndim - n_dims)))
+        if threshold is None:
+            threshold = float(intensity.mean() + intensity.std())
+        mask = intensity > threshold
+
+        # fraction of foreground pixels in each block
+        block_size = np.maximum(patch // 4, 1)
+        n_blocks = spatial_shape // block_size
+        mask = mask[tuple(slice(0, n * b) for n, b in zip(n_blocks, block_size))]
+        block_shape = [s for nb in zip(n_blocks, block_size) for s in nb]
+        fraction = mask.reshape(block_shape).mean(axis=tuple(range(1, 2 * n_dims, 2)))
+
+        # integral image, padded with zeros
+        integral = np.pad(fraction, [(1, 0)] * n_dims)
+        for axis in range(n_dims):
+            integral = integral.cumsum(axis=axis)
+
+        # foreground fraction of the patches starting at each block, excluding their
+        # first block, which is partially lost when shifting the patch
+        patch_blocks = patch // block_size
+        n_positions = n_blocks - patch_blocks + 1
+        first = (block_size > 1).astype(int)
+        inner_blocks = np.maximum(patch_blocks - first, 1)
+        max_coords = spatial_shape - patch
+        if np.any(n_positions < 1):
+            return cls(
+                np.empty((0, n_dims), dtype=np.int32),
+                block_size.tolist(),
+                max_coords.tolist(),
+            )
+
+        box = np.zeros(n_positions)
+        for corner in itertools.product((0, 1), repeat=n_dims):
+            sign = (-1) ** (n_dims - sum(corner))
+            box += (
+                sign
+                * integral[
+                    tuple(
+                        slice(f + c * p, f + c * p + n)
+                        for c, f, p, n in zip(corner, first, inner_blocks, n_positions)
+                    )
+                ]
+            )
+        patch_fraction = box / np.prod(inner_blocks)
+
+        coords = np.argwhere(patch_fraction >= min_fraction).astype(np.int32)
+        return cls(coords, block_size.tolist(), max_coords.tolist())
+
+    def __len__(self) -> int:
+        """
+        Return the number of foreground patch positions.
+
+        Returns
+        -------
+        int
+            Number of foreground patch positions.
+        """
+        return len(self.coords)
+
+    def sample(self, rng: np.random.Generator, n_patches: int) -> NDArray:
+        """
+        Draw random coordinates of foreground patches.
+
+        The patches are drawn uniformly among the foreground positions, and shifted
+        by a random offset within a block.
+
+        Parameters
+        ----------
+        rng : numpy.random.Generator
+            Random number generator.
+        n_patches : int
+            Number of patches.
+
+        Returns
+        -------
+        numpy.ndarray
+            Patch coordinates, in pixels, shape (n_patches, D).
+        """
+        positions = self.coords[rng.integers(len(self.coords), size=n_patches)]
+        offsets = rng.integers(0, self.block_size, size=positions.shape)
+        coords = positions * np.array(self.block_size) + offsets
+        return np.minimum(coords, self.max_coords).astype(np.int32)
+
+
+def sample_patch_coordinates(
+    rng: np.random.Generator,
+    spatial_shape: Sequence[int],
+    patch_size: Sequence[int],
+    n_patches: int,
+    foreground_index: Optional[ForegroundIndex] = None,
+    foreground_ratio: float = 0.0,
+) -> NDArray:
+    """
+    Draw random patch coordinates, a fraction of them among the foreground patches.
+
+    Each patch is drawn among the foreground patches of the index with probability
+    `foreground_ratio`, and uniformly over the image otherwise. If the index is empty,
+    all patches are drawn uniformly.
+
+    Parameters
+    ----------
+    rng : numpy.random.Generator
+        Random number generator.
+    spatial_shape : sequence of int
+        Spatial shape of the image.
+    patch_size : sequence of int
+        Size of the patches.
+    n_patches : int
+        Number of patches.
+    foreground_index : ForegroundIndex, optional
+        Foreground index of the image, by default None.
+    foreground_ratio : float, optional
+        Expected fraction of foreground patches, by default 0.
+
+    Returns
+    -------
+    numpy.ndarray
+        Patch coordinates, shape (n_patches, D).
+    """
+    n_foreground = 0
+    if foreground_index is not None and len(foreground_index) > 0:
+        n_foreground = int(rng.binomial(n_patches, foreground_ratio))
+
+    uniform = rng.integers(
+        np.zeros(len(patch_size), dtype=int),
+        np.array(spatial_shape) - np.array(patch_size),
+        size=(n_patches - n_foreground, len(patch_size)),
+        endpoint=True,
+    ).astype(np.int32)
+    if n_foreground == 0:
+        return uniform
+
+    # mypy check
+    assert foreground_index is not None
+
+    coords = np.concatenate([foreground_index.sample(rng, n_foreground), uniform])
+    return coords[rng.permutation(n_patches)]
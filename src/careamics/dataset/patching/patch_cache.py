@@ -0,0 +1,481 @@
+"""Persistent on-disk cache of patches and statistics.
+
+Preparing an in-memory dataset from files requires reading every file, patching it and
+computing the normalization statistics. This module allows storing the outcome of these
+steps in the CAREamics home directory, so that subsequent trainings on the same files
+can memory-map the cached arrays instead.
+
+Cache entries are keyed by the file paths, their modification times and sizes, the
+axes, the patch size and any additional parameter that influences the content of the
+cache (e.g. the patching mode or the read function).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ...utils import get_careamics_home
+from ...utils.logging import get_logger
+from .patching import PatchCoordinatesOutput, PatchedOutput, Stats
+
+logger = get_logger(__name__)
+
+CACHE_VERSION = 1
+"""Version of the cache layout, part of the key to invalidate stale entries."""
+
+DEFAULT_MAX_SIZE_MB = 10240
+"""Default maximum size of the cache, in MB."""
+
+
+def get_patch_cache_dir() -> Path:
+    """Return the default patch cache directory.
+
+    Returns
+    -------
+    pathlib.Path
+        Patch cache directory, located in the CAREamics home directory.
+    """
+    return get_careamics_home() / "cache" / "patches"
+
+
+def _describe_files(files: Optional[list[Path]]) -> Optional[list[list[Any]]]:
+    """Describe files by their absolute path, modification time and size.
+
+    Parameters
+    ----------
+    files : list of pathlib.Path or None
+        List of files.
+
+    Returns
+    -------
+    list of list or None
+        Description of each file, None if `files` is None.
+    """
+    if files is None:
+        return None
+
+    description = []
+    for file in files:
+        file_stat = Path(file).stat()
+        description.append(
+            [str(Path(file).resolve()), file_stat.st_mtime_ns, file_stat.st_size]
+        )
+
+    return description
+
+
+def _describe_function(func: Optional[Callable]) -> Optional[str]:
+    """Describe a function by its module and qualified name.
+
+    Parameters
+    ----------
+    func : Callable or None
+        Function.
+
+    Returns
+    -------
+    str or None
+        Description of the function, None if `func` is None.
+    """
+    if func is None:
+        return None
+
+    module = getattr(func, "__module__", "")
+    name = getattr(func, "__qualname__", type(func).__qualname__)
+    return f"{module}.{name}"
+
+
+def compute_cache_key(
+    files: list[Path],
+    target_files: Optional[list[Path]],
+    axes: str,
+    patch_size: Optional[Union[list[int], tuple[int, ...]]] = None,
+    read_source_func: Optional[Callable] = None,
+    **kwargs: Any,
+) -> str:
+    """Compute the cache key of a set of files.
+
+    Parameters
+    ----------
+    files : list of pathlib.Path
+        List of source files.
+    target_files : list of pathlib.Path or None
+        List of target files.
+    axes : str
+        Axes of the data.
+    patch_size : list or tuple of int, optional
+        Size of the patches, by default None.
+    read_source_func : Callable, optional
+        Function used to read the files, by default None.
+    **kwargs : Any
+        Additional JSON serializable parameters influencing the cached content.
+
+    Returns
+    -------
+    str
+        Hexadecimal key.
+    """
+    description = {
+        "version": CACHE_VERSION,
+        "files": _describe_files(files),
+        "target_files": _describe_files(target_files),
+        "axes": axes,
+        "patch_size": list(patch_size) if patch_size is not None else None,
+        "read_source_func": _describe_function(read_source_func),
+        **kwargs,
+    }
+    serialized = json.dumps(description, sort_keys=True, default=str)
+
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+class PatchCache:
+    """Content-addressed on-disk cache of patches and statistics.
+
+    Each entry is a folder named after its key, containing one `.npy` file per array.
+    Arrays are memory-mapped in read-only mode when loaded.
+
+    The modification time of an entry records its last use. When saving an entry
+    brings the cache over its maximum size, the least recently used entries are
+    removed, such that entries of modified files or previous configurations do not
+    accumulate.
+
+    Parameters
+    ----------
+    cache_dir : pathlib.Path or str, optional
+        Cache directory, by default `get_patch_cache_dir()`.
+    max_size_mb : float, optional
+        Maximum size of the cache in MB, by default 10240.
+
+    Attributes
+    ----------
+    cache_dir : pathlib.Path
+        Cache directory.
+    max_size_mb : float
+        Maximum size of the cache in MB.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[Union[Path, str]] = None,
+        max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+    ) -> None:
+        """Constructor.
+
+        Parameters
+        ----------
+        cache_dir : pathlib.Path or str, optional
+            Cache directory, by default `get_patch_cache_dir()`.
+        max_size_mb : float, optional
+            Maximum size of the cache in MB, by default 10240.
+        """
+        self.cache_dir = (
+            Path(cache_dir) if cache_dir is not None else get_patch_cache_dir()
+        )
+        self.max_size_mb = max_size_mb
+
+    def _save_arrays(self, key: str, arrays: dict[str, NDArray]) -> None:
+        """Save arrays under a key.
+
+        The arrays are first written to a temporary folder, which is then renamed, so
+        that concurrent runs never observe partially written entries.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+        arrays : dict of {str: numpy.ndarray}
+            Arrays to save, the keys are used as file names.
+        """
+        entry = self.cache_dir / key
+        if entry.exists():
+            return
+
+        tmp_entry = self.cache_dir / f"{key}.tmp-{os.getpid()}"
+        try:
+            tmp_entry.mkdir(parents=True, exist_ok=True)
+            for name, array in arrays.items():
+                np.save(tmp_entry / f"{name}.npy", np.asarray(array))
+            os.replace(tmp_entry, entry)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {entry}: {e}")
+        finally:
+            if tmp_entry.exists():
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+
+        self._evict(keep=key)
+
+    def _evict(self, keep: str) -> None:
+        """Remove the least recently used entries until the cache fits its size.
+
+        Parameters
+        ----------
+        keep : str
+            Key of an entry that is never removed, e.g. the entry just saved.
+        """
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            # skip the temporary folders of entries being written
+            if not entry.is_dir() or ".tmp-" in entry.name:
+                continue
+            try:
+                size = sum(file.stat().st_size for file in entry.glob("*.npy"))
+                entries.append((entry.stat().st_mtime_ns, size, entry))
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_size_mb * 1024**2:
+                break
+            if entry.name == keep:
+                continue
+
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            logger.info(f"Removed least recently used cache entry {entry}.")
+
+    def _load_arrays(self, key: str) -> Optional[dict[str, NDArray]]:
+        """Load the arrays saved under a key.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+
+        Returns
+        -------
+        dict of {str: numpy.ndarray} or None
+            Memory-mapped arrays, None if the key is not in the cache.
+        """
+        entry = self.cache_dir / key
+        if not entry.is_dir():
+            return None
+
+        try:
+            arrays = {
+                file.stem: np.load(file, mmap_mode="r")
+                for file in sorted(entry.glob("*.npy"))
+            }
+            # record the use of the entry
+            os.utime(entry)
+            return arrays
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read cache entry {entry}: {e}")
+            return None
+
+    def __contains__(self, key: str) -> bool:
+        """Whether a key is in the cache.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+
+        Returns
+        -------
+        bool
+            Whether the key is in the cache.
+        """
+        return (self.cache_dir / key).is_dir()
+
+    def clear(self) -> None:
+        """Remove all entries from the cache.
+
+        Entries are otherwise only removed when the cache exceeds its maximum size.
+        """
+        if self.cache_dir.exists():
+            shutil.rmtree(self.cache_dir)
+
+    def save_statistics(
+        self, key: str, image_stats: Stats, target_stats: Stats
+    ) -> None:
+        """Save image and target statistics.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+        image_stats : Stats
+            Image statistics.
+        target_stats : Stats
+            Target statistics.
+        """
+        self._save_arrays(key, _stats_to_arrays(image_stats, target_stats))
+
+    def load_statistics(self, key: str) -> Optional[tuple[Stats, Stats]]:
+        """Load image and target statistics.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+
+        Returns
+        -------
+        tuple of (Stats, Stats) or None
+            Image and target statistics, None if the key is not in the cache.
+        """
+        arrays = self._load_arrays(key)
+        if arrays is None:
+            return None
+
+        return _arrays_to_stats(arrays)
+
+    def save_patches(self, key: str, output: PatchedOutput) -> None:
+        """Save patches, targets and their statistics.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+        output : PatchedOutput
+            Patches and statistics.
+        """
+        arrays = {
+            "patches": output.patches,
+            **_stats_to_arrays(output.image_stats, output.target_stats),
+        }
+        if output.targets is not None:
+            arrays["targets"] = output.targets
+
+        self._save_arrays(key, arrays)
+
+    def load_patches(self, key: str) -> Optional[PatchedOutput]:
+        """Load memory-mapped patches, targets and their statistics.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+
+        Returns
+        -------
+        PatchedOutput or None
+            Patches and statistics, None if the key is not in the cache.
+        """
+        arrays = self._load_arrays(key)
+        if arrays is None or "patches" not in arrays:
+            return None
+
+        image_stats, target_stats = _arrays_to_stats(arrays)
+        return PatchedOutput(
+            arrays["patches"], arrays.get("targets"), image_stats, target_stats
+        )
+
+    def save_patch_coordinates(self, key: str, output: PatchCoordinatesOutput) -> None:
+        """Save images, targets, patch coordinates and statistics.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+        output : PatchCoordinatesOutput
+            Images, patch coordinates and statistics.
+        """
+        arrays = {
+            "coordinates": output.coordinates,
+            **_stats_to_arrays(output.image_stats, output.target_stats),
+        }
+        for i, image in enumerate(output.images):
+            arrays[f"image_{i}"] = image
+        if output.targets is not None:
+            for i, target in enumerate(output.targets):
+                arrays[f"target_{i}"] = target
+
+        self._save_arrays(key, arrays)
+
+    def load_patch_coordinates(self, key: str) -> Optional[PatchCoordinatesOutput]:
+        """Load memory-mapped images, targets, patch coordinates and statistics.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+
+        Returns
+        -------
+        PatchCoordinatesOutput or None
+            Images, patch coordinates and statistics, None if the key is not in the
+            cache.
+        """
+        arrays = self._load_arrays(key)
+        if arrays is None or "coordinates" not in arrays:
+            return None
+
+        n_images = int(arrays["coordinates"][:, 0].max()) + 1
+        images = [arrays[f"image_{i}"] for i in range(n_images)]
+        targets = (
+            [arrays[f"target_{i}"] for i in range(n_images)]
+            if "target_0" in arrays
+            else None
+        )
+
+        image_stats, target_stats = _arrays_to_stats(arrays)
+        return PatchCoordinatesOutput(
+            images, targets, arrays["coordinates"], image_stats, target_stats
+        )
+
+
+def _stats_to_arrays(image_stats: Stats, target_stats: Stats) -> dict[str, NDArray]:
+    """Convert statistics to a dictionary of arrays, ignoring missing values.
+
+    Parameters
+    ----------
+    image_stats : Stats
+        Image statistics.
+    target_stats : Stats
+        Target statistics.
+
+    Returns
+    -------
+    dict of {str: numpy.ndarray}
+        Statistics as arrays.
+    """
+    stats = {
+        "image_means": image_stats.means,
+        "image_stds": image_stats.stds,
+        "target_means": target_stats.means,
+        "target_stds": target_stats.stds,
+    }
+    return {
+        name: np.asarray(value, dtype=np.float64)
+        for name, value in stats.items()
+        if value is not None
+    }
+
+
+def _arrays_to_stats(arrays: dict[str, NDArray]) -> tuple[Stats, Stats]:
+    """Convert a dictionary of arrays to image and target statistics.
+
+    Empty statistics (e.g. `Stats((), ())` without targets) are restored as empty
+    tuples, as they are created when the patches are extracted.
+
+    Parameters
+    ----------
+    arrays : dict of {str: numpy.ndarray}
+        Statistics as arrays.
+
+    Returns
+    -------
+    tuple of (Stats, Stats)
+        Image and target statistics.
+    """
+
+    def _get(name: str) -> Union[NDArray, tuple, None]:
+        if name not in arrays:
+            return None
+        return np.array(arrays[name]) if arrays[name].size > 0 else ()
+
+    return (
+        Stats(_get("image_means"), _get("image_stds")),
+        Stats(_get("target_means"), _get("target_stds")),
+    )
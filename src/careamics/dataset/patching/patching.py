@@ -1,16 +1,23 @@
 """Patching functions."""
 
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import Callable, Union
+from typing import Callable, Literal, Optional, Union
 
 import numpy as np
 from numpy.typing import NDArray
 
 from ...utils.logging import get_logger
-from ..dataset_utils import reshape_array
-from ..dataset_utils.running_stats import compute_normalization_stats
-from .sequential_patching import extract_patches_sequential
+from ..dataset_utils import parallel_map, reshape_array
+from ..dataset_utils.running_stats import (
+    WelfordStatistics,
+    compute_normalization_stats,
+)
+from .sequential_patching import (
+    extract_patch_coordinates_sequential,
+    extract_patches_sequential,
+)
 
 logger = get_logger(__name__)
 
@@ -56,6 +63,176 @@ class PatchedOutput:
     """Statistics of the target patches."""
 
 
+@dataclass
+class PatchCoordinatesOutput:
+    """Dataclass to store images, patch coordinates and statistics."""
+
+    images: list[NDArray]
+    """Reshaped images, each of shape SC(Z)YX."""
+
+    targets: Optional[list[NDArray]]
+    """Reshaped targets, each of shape SC(Z)YX."""
+
+    coordinates: NDArray
+    """Patch coordinates, each row is (image index, sample index, (z), y, x)."""
+
+    image_stats: Stats
+    """Statistics of the images."""
+
+    target_stats: Stats
+    """Statistics of the targets."""
+
+
+def _index_patch_coordinates(
+    images: list[NDArray], patch_size: Union[list[int], tuple[int, ...]]
+) -> NDArray:
+    """Compute the sequential patch coordinates over a list of images.
+
+    Parameters
+    ----------
+    images : list of numpy.ndarray
+        Reshaped images, each of shape SC(Z)YX.
+    patch_size : list or tuple of int
+        Size of the patches.
+
+    Returns
+    -------
+    numpy.ndarray
+        Patch coordinates, each row is (image index, sample index, (z), y, x).
+    """
+    all_coordinates = []
+    for image_idx, image in enumerate(images):
+        coordinates = extract_patch_coordinates_sequential(image, patch_size)
+        image_column = np.full((coordinates.shape[0], 1), image_idx, dtype=np.int32)
+        all_coordinates.append(np.concatenate([image_column, coordinates], axis=1))
+
+    return np.concatenate(all_coordinates, axis=0)
+
+
+def _read_file(
+    filenames: tuple[Path, Optional[Path]],
+    axes: str,
+    patch_size: Union[list[int], tuple[int, ...]],
+    read_source_func: Callable,
+    extract_patches: bool,
+) -> Optional[tuple[NDArray, Optional[NDArray]]]:
+    """
+    Read and reshape a file and its optional target, then optionally patch them.
+
+    Errors are logged and result in `None` being returned, so that a single
+    corrupted file does not prevent the others from being read.
+
+    Parameters
+    ----------
+    filenames : tuple of (pathlib.Path, pathlib.Path or None)
+        Path to the file and to its target, if any.
+    axes : str
+        Axes of the data.
+    patch_size : list or tuple of int
+        Size of the patches.
+    read_source_func : Callable
+        Function to read the data.
+    extract_patches : bool
+        Whether to return the sequentially extracted patches, or the reshaped arrays
+        after checking that patches can be extracted from them.
+
+    Returns
+    -------
+    tuple of (numpy.ndarray, numpy.ndarray or None) or None
+        Patches (or reshaped array) and corresponding target, None if the file could
+        not be read.
+    """
+    filename, target_filename = filenames
+    try:
+        sample: NDArray = reshape_array(read_source_func(filename, axes), axes)
+        target: Optional[NDArray] = None
+        if target_filename is not None:
+            target = reshape_array(read_source_func(target_filename, axes), axes)
+
+            if sample.shape != target.shape:
+                raise ValueError(
+                    f"Shapes of the sample ({sample.shape}) and target "
+                    f"({target.shape}) do not match."
+                )
+
+        if extract_patches:
+            # generate patches
+            return extract_patches_sequential(
+                sample, patch_size=patch_size, target=target
+            )
+
+        # check that patches can be extracted
+        extract_patch_coordinates_sequential(sample, patch_size)
+        return sample, target
+
+    except Exception as e:
+        # emit warning and continue
+        if target_filename is not None:
+            logger.error(f"Failed to read {filename} or {target_filename}: {e}")
+        else:
+            logger.error(f"Failed to read {filename}: {e}")
+
+        return None
+
+
+def _read_files(
+    train_files: list[Path],
+    target_files: Optional[list[Path]],
+    axes: str,
+    patch_size: Union[list[int], tuple[int, ...]],
+    read_source_func: Callable,
+    extract_patches: bool,
+    num_workers: int,
+    pool: Literal["thread", "process"],
+) -> list[tuple[NDArray, Optional[NDArray]]]:
+    """
+    Read, reshape and optionally patch files in parallel.
+
+    The results are returned in the order of the files, files that could not be read
+    are skipped.
+
+    Parameters
+    ----------
+    train_files : list of pathlib.Path
+        List of paths to training data.
+    target_files : list of pathlib.Path or None
+        List of paths to target data.
+    axes : str
+        Axes of the data.
+    patch_size : list or tuple of int
+        Size of the patches.
+    read_source_func : Callable
+        Function to read the data.
+    extract_patches : bool
+        Whether to extract the patches or only reshape the arrays.
+    num_workers : int
+        Number of workers reading files in parallel, files are read sequentially if
+        0 or 1.
+    pool : {"thread", "process"}
+        Type of pool of workers.
+
+    Returns
+    -------
+    list of tuple of (numpy.ndarray, numpy.ndarray or None)
+        Patches (or reshaped arrays) and targets of each valid file.
+    """
+    filenames: list[tuple[Path, Optional[Path]]] = (
+        list(zip(train_files, target_files))
+        if target_files is not None
+        else [(filename, None) for filename in train_files]
+    )
+    read_func = partial(
+        _read_file,
+        axes=axes,
+        patch_size=patch_size,
+        read_source_func=read_source_func,
+        extract_patches=extract_patches,
+    )
+    results = parallel_map(read_func, filenames, num_workers=num_workers, pool=pool)
+
+    return [result for result in results if result is not None]
+
+
 # called by in memory dataset
 def prepare_patches_supervised(
     train_files: list[Path],
@@ -63,6 +240,8 @@ def prepare_patches_supervised(
     axes: str,
     patch_size: Union[list[int], tuple[int, ...]],
     read_source_func: Callable,
+    num_workers: int = 0,
+    pool: Literal["thread", "process"] = "thread",
 ) -> PatchedOutput:
     """
     Iterate over data source and create an array of patches and corresponding targets.
@@ -81,51 +260,38 @@ def prepare_patches_supervised(
         Size of the patches.
     read_source_func : Callable
         Function to read the data.
+    num_workers : int, optional
+        Number of workers reading and patching files in parallel, by default 0. If 0
+        or 1, files are processed sequentially.
+    pool : {"thread", "process"}, optional
+        Type of pool of workers, by default "thread".
 
     Returns
     -------
     np.ndarray
         Array of patches.
     """
-    means, stds, num_samples = 0, 0, 0
-    all_patches, all_targets = [], []
-    for train_filename, target_filename in zip(train_files, target_files):
-        try:
-            sample: np.ndarray = read_source_func(train_filename, axes)
-            target: np.ndarray = read_source_func(target_filename, axes)
-            means += sample.mean()
-            stds += sample.std()
-            num_samples += 1
-
-            # reshape array
-            sample = reshape_array(sample, axes)
-            target = reshape_array(target, axes)
-
-            # generate patches, return a generator
-            patches, targets = extract_patches_sequential(
-                sample, patch_size=patch_size, target=target
-            )
-
-            # convert generator to list and add to all_patches
-            all_patches.append(patches)
-
-            # ensure targets are not None (type checking)
-            if targets is not None:
-                all_targets.append(targets)
-            else:
-                raise ValueError(f"No target found for {target_filename}.")
-
-        except Exception as e:
-            # emit warning and continue
-            logger.error(f"Failed to read {train_filename} or {target_filename}: {e}")
+    results = _read_files(
+        train_files,
+        target_files,
+        axes,
+        patch_size,
+        read_source_func,
+        extract_patches=True,
+        num_workers=num_workers,
+        pool=pool,
+    )
 
     # raise error if no valid samples found
-    if num_samples == 0 or len(all_patches) == 0:
+    if len(results) == 0:
         raise ValueError(
             f"No valid samples found in the input data: {train_files} and "
             f"{target_files}."
         )
 
+    all_patches = [patches for patches, _ in results]
+    all_targets = [targets for _, targets in results if targets is not None]
+
     image_means, image_stds = compute_normalization_stats(np.concatenate(all_patches))
     target_means, target_stds = compute_normalization_stats(np.concatenate(all_targets))
 
@@ -147,6 +313,8 @@ def prepare_patches_unsupervised(
     axes: str,
     patch_size: Union[list[int], tuple[int]],
     read_source_func: Callable,
+    num_workers: int = 0,
+    pool: Literal["thread", "process"] = "thread",
 ) -> PatchedOutput:
     """Iterate over data source and create an array of patches.
 
@@ -162,37 +330,34 @@ def prepare_patches_unsupervised(
         Size of the patches.
     read_source_func : Callable
         Function to read the data.
+    num_workers : int, optional
+        Number of workers reading and patching files in parallel, by default 0. If 0
+        or 1, files are processed sequentially.
+    pool : {"thread", "process"}, optional
+        Type of pool of workers, by default "thread".
 
     Returns
     -------
     PatchedOutput
         Dataclass holding patches and their statistics.
     """
-    means, stds, num_samples = 0, 0, 0
-    all_patches = []
-    for filename in train_files:
-        try:
-            sample: np.ndarray = read_source_func(filename, axes)
-            means += sample.mean()
-            stds += sample.std()
-            num_samples += 1
-
-            # reshape array
-            sample = reshape_array(sample, axes)
-
-            # generate patches, return a generator
-            patches, _ = extract_patches_sequential(sample, patch_size=patch_size)
-
-            # convert generator to list and add to all_patches
-            all_patches.append(patches)
-        except Exception as e:
-            # emit warning and continue
-            logger.error(f"Failed to read {filename}: {e}")
+    results = _read_files(
+        train_files,
+        None,
+        axes,
+        patch_size,
+        read_source_func,
+        extract_patches=True,
+        num_workers=num_workers,
+        pool=pool,
+    )
 
     # raise error if no valid samples found
-    if num_samples == 0:
+    if len(results) == 0:
         raise ValueError(f"No valid samples found in the input data: {train_files}.")
 
+    all_patches = [patches for patches, _ in results]
+
     image_means, image_stds = compute_normalization_stats(np.concatenate(all_patches))
 
     patch_array: np.ndarray = np.concatenate(all_patches)
@@ -297,3 +462,243 @@ def prepare_patches_unsupervised_array(
     patches, _ = extract_patches_sequential(reshaped_sample, patch_size=patch_size)
 
     return PatchedOutput(patches, None, Stats(means, stds), Stats((), ()))
+
+
+# called by in memory dataset
+def prepare_patch_coordinates_supervised(
+    train_files: list[Path],
+    target_files: list[Path],
+    axes: str,
+    patch_size: Union[list[int], tuple[int, ...]],
+    read_source_func: Callable,
+    num_workers: int = 0,
+    pool: Literal["thread", "process"] = "thread",
+) -> PatchCoordinatesOutput:
+    """
+    Iterate over data source and compute the coordinates of patches and targets.
+
+    Contrary to `prepare_patches_supervised`, the patches are not extracted. The
+    reshaped images and targets are kept in memory alongside the coordinates of the
+    patches.
+
+    The lists of Paths should be pre-sorted.
+
+    Parameters
+    ----------
+    train_files : list of pathlib.Path
+        List of paths to training data.
+    target_files : list of pathlib.Path
+        List of paths to target data.
+    axes : str
+        Axes of the data.
+    patch_size : list or tuple of int
+        Size of the patches.
+    read_source_func : Callable
+        Function to read the data.
+    num_workers : int, optional
+        Number of workers reading files in parallel, by default 0. If 0 or 1, files
+        are read sequentially.
+    pool : {"thread", "process"}, optional
+        Type of pool of workers, by default "thread".
+
+    Returns
+    -------
+    PatchCoordinatesOutput
+        Dataclass holding the images, targets, patch coordinates and statistics.
+    """
+    results = _read_files(
+        train_files,
+        target_files,
+        axes,
+        patch_size,
+        read_source_func,
+        extract_patches=False,
+        num_workers=num_workers,
+        pool=pool,
+    )
+
+    # raise error if no valid samples found
+    if len(results) == 0:
+        raise ValueError(
+            f"No valid samples found in the input data: {train_files} and "
+            f"{target_files}."
+        )
+
+    all_images = [sample for sample, _ in results]
+    all_targets = [target for _, target in results if target is not None]
+
+    image_stats, target_stats = WelfordStatistics(), WelfordStatistics()
+    for i, (sample, target) in enumerate(zip(all_images, all_targets)):
+        image_stats.update(sample, i)
+        target_stats.update(target, i)
+
+    coordinates = _index_patch_coordinates(all_images, patch_size)
+    logger.info(f"Indexed {coordinates.shape[0]} patches from input files.")
+
+    return PatchCoordinatesOutput(
+        all_images,
+        all_targets,
+        coordinates,
+        Stats(*image_stats.finalize()),
+        Stats(*target_stats.finalize()),
+    )
+
+
+# called by in memory dataset
+def prepare_patch_coordinates_unsupervised(
+    train_files: list[Path],
+    axes: str,
+    patch_size: Union[list[int], tuple[int, ...]],
+    read_source_func: Callable,
+    num_workers: int = 0,
+    pool: Literal["thread", "process"] = "thread",
+) -> PatchCoordinatesOutput:
+    """
+    Iterate over data source and compute the coordinates of patches.
+
+    Contrary to `prepare_patches_unsupervised`, the patches are not extracted. The
+    reshaped images are kept in memory alongside the coordinates of the patches.
+
+    Parameters
+    ----------
+    train_files : list of pathlib.Path
+        List of paths to training data.
+    axes : str
+        Axes of the data.
+    patch_size : list or tuple of int
+        Size of the patches.
+    read_source_func : Callable
+        Function to read the data.
+    num_workers : int, optional
+        Number of workers reading files in parallel, by default 0. If 0 or 1, files
+        are read sequentially.
+    pool : {"thread", "process"}, optional
+        Type of pool of workers, by default "thread".
+
+    Returns
+    -------
+    PatchCoordinatesOutput
+        Dataclass holding the images, patch coordinates and statistics.
+    """
+    results = _read_files(
+        train_files,
+        None,
+        axes,
+        patch_size,
+        read_source_func,
+        extract_patches=False,
+        num_workers=num_workers,
+        pool=pool,
+    )
+
+    # raise error if no valid samples found
+    if len(results) == 0:
+        raise ValueError(f"No valid samples found in the input data: {train_files}.")
+
+    all_images = [sample for sample, _ in results]
+
+    image_stats = WelfordStatistics()
+    for i, sample in enumerate(all_images):
+        image_stats.update(sample, i)
+
+    coordinates = _index_patch_coordinates(all_images, patch_size)
+    logger.info(f"Indexed {coordinates.shape[0]} patches from input files.")
+
+    return PatchCoordinatesOutput(
+        all_images, None, coordinates, Stats(*image_stats.finalize()), Stats((), ())
+    )
+
+
+# called on arrays by in memory dataset
+def prepare_patch_coordinates_supervised_array(
+    data: NDArray,
+    axes: str,
+    data_target: NDArray,
+    patch_size: Union[list[int], tuple[int, ...]],
+) -> PatchCoordinatesOutput:
+    """
+    Compute the coordinates of patches over an array and its target.
+
+    This method expects an array of shape SC(Z)YX, where S and C can be singleton
+    dimensions.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Input data array.
+    axes : str
+        Axes of the data.
+    data_target : numpy.ndarray
+        Target data array.
+    patch_size : list or tuple of int
+        Size of the patches.
+
+    Returns
+    -------
+    PatchCoordinatesOutput
+        Dataclass holding the image, target, patch coordinates and statistics.
+    """
+    # reshape array
+    reshaped_sample = reshape_array(data, axes)
+    reshaped_target = reshape_array(data_target, axes)
+
+    if reshaped_sample.shape != reshaped_target.shape:
+        raise ValueError(
+            f"Shapes of the data ({reshaped_sample.shape}) and target "
+            f"({reshaped_target.shape}) do not match."
+        )
+
+    # compute statistics
+    image_means, image_stds = compute_normalization_stats(reshaped_sample)
+    target_means, target_stds = compute_normalization_stats(reshaped_target)
+
+    coordinates = _index_patch_coordinates([reshaped_sample], patch_size)
+    logger.info(f"Indexed {coordinates.shape[0]} patches from input array.")
+
+    return PatchCoordinatesOutput(
+        [reshaped_sample],
+        [reshaped_target],
+        coordinates,
+        Stats(image_means, image_stds),
+        Stats(target_means, target_stds),
+    )
+
+
+# called on arrays by in memory dataset
+def prepare_patch_coordinates_unsupervised_array(
+    data: NDArray,
+    axes: str,
+    patch_size: Union[list[int], tuple[int, ...]],
+) -> PatchCoordinatesOutput:
+    """
+    Compute the coordinates of patches over an array.
+
+    This method expects an array of shape SC(Z)YX, where S and C can be singleton
+    dimensions.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Input data array.
+    axes : str
+        Axes of the data.
+    patch_size : list or tuple of int
+        Size of the patches.
+
+    Returns
+    -------
+    PatchCoordinatesOutput
+        Dataclass holding the image, patch coordinates and statistics.
+    """
+    # reshape array
+    reshaped_sample = reshape_array(data, axes)
+
+    # calculate mean and std
+    means, stds = compute_normalization_stats(reshaped_sample)
+
+    coordinates = _index_patch_coordinates([reshaped_sample], patch_size)
+    logger.info(f"Indexed {coordinates.shape[0]} patches from input array.")
+
+    return PatchCoordinatesOutput(
+        [reshaped_sample], None, coordinates, Stats(means, stds), Stats((), ())
+    )
@@ -5,7 +5,9 @@ from typing import Optional, Union
 
 import numpy as np
 import zarr
+from numpy.typing import DTypeLike
 
+from .foreground_sampling import ForegroundIndex, sample_patch_coordinates
 from .validate_patch_dimension import validate_patch_dimensions
 
 
@@ -15,6 +17,10 @@ def extract_patches_random(
     patch_size: Union[list[int], tuple[int, ...]],
     target: Optional[np.ndarray] = None,
     seed: Optional[int] = None,
+    dtype: Optional[DTypeLike] = np.float32,
+    foreground_ratio: float = 0.0,
+    foreground_threshold: Optional[float] = None,
+    foreground_indices: Optional[dict[int, ForegroundIndex]] = None,
 ) -> Generator[tuple[np.ndarray, Optional[np.ndarray]], None, None]:
     """
     Generate patches from an array in a random manner.
@@ -22,6 +28,11 @@ def extract_patches_random(
     The method calculates how many patches the image can be divided into and then
     extracts an equal number of random patches.
 
+    If `foreground_ratio` is larger than 0, a foreground index of each sample is
+    built (see `ForegroundIndex`), and each patch is drawn among the patches
+    containing foreground with probability `foreground_ratio`. The indices can be
+    kept across calls in `foreground_indices`, so that they are built only once.
+
     It returns a generator that yields the following:
 
     - patch: np.ndarray, dimension C(Z)YX.
@@ -38,6 +49,17 @@ def extract_patches_random(
         Target array, by default None.
     seed : int or None, default=None
         Random seed.
+    dtype : numpy.dtype, optional
+        Data type of the patches, by default float32. If None, the data type of the
+        array is kept.
+    foreground_ratio : float, optional
+        Expected fraction of patches drawn among the foreground patches, by default 0.
+    foreground_threshold : float, optional
+        Intensity threshold of the foreground, by default None. If None, the mean plus
+        one standard deviation of each sample is used.
+    foreground_indices : dict of {int: ForegroundIndex}, optional
+        Foreground indices of the samples of the array, by default None. Missing
+        indices are built and added to the dictionary.
 
     Yields
     ------
@@ -54,6 +76,11 @@ def extract_patches_random(
     # Update patch size to encompass S and C dimensions
     patch_size = [1, arr.shape[1], *patch_size]
 
+    # astype always copies, so that patches do not hold a reference to the array
+    patch_dtype = dtype if dtype is not None else arr.dtype
+    if target is not None:
+        target_dtype = dtype if dtype is not None else target.dtype
+
     # iterate over the number of samples (S or T)
     for sample_idx in range(arr.shape[0]):
         # get sample array
@@ -66,17 +93,50 @@ def extract_patches_random(
         # calculate the number of patches
         n_patches = np.ceil(np.prod(sample.shape) / np.prod(patch_size)).astype(int)
 
+        # draw the coordinates at once, favouring the foreground patches
+        if foreground_ratio > 0:
+            spatial_patch_size = patch_size[2:]
+            if foreground_indices is None:
+                foreground_indices = {}
+            if sample_idx not in foreground_indices:
+                foreground_indices[sample_idx] = ForegroundIndex.from_array(
+                    sample, spatial_patch_size, foreground_threshold
+                )
+            sample_coords = sample_patch_coordinates(
+                rng,
+                sample.shape[1:],
+                spatial_patch_size,
+                n_patches,
+                foreground_indices[sample_idx],
+                foreground_ratio,
+            )
+
         # iterate over the number of patches
-        for _ in range(n_patches):
+        for patch_idx in range(n_patches):
             # get crop coordinates
-            crop_coords = [
-                rng.integers(0, sample.shape[i] - patch_size[1:][i], endpoint=True)
-                for i in range(len(patch_size[1:]))
-            ]
+            if foreground_ratio > 0:
+                # the channel axis is fully covered by the patch
+                crop_coords = [0, *sample_coords[patch_idx]]
+            else:
+                crop_coords = [
+                    rng.integers(0, sample.shape[i] - patch_size[1:][i], endpoint=True)
+                    for i in range(len(patch_size[1:]))
+                ]
 
             # extract patch
-            patch = (
-                sample[
+            patch = sample[
+                (
+                    ...,  # type: ignore
+                    *[  # type: ignore
+                        slice(c, c + patch_size[1:][i])
+                        for i, c in enumerate(crop_coords)
+                    ],
+                )
+            ].astype(patch_dtype)
+
+            # same for target
+            if target is not None:
+                target_patch = target_sample[
                     (
                         ...,  # type: ignore
                         *[  # type: ignore
@@ -84,26 +144,7 @@ def extract_patches_random(
                             for i, c in enumerate(crop_coords)
                         ],
                     )
-                ]
-                .copy()
-                .astype(np.float32)
-            )
-
-            # same for target
-            if target is not None:
-                target_patch = (
-                    target_sample[
-                        (
-                            ...,  # type: ignore
-                            *[  # type: ignore
-                                slice(c, c + patch_size[1:][i])
-                                for i, c in enumerate(crop_coords)
-                            ],
-                        )
-                    ]
-                    .copy()
-                    .astype(np.float32)
-                )
+                ].astype(target_dtype)
                 # return patch and target patch
                 yield patch, target_patch
             else:
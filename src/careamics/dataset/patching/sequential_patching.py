@@ -210,3 +210,52 @@ def extract_patches_sequential(
         )  # TODO  in _compute_reshaped_view?
     else:
         return patches, None
+
+
+def extract_patch_coordinates_sequential(
+    arr: np.ndarray,
+    patch_size: Union[list[int], tuple[int, ...]],
+) -> np.ndarray:
+    """
+    Compute the coordinates of the patches generated by `extract_patches_sequential`.
+
+    Array dimensions should be SC(Z)YX, where S and C can be singleton dimensions. The
+    patches are not extracted, instead each row of the returned array holds the sample
+    index followed by the start coordinates of a patch along each spatial dimension,
+    i.e. (sample, (z), y, x). The patches cover the whole array, with the same
+    overlap as `extract_patches_sequential`.
+
+    Parameters
+    ----------
+    arr : np.ndarray
+        Input image array.
+    patch_size : tuple[int]
+        Patch sizes in each dimension.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (n_patches, 1 + n_spatial_dims) and type int32 containing the
+        patch coordinates.
+    """
+    is_3d_patch = len(patch_size) == 3
+
+    # Patches sanity check
+    validate_patch_dimensions(arr, patch_size, is_3d_patch)
+
+    # Update patch size to encompass S and C dimensions
+    full_patch_size = [1, arr.shape[1], *patch_size]
+
+    # Compute overlap and steps, identical to the sequential patch extraction
+    overlaps = _compute_overlap(arr_shape=arr.shape, patch_sizes=full_patch_size)
+    window_steps = _compute_patch_steps(patch_sizes=full_patch_size, overlaps=overlaps)
+
+    # start coordinates along S and the spatial dimensions (C is not patched)
+    starts = [
+        np.arange(0, arr.shape[i] - full_patch_size[i] + 1, window_steps[i])
+        for i in range(len(full_patch_size))
+        if i != 1
+    ]
+    grid = np.meshgrid(*starts, indexing="ij")
+
+    return np.stack([g.ravel() for g in grid], axis=-1).astype(np.int32)
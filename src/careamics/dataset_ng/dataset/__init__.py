@@ -0,0 +1,3 @@
+__all__ = ["CareamicsDataset"]
+
+from .dataset import CareamicsDataset
@@ -0,0 +1,513 @@
+import copy
+from collections.abc import Sequence
+from typing import NamedTuple, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+from torch.utils.data import Dataset
+
+from careamics.config import DataConfig
+from careamics.config.transformations import NormalizeModel
+from careamics.dataset.dataset_utils.iterate_over_files import get_distributed_info
+from careamics.dataset.dataset_utils.running_stats import WelfordStatistics
+from careamics.dataset.patching.foreground_sampling import ForegroundIndex
+from careamics.dataset.patching.patching import Stats
+from careamics.transforms import Compose
+from careamics.utils.logging import get_logger
+
+from ..patch_extractor import PatchExtractor, PatchSpecs, PatchSpecsArray
+from ..patch_extractor.image_stack import ImageStack, InMemoryImageStack
+from ..patching_strategies import (
+    ChunkedPatchSpecsGenerator,
+    RandomPatchSpecsGenerator,
+)
+
+logger = get_logger(__name__)
+
+N_LAZY_REGIONS = 64
+"""Maximum number of regions read from each lazily read image stack to compute the
+statistics and the foreground indices."""
+
+
+class Region(NamedTuple):
+    """Region of an image stack, read to compute statistics and foreground."""
+
+    sample_idx: int
+    coords: tuple[int, ...]
+    data: NDArray
+
+
+class CareamicsDataset(Dataset):
+    """
+    Map-style training dataset extracting random patches lazily from image stacks.
+
+    The patch specifications are regenerated at every epoch from the dataset seed and
+    the current epoch (see `set_epoch`), so that every epoch draws new patches while
+    all dataloader workers agree on them. The patches are only extracted when indexed,
+    which allows training on in-memory as well as on lazily read image stacks (e.g.
+    zarr or memory-mapped TIFF), with shuffling, distributed samplers and any number of
+    workers.
+
+    Note that the epoch is propagated to the workers when they are created, so patch
+    specifications are not regenerated with `persistent_workers=True`.
+
+    The statistics and foreground indices of in-memory image stacks are computed from
+    all their samples. Lazily read image stacks are not read entirely, their statistics
+    and foreground indices are computed from a random subset of regions (see
+    `statistics_fraction`).
+
+    With `chunk_aware_patching`, the patches are ordered in runs sharing a chunk of the
+    image stacks, and should be read in order (without shuffling) to benefit from the
+    chunk caches. The runs are dealt to the training dataloader workers according to
+    the batch size and number of workers of the data configuration, and to the
+    distributed ranks if a process group is initialized when the dataset is created.
+
+    Parameters
+    ----------
+    data_config : DataConfig
+        Data configuration.
+    input_extractor : PatchExtractor
+        Patch extractor of the inputs.
+    target_extractor : PatchExtractor, optional
+        Patch extractor of the targets, by default None.
+    seed : int, optional
+        Seed of the patch specifications, by default None. If None, a random seed is
+        drawn.
+    """
+
+    def __init__(
+        self,
+        data_config: DataConfig,
+        input_extractor: PatchExtractor,
+        target_extractor: Optional[PatchExtractor] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.data_config = data_config
+        self.input_extractor = input_extractor
+        self.target_extractor = target_extractor
+        self.patch_size = self.data_config.patch_size
+
+        self.seed: int = (
+            seed
+            if seed is not None
+            else int(np.random.SeedSequence().generate_state(1)[0])
+        )
+        self.epoch = 0
+
+        # regions of the input stacks used for the statistics and foreground indices
+        input_regions: Optional[list[list[Region]]] = None
+        if (
+            self.data_config.image_means is None
+            or self.data_config.foreground_ratio > 0
+        ):
+            input_regions = self._read_regions(self.input_extractor)
+
+        # index the foreground of every sample once, to favour foreground patches
+        self.foreground_indices: Optional[list[list[ForegroundIndex]]] = None
+        if self.data_config.foreground_ratio > 0:
+            # mypy check
+            assert input_regions is not None
+
+            self.foreground_indices = self._compute_foreground_indices(input_regions)
+
+        self.patch_specs_generator = self._create_patch_specs_generator()
+        self._patch_specs: Optional[tuple[int, Sequence[PatchSpecs]]] = None
+        # fixed patch specifications, replacing the random ones (e.g. validation)
+        self.fixed_patch_specs: Optional[PatchSpecsArray] = None
+
+        # share the in-memory image stacks with the dataloader workers
+        if self.data_config.shared_memory:
+            for extractor in (self.input_extractor, self.target_extractor):
+                if extractor is None:
+                    continue
+                for stack in extractor.image_stacks:
+                    if isinstance(stack, InMemoryImageStack):
+                        stack.share_memory()
+
+        # set image statistics
+        if self.data_config.image_means is None:
+            # mypy check
+            assert input_regions is not None
+
+            self.image_stats = self._compute_statistics(input_regions)
+            logger.info(
+                f"Computed dataset mean: {self.image_stats.means}, "
+                f"std: {self.image_stats.stds}"
+            )
+        else:
+            self.image_stats = Stats(
+                self.data_config.image_means, self.data_config.image_stds
+            )
+
+        # set target statistics
+        if self.data_config.target_means is None and self.target_extractor is not None:
+            self.target_stats = self._compute_statistics(
+                self._read_regions(self.target_extractor)
+            )
+        else:
+            self.target_stats = Stats(
+                self.data_config.target_means, self.data_config.target_stds
+            )
+
+        # update mean and std in configuration
+        # the object is mutable and should then be recorded in the CAREamist obj
+        self.data_config.set_means_and_stds(
+            image_means=self.image_stats.means,
+            image_stds=self.image_stats.stds,
+            target_means=self.target_stats.means,
+            target_stds=self.target_stats.stds,
+        )
+
+        # get transforms
+        # the normalization and augmentations can be applied to whole batches on the
+        # training device instead
+        self.patch_transform = Compose(
+            transform_list=(
+                []
+                if self.data_config.device_transforms
+                else [
+                    NormalizeModel(
+                        image_means=self.image_stats.means,
+                        image_stds=self.image_stats.stds,
+                        target_means=self.target_stats.means,
+                        target_stds=self.target_stats.stds,
+                    )
+                ]
+                + list(self.data_config.transforms)
+            ),
+        )
+
+    def _get_regions(
+        self, image_stack: ImageStack
+    ) -> list[tuple[int, tuple[int, ...]]]:
+        """
+        Select the regions of a stack read to compute statistics and foreground.
+
+        In-memory stacks are read entirely, one region per sample. Lazily read stacks
+        (e.g. zarr or memory-mapped TIFF) are divided into regions spanning at least
+        four patches and one chunk along each axis, of which a random subset is read,
+        such that the data is not read entirely when the dataset is created.
+
+        The regions are returned as their sample index and start coordinates, and all
+        have the size returned by `_get_region_size`.
+        """
+        n_samples = image_stack.data_shape[0]
+        spatial_shape = image_stack.data_shape[2:]
+        if isinstance(image_stack, InMemoryImageStack):
+            return [(i, (0,) * len(spatial_shape)) for i in range(n_samples)]
+
+        region_size = self._get_region_size(image_stack)
+        grid = [max(s // r, 1) for s, r in zip(spatial_shape, region_size)]
+        n_regions = n_samples * int(np.prod(grid))
+        n_selected = min(
+            n_regions,
+            N_LAZY_REGIONS,
+            max(1, int(np.ceil(self.data_config.statistics_fraction * n_regions))),
+        )
+
+        # the same regions are selected for the inputs and the targets
+        rng = np.random.default_rng(self.seed)
+        selected = np.sort(rng.choice(n_regions, n_selected, replace=False))
+        return [
+            (int(sample_idx), tuple(int(c) * r for c, r in zip(cell, region_size)))
+            for sample_idx, *cell in zip(
+                *np.unravel_index(selected, (n_samples, *grid))
+            )
+        ]
+
+    def _get_region_size(self, image_stack: ImageStack) -> tuple[int, ...]:
+        """Size of the regions read from a stack, a multiple of the patch size."""
+        spatial_shape = image_stack.data_shape[2:]
+        if isinstance(image_stack, InMemoryImageStack):
+            return tuple(spatial_shape)
+
+        chunks = getattr(image_stack, "data_chunks", None)
+        region_size = []
+        for i, (p, s) in enumerate(zip(self.patch_size, spatial_shape)):
+            size = max(4 * p, chunks[2 + i] if chunks is not None else 0)
+            region_size.append(min(int(np.ceil(size / p)) * p, s))
+        return tuple(region_size)
+
+    def _read_regions(self, patch_extractor: PatchExtractor) -> list[list[Region]]:
+        """Read the regions of every stack selected by `_get_regions`."""
+        regions: list[list[Region]] = []
+        for image_stack in patch_extractor.image_stacks:
+            region_size = self._get_region_size(image_stack)
+            regions.append(
+                [
+                    Region(
+                        sample_idx=sample_idx,
+                        coords=coords,
+                        data=image_stack.extract_patch(
+                            sample_idx=sample_idx,
+                            coords=coords,
+                            patch_size=region_size,
+                        ),
+                    )
+                    for sample_idx, coords in self._get_regions(image_stack)
+                ]
+            )
+        return regions
+
+    @staticmethod
+    def _compute_statistics(regions: list[list[Region]]) -> Stats:
+        """Compute the channel-wise statistics of the regions read from the stacks."""
+        stats = WelfordStatistics()
+        sample_count = 0
+        for stack_regions in regions:
+            for region in stack_regions:
+                stats.update(region.data[np.newaxis], sample_count)
+                sample_count += 1
+
+        means, stds = stats.finalize()
+        return Stats(means, stds)
+
+    def _compute_foreground_indices(
+        self, regions: list[list[Region]]
+    ) -> list[list[ForegroundIndex]]:
+        """
+        Build the foreground index of every sample of the input stacks.
+
+        For lazily read stacks, only the foreground of the regions read is indexed,
+        and the default threshold is computed over all the regions of the stack.
+        """
+        n_dims = len(self.patch_size)
+        block_size = np.maximum(np.array(self.patch_size) // 4, 1)
+        indices: list[list[ForegroundIndex]] = []
+        for image_stack, stack_regions in zip(
+            self.input_extractor.image_stacks, regions
+        ):
+            n_samples = image_stack.data_shape[0]
+            spatial_shape = np.array(image_stack.data_shape[2:])
+
+            threshold = self.data_config.foreground_threshold
+            if threshold is None and not isinstance(image_stack, InMemoryImageStack):
+                intensity = np.concatenate(
+                    [region.data.max(axis=0).ravel() for region in stack_regions]
+                )
+                threshold = float(intensity.mean() + intensity.std())
+
+            # the regions start on the block grid, their foreground coordinates are
+            # offset to the sample
+            coords: list[list[NDArray]] = [[] for _ in range(n_samples)]
+            for region in stack_regions:
+                region_index = ForegroundIndex.from_array(
+                    region.data, self.patch_size, threshold
+                )
+                coords[region.sample_idx].append(
+                    region_index.coords + np.array(region.coords) // block_size
+                )
+
+            indices.append(
+                [
+                    ForegroundIndex(
+                        (
+                            np.concatenate(sample_coords).astype(np.int32)
+                            if sample_coords
+                            else np.empty((0, n_dims), dtype=np.int32)
+                        ),
+                        block_size.tolist(),
+                        (spatial_shape - np.array(self.patch_size)).tolist(),
+                    )
+                    for sample_coords in coords
+                ]
+            )
+        return indices
+
+    def _create_patch_specs_generator(self) -> RandomPatchSpecsGenerator:
+        """Create the patch specifications generator of the input stacks."""
+        data_shapes = [stack.data_shape for stack in self.input_extractor.image_stacks]
+        if self.data_config.chunk_aware_patching:
+            # only chunked image stacks (e.g. zarr) record their chunk shape
+            return ChunkedPatchSpecsGenerator(
+                data_shapes,
+                [
+                    getattr(stack, "data_chunks", None)
+                    for stack in self.input_extractor.image_stacks
+                ],
+                foreground_indices=self.foreground_indices,
+                foreground_ratio=self.data_config.foreground_ratio,
+                batch_size=self.data_config.batch_size,
+                num_workers=self.data_config.train_dataloader_params.get(
+                    "num_workers", 0
+                ),
+                world_size=get_distributed_info()[1],
+            )
+        return RandomPatchSpecsGenerator(
+            data_shapes,
+            foreground_indices=self.foreground_indices,
+            foreground_ratio=self.data_config.foreground_ratio,
+        )
+
+    def set_epoch(self, epoch: int) -> None:
+        """
+        Set the epoch, from which the patch specifications are derived.
+
+        Parameters
+        ----------
+        epoch : int
+            Current epoch.
+        """
+        self.epoch = epoch
+
+    @property
+    def patch_specs(self) -> Sequence[PatchSpecs]:
+        """Patch specifications of the current epoch, generated on first access."""
+        if self.fixed_patch_specs is not None:
+            return self.fixed_patch_specs
+        if self._patch_specs is None or self._patch_specs[0] != self.epoch:
+            epoch_seed = int(
+                np.random.SeedSequence([self.seed, self.epoch]).generate_state(1)[0]
+            )
+            self._patch_specs = (
+                self.epoch,
+                self.patch_specs_generator.generate(self.patch_size, seed=epoch_seed),
+            )
+        return self._patch_specs[1]
+
+    def __len__(self) -> int:
+        if self.fixed_patch_specs is not None:
+            return len(self.fixed_patch_specs)
+        # the number of patches does not depend on the seed
+        return self.patch_specs_generator.n_patches(self.patch_size, seed=self.seed)
+
+    def __getitem__(self, index: int) -> tuple[NDArray, ...]:
+        patch_spec = self.patch_specs[index]
+
+        patch = self.input_extractor.extract_patch(**patch_spec).astype(np.float32)
+        if self.target_extractor is not None:
+            target = self.target_extractor.extract_patch(**patch_spec).astype(
+                np.float32
+            )
+            return self.patch_transform(patch=patch, target=target)
+
+        return self.patch_transform(patch=patch)
+
+    def __getitems__(self, indices: list[int]) -> list[tuple[NDArray, ...]]:
+        # called by the dataloader with the indices of a whole batch, the patches are
+        # extracted at once, grouped by image stack and sample
+        patch_specs = [self.patch_specs[index] for index in indices]
+
+        patches = self.input_extractor.extract_patch_batch(patch_specs)
+        if self.target_extractor is not None:
+            targets = self.target_extractor.extract_patch_batch(patch_specs)
+            return [
+                self.patch_transform(patch=patch, target=target)
+                for patch, target in zip(patches, targets)
+            ]
+
+        return [self.patch_transform(patch=patch) for patch in patches]
+
+    def get_data_statistics(self) -> tuple[list[float], list[float]]:
+        """
+        Return training data statistics.
+
+        Returns
+        -------
+        tuple of list of floats
+            Means and standard deviations across channels of the training data.
+        """
+        return self.image_stats.get_statistics()
+
+    def split_dataset(
+        self,
+        percentage: float = 0.1,
+        minimum_number: int = 5,
+    ) -> "CareamicsDataset":
+        """
+        Split up the dataset in two.
+
+        If the image stacks to split up (`percentage` of the image stacks, at least
+        `minimum_number`) are at most half of the image stacks, the dataset is split
+        by image stacks: the split image stacks are removed from this dataset and used
+        to create a new dataset. Otherwise, as in `InMemoryDataset`, the dataset is
+        split by patches: a fixed set of random patches is drawn once for the new
+        dataset, while this dataset keeps drawing new patches at every epoch, from the
+        same image stacks. In both cases, the new dataset shares the statistics of this
+        dataset.
+
+        Parameters
+        ----------
+        percentage : float, optional
+            Percentage of image stacks, or patches, to split up, by default 0.1.
+        minimum_number : int, optional
+            Minimum number of image stacks, or patches, to split up, by default 5.
+
+        Returns
+        -------
+        CareamicsDataset
+            Dataset containing the split image stacks, or patches.
+
+        Raises
+        ------
+        ValueError
+            If the percentage is smaller than 0 or larger than 1.
+        ValueError
+            If the minimum number is smaller than 1 or not smaller than the number of
+            patches.
+        """
+        n_stacks = len(self.input_extractor.image_stacks)
+        if percentage < 0 or percentage > 1:
+            raise ValueError(f"Percentage must be between 0 and 1, got {percentage}.")
+
+        if minimum_number < 1 or minimum_number >= len(self):
+            raise ValueError(
+                f"Minimum number of image stacks or patches must be between 1 and "
+                f"{len(self) - 1} (number of patches minus one), got "
+                f"{minimum_number}. Adjust the patch size or the minimum number."
+            )
+
+        rng = np.random.default_rng(self.seed)
+
+        dataset = copy.copy(self)
+        dataset.patch_transform = copy.deepcopy(self.patch_transform)
+
+        # the image stacks are only split if most of them are kept for training
+        n_split = max(round(percentage * n_stacks), minimum_number)
+        if 2 * n_split > n_stacks:
+            # split a fixed set of patches, drawn from all the image stacks
+            patch_specs = self.patch_specs_generator.generate(
+                self.patch_size, seed=int(rng.integers(2**32))
+            )
+            n_split = max(round(percentage * len(patch_specs)), minimum_number)
+            selected = np.sort(rng.choice(len(patch_specs), n_split, replace=False))
+            dataset.fixed_patch_specs = PatchSpecsArray(
+                data_idx=patch_specs.data_idx[selected],
+                sample_idx=patch_specs.sample_idx[selected],
+                coords=patch_specs.coords[selected],
+                patch_size=patch_specs.patch_size,
+            )
+            return dataset
+
+        split_indices = set(rng.choice(n_stacks, n_split, replace=False).tolist())
+
+        def _split(
+            extractor: PatchExtractor,
+        ) -> tuple[PatchExtractor, PatchExtractor]:
+            stacks = extractor.image_stacks
+            return (
+                PatchExtractor(
+                    [s for i, s in enumerate(stacks) if i not in split_indices]
+                ),
+                PatchExtractor([s for i, s in enumerate(stacks) if i in split_indices]),
+            )
+
+        self.input_extractor, dataset.input_extractor = _split(self.input_extractor)
+        if self.target_extractor is not None:
+            self.target_extractor, dataset.target_extractor = _split(
+                self.target_extractor
+            )
+        if self.foreground_indices is not None:
+            indices = self.foreground_indices
+            self.foreground_indices = [
+                idx for i, idx in enumerate(indices) if i not in split_indices
+            ]
+            dataset.foreground_indices = [
+                idx for i, idx in enumerate(indices) if i in split_indices
+            ]
+
+        for ds in (self, dataset):
+            ds.patch_specs_generator = ds._create_patch_specs_generator()
+            ds._patch_specs = None
+
+        return dataset
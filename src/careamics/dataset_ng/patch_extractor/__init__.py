@@ -2,6 +2,12 @@ __all__ = [
     "PatchExtractor",
     "PatchExtractorConstructor",
     "PatchSpecs",
+    "PatchSpecsArray",
 ]
 
-from .patch_extractor import PatchExtractor, PatchExtractorConstructor, PatchSpecs
+from .patch_extractor import (
+    PatchExtractor,
+    PatchExtractorConstructor,
+    PatchSpecs,
+    PatchSpecsArray,
+)
@@ -1,9 +1,11 @@
 __all__ = [
     "ImageStack",
     "InMemoryImageStack",
+    "MemmapTiffImageStack",
     "ZarrImageStack",
 ]
 
 from .image_stack_protocol import ImageStack
 from .in_memory_image_stack import InMemoryImageStack
+from .memmap_tiff_image_stack import MemmapTiffImageStack
 from .zarr_image_stack import ZarrImageStack
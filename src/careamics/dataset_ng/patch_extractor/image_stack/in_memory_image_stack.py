@@ -5,7 +5,11 @@ from typing import Any, Literal, Union
 from numpy.typing import NDArray
 from typing_extensions import Self
 
-from careamics.dataset.dataset_utils import reshape_array
+from careamics.dataset.dataset_utils import reshape_array, share_arrays
+from careamics.dataset.dataset_utils.shared_memory import (
+    get_shared_state,
+    set_shared_state,
+)
 from careamics.file_io.read import ReadFunc, read_tiff
 
 
@@ -19,6 +23,23 @@ class InMemoryImageStack:
         # data expected to be in SC(Z)YX shape, reason to use from_array constructor
         self._data = data
         self.data_shape: Sequence[int] = self._data.shape
+        self._shared: dict[str, Any] = {}
+
+    def share_memory(self) -> None:
+        """
+        Move the data to shared memory, to share it with the dataloader workers.
+
+        Worker processes started with the spawn or forkserver methods then receive a
+        handle to the data rather than a copy of it.
+        """
+        if not self._shared:
+            self._shared = share_arrays(self, ["_data"])
+
+    def __getstate__(self) -> dict[str, Any]:
+        return get_shared_state(self.__dict__, self._shared)
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(set_shared_state(state, state["_shared"]))
 
     def extract_patch(
         self, sample_idx: int, coords: Sequence[int], patch_size: Sequence[int]
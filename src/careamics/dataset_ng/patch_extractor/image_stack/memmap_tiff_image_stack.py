@@ -0,0 +1,128 @@
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Literal, Optional, Union
+
+import numpy as np
+import tifffile
+import zarr
+from numpy.typing import NDArray
+from typing_extensions import Self
+
+from careamics.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class MemmapTiffImageStack:
+    """
+    A class for extracting patches from a TIFF file without loading it into memory.
+
+    Uncompressed and contiguous TIFF files are memory-mapped, so that extracting a
+    patch only reads the bytes it spans. Other TIFF files (e.g. compressed or tiled)
+    are accessed through the zarr interface of `tifffile`, which only decodes the
+    pages, or tiles, intersecting the patch.
+
+    The file is opened lazily and the handle is not pickled, each dataloader worker
+    therefore opens its own. The data is presented in the SC(Z)YX order, following
+    `reshape_array`: S and T axes are merged into a single sample axis, and a singleton
+    C axis is added if the data has no channel axis.
+
+    Parameters
+    ----------
+    source : pathlib.Path
+        Path to the TIFF file.
+    axes : str
+        Axes of the data stored in the TIFF file, e.g. "YX", "SZYX" or "TCZYX".
+    """
+
+    def __init__(self, source: Path, axes: str):
+        self.source: Union[Path, Literal["array"]] = Path(source)
+        self.axes = axes
+
+        self._data: Optional[Union[np.memmap, zarr.Array]] = None
+        self.is_memmap = False
+
+        data = self.data
+        if len(axes) != data.ndim:
+            raise ValueError(
+                f"Incompatible data shape ({data.shape}) and axes ({axes}). Are the "
+                f"axes correct?"
+            )
+
+        n_samples = int(np.prod([data.shape[axes.index(a)] for a in "ST" if a in axes]))
+        n_channels = data.shape[axes.index("C")] if "C" in axes else 1
+        spatial = [data.shape[axes.index(a)] for a in "ZYX" if a in axes]
+        self.data_shape: Sequence[int] = (n_samples, n_channels, *spatial)
+
+    @property
+    def data(self) -> Union[np.memmap, zarr.Array]:
+        """Memory-mapped array, or zarr array if the file cannot be memory-mapped."""
+        if self._data is None:
+            try:
+                self._data = tifffile.memmap(self.source, mode="r")
+                self.is_memmap = True
+            except ValueError:
+                logger.debug(
+                    f"{self.source} cannot be memory-mapped, accessing it as a zarr "
+                    f"store instead."
+                )
+                store = tifffile.imread(self.source, aszarr=True)
+                self._data = zarr.open(store, mode="r")
+                self.is_memmap = False
+        return self._data
+
+    def __getstate__(self) -> dict[str, Any]:
+        # do not pickle the file handle, e.g. when the image stack is sent to
+        # dataloader workers, as a memmap would otherwise be pickled with its content
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+    def extract_patch(
+        self, sample_idx: int, coords: Sequence[int], patch_size: Sequence[int]
+    ) -> NDArray:
+        if len(coords) != len(patch_size):
+            raise ValueError("Length of coords and extent must match.")
+        if not 0 <= sample_idx < self.data_shape[0]:
+            raise IndexError(
+                f"Sample index {sample_idx} out of range for {self.data_shape[0]} "
+                f"samples."
+            )
+        # slicing the file does not fail for out of bounds patches, negative
+        # coordinates would wrap around
+        for c, e, s in zip(coords, patch_size, self.data_shape[2:]):
+            if c < 0 or c + e > s:
+                raise ValueError(
+                    f"Patch at {coords} of size {patch_size} is out of the bounds of "
+                    f"the spatial shape {self.data_shape[2:]}."
+                )
+
+        n_times = self.data.shape[self.axes.index("T")] if "T" in self.axes else 1
+        spatial_axes = [a for a in "ZYX" if a in self.axes]
+
+        index: list[Union[int, slice]] = []
+        for axis in self.axes:
+            if axis == "S":
+                index.append(sample_idx // n_times)
+            elif axis == "T":
+                index.append(sample_idx % n_times)
+            elif axis == "C":
+                index.append(slice(None))
+            else:
+                i = spatial_axes.index(axis)
+                index.append(slice(coords[i], coords[i] + patch_size[i]))
+
+        # copy to detach the patch from the memory-mapped file
+        patch = np.array(self.data[tuple(index)])
+
+        # reorder as C(Z)YX
+        patch_axes = "".join(a for a in self.axes if a not in "ST")
+        if "C" not in patch_axes:
+            patch = patch[np.newaxis]
+            patch_axes = "C" + patch_axes
+        order = [patch_axes.index(a) for a in "CZYX" if a in patch_axes]
+        return np.transpose(patch, order)
+
+    @classmethod
+    def from_tiff(cls, path: Union[Path, str], axes: str) -> Self:
+        return cls(source=Path(path), axes=axes)
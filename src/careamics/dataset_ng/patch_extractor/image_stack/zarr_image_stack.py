@@ -1,24 +1,206 @@
+from collections import OrderedDict
 from collections.abc import Sequence
+from itertools import product
 from pathlib import Path
+from typing import Any, Literal, Optional, Union
 
+import numpy as np
+import zarr
 from numpy.typing import NDArray
+from typing_extensions import Self
 
 
 class ZarrImageStack:
     """
     A class for extracting patches from an image stack that is stored as a zarr array.
+
+    Only the chunks intersecting a requested patch are read from disk, and the decoded
+    chunks are kept in a bounded least-recently-used (LRU) cache, so that overlapping
+    or neighbouring patches do not decode the same chunks repeatedly. The zarr array is
+    opened lazily and the cache is not pickled, each dataloader worker therefore opens
+    its own handle and maintains its own cache.
+
+    The data is presented in the SC(Z)YX order, following `reshape_array`: S and T
+    axes are merged into a single sample axis, and a singleton C axis is added if the
+    array has no channel axis.
+
+    Parameters
+    ----------
+    source : pathlib.Path
+        Path to the zarr store.
+    axes : str
+        Axes of the zarr array, e.g. "YX", "SZYX" or "TCZYX".
+    data_path : str, optional
+        Path of the array within the zarr store, by default "0" (the full resolution
+        level of an OME-Zarr image). If `None`, the store is expected to be an array.
+    chunk_cache_size : int, optional
+        Maximum size, in bytes, of the decoded chunks kept in memory, by default 256
+        MiB. If 0, chunks are not cached.
     """
 
     def __init__(
         self,
         source: Path,
-        # other args
+        axes: str,
+        data_path: Optional[str] = "0",
+        chunk_cache_size: int = 256 * 1024**2,
     ):
-        # Note: will probably need to store axes from metadata
-        #   - transformation will have to happen in `extract_patch`
-        raise NotImplementedError("Not implemented yet.")
+        self.source: Union[Path, Literal["array"]] = Path(source)
+        self.data_path = data_path
+        self.axes = axes
+        self.chunk_cache_size = chunk_cache_size
+
+        self._array: Optional[zarr.Array] = None
+        self._chunk_cache: OrderedDict[tuple[int, ...], NDArray] = OrderedDict()
+        self._chunk_cache_nbytes = 0
+
+        array = self.array
+        if len(axes) != array.ndim:
+            raise ValueError(
+                f"Incompatible data shape ({array.shape}) and axes ({axes}). Are the "
+                f"axes correct?"
+            )
+        self.chunks: tuple[int, ...] = array.chunks
+        # chunk shape in the SC(Z)YX order of the data
+        self.data_chunks: Sequence[int] = self._get_data_shape(array.chunks, axes)
+        self.data_shape: Sequence[int] = self._get_data_shape(array.shape, axes)
+
+    @property
+    def array(self) -> zarr.Array:
+        """Zarr array, opened in read-only mode on first access."""
+        if self._array is None:
+            if self.data_path is None:
+                self._array = zarr.open_array(str(self.source), mode="r")
+            else:
+                self._array = zarr.open_group(str(self.source), mode="r")[
+                    self.data_path
+                ]
+        return self._array
+
+    def __getstate__(self) -> dict[str, Any]:
+        # do not pickle the array handle and cached chunks, e.g. when the image stack
+        # is sent to dataloader workers
+        state = self.__dict__.copy()
+        state["_array"] = None
+        state["_chunk_cache"] = OrderedDict()
+        state["_chunk_cache_nbytes"] = 0
+        return state
+
+    @staticmethod
+    def _get_data_shape(shape: Sequence[int], axes: str) -> tuple[int, ...]:
+        """Compute the SC(Z)YX shape of an array (or chunk) with the given axes."""
+        n_samples = int(np.prod([shape[axes.index(a)] for a in "ST" if a in axes]))
+        n_channels = shape[axes.index("C")] if "C" in axes else 1
+        spatial = tuple(shape[axes.index(a)] for a in "ZYX" if a in axes)
+        return (n_samples, n_channels, *spatial)
+
+    def _get_region(
+        self, sample_idx: int, coords: Sequence[int], patch_size: Sequence[int]
+    ) -> tuple[slice, ...]:
+        """Compute the region of the zarr array, in its own axes, holding a patch."""
+        n_times = self.array.shape[self.axes.index("T")] if "T" in self.axes else 1
+        spatial_axes = [a for a in "ZYX" if a in self.axes]
+
+        region: list[slice] = []
+        for axis, size in zip(self.axes, self.array.shape):
+            if axis == "S":
+                start = sample_idx // n_times
+                region.append(slice(start, start + 1))
+            elif axis == "T":
+                start = sample_idx % n_times
+                region.append(slice(start, start + 1))
+            elif axis == "C":
+                region.append(slice(0, size))
+            else:
+                i = spatial_axes.index(axis)
+                region.append(slice(coords[i], coords[i] + patch_size[i]))
+
+        return tuple(region)
+
+    def _read_chunk(self, chunk_idx: tuple[int, ...]) -> NDArray:
+        """Read a chunk, from the cache if possible."""
+        chunk = self._chunk_cache.get(chunk_idx)
+        if chunk is not None:
+            self._chunk_cache.move_to_end(chunk_idx)
+            return chunk
+
+        chunk = self.array[
+            tuple(
+                slice(i * c, min((i + 1) * c, s))
+                for i, c, s in zip(chunk_idx, self.chunks, self.array.shape)
+            )
+        ]
+
+        if chunk.nbytes <= self.chunk_cache_size:
+            self._chunk_cache[chunk_idx] = chunk
+            self._chunk_cache_nbytes += chunk.nbytes
+            while self._chunk_cache_nbytes > self.chunk_cache_size:
+                _, evicted = self._chunk_cache.popitem(last=False)
+                self._chunk_cache_nbytes -= evicted.nbytes
+
+        return chunk
+
+    def _read_region(self, region: tuple[slice, ...]) -> NDArray:
+        """Read a region of the zarr array by assembling the chunks it intersects."""
+        out = np.empty(tuple(r.stop - r.start for r in region), dtype=self.array.dtype)
+        chunk_ranges = [
+            range(r.start // c, (r.stop - 1) // c + 1)
+            for r, c in zip(region, self.chunks)
+        ]
+        for chunk_idx in product(*chunk_ranges):
+            chunk = self._read_chunk(chunk_idx)
+
+            src, dst = [], []
+            for i, c, r in zip(chunk_idx, self.chunks, region):
+                start = max(r.start, i * c)
+                stop = min(r.stop, (i + 1) * c)
+                src.append(slice(start - i * c, stop - i * c))
+                dst.append(slice(start - r.start, stop - r.start))
+            out[tuple(dst)] = chunk[tuple(src)]
+
+        return out
 
     def extract_patch(
         self, sample_idx: int, coords: Sequence[int], patch_size: Sequence[int]
     ) -> NDArray:
-        raise NotImplementedError("Not implemented yet.")
+        if len(coords) != len(patch_size):
+            raise ValueError("Length of coords and extent must match.")
+        if not 0 <= sample_idx < self.data_shape[0]:
+            raise IndexError(
+                f"Sample index {sample_idx} out of range for {self.data_shape[0]} "
+                f"samples."
+            )
+        for c, e, s in zip(coords, patch_size, self.data_shape[2:]):
+            if c < 0 or c + e > s:
+                raise ValueError(
+                    f"Patch at {coords} of size {patch_size} is out of the bounds of "
+                    f"the spatial shape {self.data_shape[2:]}."
+                )
+
+        patch = self._read_region(self._get_region(sample_idx, coords, patch_size))
+
+        # remove S and T, then reorder as C(Z)YX
+        patch_axes = "".join(a for a in self.axes if a not in "ST")
+        patch = patch.reshape(
+            [s for s, a in zip(patch.shape, self.axes) if a not in "ST"]
+        )
+        if "C" not in patch_axes:
+            patch = patch[np.newaxis]
+            patch_axes = "C" + patch_axes
+        order = [patch_axes.index(a) for a in "CZYX" if a in patch_axes]
+        return np.transpose(patch, order)
+
+    @classmethod
+    def from_zarr(
+        cls,
+        path: Union[Path, str],
+        axes: str,
+        data_path: Optional[str] = "0",
+        chunk_cache_size: int = 256 * 1024**2,
+    ) -> Self:
+        return cls(
+            source=Path(path),
+            axes=axes,
+            data_path=data_path,
+            chunk_cache_size=chunk_cache_size,
+        )
@@ -1,13 +1,19 @@
 from collections.abc import Sequence
 from pathlib import Path
-from typing import Any, Protocol, TypedDict, Union
+from typing import Any, Optional, Protocol, TypedDict, Union, overload
 
-from numpy.typing import NDArray
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
 from typing_extensions import Self
 
 from careamics.file_io.read import ReadFunc
 
-from .image_stack import ImageStack, InMemoryImageStack
+from .image_stack import (
+    ImageStack,
+    InMemoryImageStack,
+    MemmapTiffImageStack,
+    ZarrImageStack,
+)
 
 
 class PatchSpecs(TypedDict):
@@ -17,6 +23,93 @@ class PatchSpecs(TypedDict):
     patch_size: Sequence[int]
 
 
+class PatchSpecsArray(Sequence[PatchSpecs]):
+    """
+    A sequence of patch specifications stored as a struct of arrays.
+
+    Compared to a list of `PatchSpecs` dictionaries, it holds a handful of contiguous
+    arrays irrespective of the number of patches, and creates the `PatchSpecs` lazily
+    when indexed. All patches share the same patch size.
+
+    Parameters
+    ----------
+    data_idx : numpy.ndarray
+        Index of the image stack of each patch, of shape (N,).
+    sample_idx : numpy.ndarray
+        Index of the sample of each patch, of shape (N,).
+    coords : numpy.ndarray
+        Start coordinates of each patch in the spatial dimensions, of shape (N, D).
+    patch_size : Sequence of int
+        Size of the patches in each of the D spatial dimensions.
+    """
+
+    def __init__(
+        self,
+        data_idx: NDArray[np.integer],
+        sample_idx: NDArray[np.integer],
+        coords: NDArray[np.integer],
+        patch_size: Sequence[int],
+    ):
+        if not (len(data_idx) == len(sample_idx) == len(coords)):
+            raise ValueError(
+                f"Number of data indices ({len(data_idx)}), sample indices "
+                f"({len(sample_idx)}) and coordinates ({len(coords)}) must match."
+            )
+        if coords.ndim != 2 or coords.shape[1] != len(patch_size):
+            raise ValueError(
+                f"Coordinates must be of shape (N, {len(patch_size)}), got "
+                f"{coords.shape}."
+            )
+        self.data_idx = data_idx
+        self.sample_idx = sample_idx
+        self.coords = coords
+        self.patch_size: tuple[int, ...] = tuple(patch_size)
+
+    def __len__(self) -> int:
+        return len(self.data_idx)
+
+    @overload
+    def __getitem__(self, index: int) -> PatchSpecs: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "PatchSpecsArray": ...
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[PatchSpecs, "PatchSpecsArray"]:
+        if isinstance(index, slice):
+            return PatchSpecsArray(
+                data_idx=self.data_idx[index],
+                sample_idx=self.sample_idx[index],
+                coords=self.coords[index],
+                patch_size=self.patch_size,
+            )
+        return PatchSpecs(
+            data_idx=int(self.data_idx[index]),
+            sample_idx=int(self.sample_idx[index]),
+            coords=tuple(int(c) for c in self.coords[index]),
+            patch_size=self.patch_size,
+        )
+
+    @classmethod
+    def concatenate(
+        cls, patch_specs: Sequence["PatchSpecsArray"], patch_size: Sequence[int]
+    ) -> Self:
+        if len(patch_specs) == 0:
+            return cls(
+                data_idx=np.empty(0, dtype=np.int32),
+                sample_idx=np.empty(0, dtype=np.int32),
+                coords=np.empty((0, len(patch_size)), dtype=np.int32),
+                patch_size=patch_size,
+            )
+        return cls(
+            data_idx=np.concatenate([specs.data_idx for specs in patch_specs]),
+            sample_idx=np.concatenate([specs.sample_idx for specs in patch_specs]),
+            coords=np.concatenate([specs.coords for specs in patch_specs]),
+            patch_size=patch_size,
+        )
+
+
 class PatchExtractorConstructor(Protocol):
 
     # TODO: expand Union for new constructors, or just type hint as Any
@@ -51,6 +144,13 @@ class PatchExtractor:
         ]
         return cls(data_readers=data_readers)
 
+    @classmethod
+    def from_memmap_tiff_files(cls, source: Sequence[Path], *, axes: str) -> Self:
+        data_readers = [
+            MemmapTiffImageStack.from_tiff(path=path, axes=axes) for path in source
+        ]
+        return cls(data_readers=data_readers)
+
     # TODO: similar to tiff - rename to load_from_custom_file_type?
     @classmethod
     def from_custom_file_type(
@@ -71,10 +171,27 @@ class PatchExtractor:
         ]
         return cls(data_readers=data_readers)
 
+    # Note: unlike the other constructors, the data is not loaded into memory, patches
+    #   are read on demand from the chunks of the zarr arrays.
     @classmethod
-    def from_zarr_files(cls, source, **kwargs) -> Self:
-        # TODO: will this create a ZarrImageStack for each array in the zarr file?
-        raise NotImplementedError("Reading from zarr has not been implemented.")
+    def from_zarr_files(
+        cls,
+        source: Sequence[Path],
+        *,
+        axes: str,
+        data_path: Optional[str] = "0",
+        chunk_cache_size: int = 256 * 1024**2,
+    ) -> Self:
+        data_readers = [
+            ZarrImageStack.from_zarr(
+                path=path,
+                axes=axes,
+                data_path=data_path,
+                chunk_cache_size=chunk_cache_size,
+            )
+            for path in source
+        ]
+        return cls(data_readers=data_readers)
 
     def extract_patch(
         self,
@@ -89,3 +206,61 @@ class PatchExtractor:
 
     def extract_patches(self, patch_specs: Sequence[PatchSpecs]) -> list[NDArray]:
         return [self.extract_patch(**patch_spec) for patch_spec in patch_specs]
+
+    def extract_patch_batch(
+        self,
+        patch_specs: Sequence[PatchSpecs],
+        out: Optional[NDArray] = None,
+        dtype: DTypeLike = np.float32,
+    ) -> NDArray:
+        """
+        Extract a batch of patches into a single contiguous array.
+
+        The patches are read grouped by image stack and sample, which improves the
+        locality of the reads (e.g. chunk caches of zarr image stacks), but are
+        written in the order of `patch_specs`. All patches must have the same patch
+        size and number of channels.
+
+        Parameters
+        ----------
+        patch_specs : Sequence of PatchSpecs
+            Specifications of the B patches to extract.
+        out : numpy.ndarray, optional
+            Preallocated array of shape (B, C, (Z), Y, X) in which to write the
+            patches. If `None`, a new array is allocated.
+        dtype : numpy.typing.DTypeLike, optional
+            Data type of the allocated array, by default `np.float32`. Ignored if `out`
+            is provided.
+
+        Returns
+        -------
+        numpy.ndarray
+            Patches of shape (B, C, (Z), Y, X).
+        """
+        n_patches = len(patch_specs)
+        if isinstance(patch_specs, PatchSpecsArray):
+            data_indices, sample_indices = patch_specs.data_idx, patch_specs.sample_idx
+        else:
+            data_indices = np.array([spec["data_idx"] for spec in patch_specs])
+            sample_indices = np.array([spec["sample_idx"] for spec in patch_specs])
+
+        if out is None:
+            if n_patches == 0:
+                raise ValueError("Cannot allocate a batch for an empty list of specs.")
+            first_spec = patch_specs[0]
+            n_channels = self.image_stacks[first_spec["data_idx"]].data_shape[1]
+            out = np.empty(
+                (n_patches, n_channels, *first_spec["patch_size"]), dtype=dtype
+            )
+        elif len(out) != n_patches:
+            raise ValueError(
+                f"Output array has room for {len(out)} patches, but {n_patches} "
+                f"patch specs were given."
+            )
+
+        # read the patches grouped by image stack and sample
+        order = np.lexsort((sample_indices, data_indices))
+        for i in order:
+            out[i] = self.extract_patch(**patch_specs[int(i)])
+
+        return out
@@ -14,10 +14,13 @@ from careamics.dataset_ng.patch_extractor import (
 
 def get_patch_extractor_constructor(
     data_config: DataConfig,
+    in_memory: bool = True,
 ) -> PatchExtractorConstructor:
     if data_config.data_type == SupportedData.ARRAY:
         return PatchExtractor.from_arrays
     elif data_config.data_type == SupportedData.TIFF:
+        if not in_memory:
+            return PatchExtractor.from_memmap_tiff_files
         return PatchExtractor.from_tiff_files
     elif data_config.data_type == SupportedData.CUSTOM:
         return PatchExtractor.from_custom_file_type
@@ -31,6 +34,7 @@ def create_patch_extractors(
     val_data: Optional[Union[Sequence[NDArray], Sequence[Path]]] = None,
     train_data_target: Optional[Union[Sequence[NDArray], Sequence[Path]]] = None,
     val_data_target: Optional[Union[Sequence[NDArray], Sequence[Path]]] = None,
+    in_memory: bool = True,
     **kwargs,
 ) -> tuple[
     PatchExtractor,
@@ -40,7 +44,7 @@ def create_patch_extractors(
 ]:
 
     # get correct constructor
-    constructor = get_patch_extractor_constructor(data_config)
+    constructor = get_patch_extractor_constructor(data_config, in_memory=in_memory)
 
     # build key word args
     constructor_kwargs = {"axes": data_config.axes, **kwargs}
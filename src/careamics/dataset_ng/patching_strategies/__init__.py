@@ -1,6 +1,11 @@
-__all__ = ["PatchSpecsGenerator", "RandomPatchSpecsGenerator"]
+__all__ = [
+    "ChunkedPatchSpecsGenerator",
+    "PatchSpecsGenerator",
+    "RandomPatchSpecsGenerator",
+]
 
 from .patch_specs_generator import (
+    ChunkedPatchSpecsGenerator,
     PatchSpecsGenerator,
     RandomPatchSpecsGenerator,
 )
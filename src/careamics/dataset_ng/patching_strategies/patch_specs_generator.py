@@ -1,10 +1,16 @@
+from collections import deque
 from collections.abc import Sequence
-from typing import ParamSpec, Protocol
+from typing import Optional, ParamSpec, Protocol
 
 import numpy as np
 from numpy.typing import NDArray
 
-from ..patch_extractor import PatchSpecs
+from careamics.dataset.patching.foreground_sampling import (
+    ForegroundIndex,
+    sample_patch_coordinates,
+)
+
+from ..patch_extractor import PatchSpecs, PatchSpecsArray
 
 P = ParamSpec("P")
 
@@ -13,7 +19,7 @@ class PatchSpecsGenerator(Protocol[P]):
 
     def generate(
         self, patch_size: Sequence[int], *args: P.args, **kwargs: P.kwargs
-    ) -> list[PatchSpecs]: ...
+    ) -> Sequence[PatchSpecs]: ...
 
     # Should return the number of patches that will be produced for a set of args
     # Will be for mapped dataset length
@@ -23,37 +29,69 @@ class PatchSpecsGenerator(Protocol[P]):
 
 
 class RandomPatchSpecsGenerator:
+    """
+    Generate random patch specifications, uniformly or favouring the foreground.
+
+    If foreground indices (one per sample of each data shape, built for the patch
+    size used in `generate`) are given, each patch is drawn among the foreground
+    patches of its sample with probability `foreground_ratio`.
+    """
 
-    def __init__(self, data_shapes: Sequence[Sequence[int]]):
+    def __init__(
+        self,
+        data_shapes: Sequence[Sequence[int]],
+        foreground_indices: Optional[Sequence[Sequence[ForegroundIndex]]] = None,
+        foreground_ratio: float = 0.0,
+    ):
         self.data_shapes = data_shapes
+        self.foreground_indices = foreground_indices
+        self.foreground_ratio = foreground_ratio
 
-    def generate(self, patch_size: Sequence[int], seed: int) -> list[PatchSpecs]:
+    def generate(self, patch_size: Sequence[int], seed: int) -> PatchSpecsArray:
         rng = np.random.default_rng(seed=seed)
-        patch_specs: list[PatchSpecs] = []
+        data_patch_specs: list[PatchSpecsArray] = []
         for data_idx, data_shape in enumerate(self.data_shapes):
 
             # shape on which data is patched
             data_spatial_shape = data_shape[-len(patch_size) :]
 
             n_patches = self._n_patches_in_sample(patch_size, data_spatial_shape)
-            data_patch_specs = [
-                PatchSpecs(
-                    data_idx=data_idx,
-                    sample_idx=sample_idx,
-                    coords=tuple(
-                        rng.integers(
-                            np.zeros(len(patch_size), dtype=int),
-                            np.array(data_spatial_shape) - np.array(patch_size),
-                            endpoint=True,
+            n_samples = data_shape[0]
+
+            if self.foreground_indices is not None and self.foreground_ratio > 0:
+                # draw the coordinates sample by sample, favouring the foreground
+                coords = np.concatenate(
+                    [
+                        sample_patch_coordinates(
+                            rng,
+                            data_spatial_shape,
+                            patch_size,
+                            n_patches,
+                            self.foreground_indices[data_idx][sample_idx],
+                            self.foreground_ratio,
                         )
+                        for sample_idx in range(n_samples)
+                    ]
+                )
+            else:
+                # draw the coordinates of all the patches of the data at once
+                coords = rng.integers(
+                    np.zeros(len(patch_size), dtype=int),
+                    np.array(data_spatial_shape) - np.array(patch_size),
+                    size=(n_samples * n_patches, len(patch_size)),
+                    endpoint=True,
+                ).astype(np.int32)
+            data_patch_specs.append(
+                PatchSpecsArray(
+                    data_idx=np.full(n_samples * n_patches, data_idx, dtype=np.int32),
+                    sample_idx=np.repeat(
+                        np.arange(n_samples, dtype=np.int32), n_patches
                     ),
+                    coords=coords,
                     patch_size=patch_size,
                 )
-                for sample_idx in range(data_shape[0])
-                for _ in range(n_patches)
-            ]
-            patch_specs.extend(data_patch_specs)
-        return patch_specs
+            )
+        return PatchSpecsArray.concatenate(data_patch_specs, patch_size)
 
     # NOTE: enerate and n_patches methods must have matching signatures
     #   as dictated by protocol
@@ -83,8 +121,196 @@ class RandomPatchSpecsGenerator:
         return int(np.ceil(np.prod(spatial_shape) / np.prod(patch_size)))
 
 
+class ChunkedPatchSpecsGenerator(RandomPatchSpecsGenerator):
+    """
+    Generate random patch specifications in runs of patches sharing chunks.
+
+    The patches are drawn as in `RandomPatchSpecsGenerator`, then grouped by the
+    sample and the chunks they overlap, i.e. by the first and last chunks along each
+    spatial dimension. The groups are emitted in a random order of the chunk of their
+    first pixel, the groups sharing that chunk being consecutive, and the patches of a
+    group consecutively in a random order. A chunk decoded by a lazily read image stack
+    therefore serves all its patches before being evicted from the chunk cache. The
+    patches are randomized at the chunk level, and should not be shuffled again by the
+    dataloader.
+
+    Image stacks without chunks (`None` chunk shape) are grouped by sample.
+
+    A dataloader with several workers sends consecutive batches to different workers,
+    each of them decoding the chunks of its batches. With `num_workers` larger than
+    1, the groups are therefore dealt to the workers so that each group is read by a
+    single worker: batch `i` (of `batch_size` patches) only contains patches of the
+    groups of worker `i % num_workers`. Only the last groups are shared between
+    workers, to give every worker the same number of batches.
+
+    In a distributed setting, a `DistributedSampler` without shuffling sends every
+    `world_size`-th patch to each rank. With `world_size` larger than 1, the ordered
+    patches are therefore split into one contiguous block per rank, and the blocks
+    interleaved so that each rank receives its block, and its groups, in order. The
+    groups of each block are dealt to the workers of the rank.
+    """
+
+    def __init__(
+        self,
+        data_shapes: Sequence[Sequence[int]],
+        chunk_shapes: Sequence[Optional[Sequence[int]]],
+        foreground_indices: Optional[Sequence[Sequence[ForegroundIndex]]] = None,
+        foreground_ratio: float = 0.0,
+        batch_size: int = 1,
+        num_workers: int = 0,
+        world_size: int = 1,
+    ):
+        if len(chunk_shapes) != len(data_shapes):
+            raise ValueError(
+                f"Number of chunk shapes ({len(chunk_shapes)}) does not match the "
+                f"number of data shapes ({len(data_shapes)})."
+            )
+        super().__init__(data_shapes, foreground_indices, foreground_ratio)
+        self.chunk_shapes = chunk_shapes
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.world_size = world_size
+
+    def generate(self, patch_size: Sequence[int], seed: int) -> PatchSpecsArray:
+        patch_specs = super().generate(patch_size, seed)
+        if len(patch_specs) == 0:
+            return patch_specs
+
+        # spatial chunks of the first and last pixels of every patch
+        n_dims = len(patch_size)
+        chunk_sizes = np.array(
+            [
+                (
+                    chunk_shape[-n_dims:]
+                    if chunk_shape is not None
+                    else data_shape[-n_dims:]
+                )
+                for data_shape, chunk_shape in zip(self.data_shapes, self.chunk_shapes)
+            ],
+            dtype=np.int32,
+        )
+        patch_chunk_sizes = chunk_sizes[patch_specs.data_idx]
+        first_chunk = patch_specs.coords // patch_chunk_sizes
+        last_coords = patch_specs.coords + np.array(patch_size) - 1
+        last_chunk = last_coords // patch_chunk_sizes
+
+        # groups of patches overlapping the same chunks, clustered by first chunk
+        sample_keys = np.column_stack([patch_specs.data_idx, patch_specs.sample_idx])
+        _, cluster = np.unique(
+            np.column_stack([sample_keys, first_chunk]), axis=0, return_inverse=True
+        )
+        _, group = np.unique(
+            np.column_stack([sample_keys, first_chunk, last_chunk]),
+            axis=0,
+            return_inverse=True,
+        )
+        cluster = cluster.reshape(-1)
+        group = group.reshape(-1)
+
+        # random order of the clusters, of their groups, and of the patches
+        rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+        cluster_order = rng.permutation(cluster.max() + 1)
+        group_order = rng.permutation(group.max() + 1)
+        order = np.lexsort(
+            (rng.random(len(group)), group_order[group], cluster_order[cluster])
+        )
+
+        if self.world_size > 1:
+            # contiguous blocks of the sizes of the strided subsets of the ranks
+            n_patches = len(order)
+            sizes = [
+                len(range(r, n_patches, self.world_size))
+                for r in range(self.world_size)
+            ]
+            blocks = np.split(order, np.cumsum(sizes)[:-1])
+            order = np.empty_like(order)
+            for rank, block in enumerate(blocks):
+                order[rank :: self.world_size] = self._deal_group_runs(block, group)
+        else:
+            order = self._deal_group_runs(order, group)
+
+        return PatchSpecsArray(
+            data_idx=patch_specs.data_idx[order],
+            sample_idx=patch_specs.sample_idx[order],
+            coords=patch_specs.coords[order],
+            patch_size=patch_size,
+        )
+
+    def _deal_group_runs(self, order: NDArray, group: NDArray) -> NDArray:
+        """
+        Deal the runs of patches of the same group to the dataloader workers.
+
+        Parameters
+        ----------
+        order : numpy.ndarray
+            Indices of the patches, the patches of each group being consecutive.
+        group : numpy.ndarray
+            Group of every patch.
+
+        Returns
+        -------
+        numpy.ndarray
+            Indices of the patches.
+        """
+        if self.num_workers <= 1 or len(order) == 0:
+            return order
+
+        runs = np.split(order, np.flatnonzero(np.diff(group[order])) + 1)
+        return self._deal_runs(runs)
+
+    def _deal_runs(self, runs: list[NDArray]) -> NDArray:
+        """
+        Order the runs of patches so that each run is read by a single worker.
+
+        The batches are filled in the order in which the dataloader sends them to the
+        workers, each worker taking the next run when its current run is exhausted.
+        Once all runs have been taken, workers take the end of the longest remaining
+        runs of the other workers.
+
+        Parameters
+        ----------
+        runs : list of numpy.ndarray
+            Indices of the patches of each run, in the order of the runs.
+
+        Returns
+        -------
+        numpy.ndarray
+            Indices of the patches.
+        """
+        queue = deque(runs)
+        current = [np.empty(0, dtype=int) for _ in range(self.num_workers)]
+        parts: list[NDArray] = []
+        n_left = sum(len(run) for run in runs)
+        batch_idx = 0
+        while n_left > 0:
+            worker_id = batch_idx % self.num_workers
+            n_batch = min(self.batch_size, n_left)
+            n_left -= n_batch
+            while n_batch > 0:
+                if len(current[worker_id]) == 0 and len(queue) > 0:
+                    current[worker_id] = queue.popleft()
+
+                if len(current[worker_id]) > 0:
+                    n_taken = min(n_batch, len(current[worker_id]))
+                    parts.append(current[worker_id][:n_taken])
+                    current[worker_id] = current[worker_id][n_taken:]
+                else:
+                    other = max(range(self.num_workers), key=lambda w: len(current[w]))
+                    n_taken = min(n_batch, len(current[other]))
+                    split = len(current[other]) - n_taken
+                    parts.append(current[other][split:])
+                    current[other] = current[other][:split]
+                n_batch -= n_taken
+            batch_idx += 1
+
+        return np.concatenate(parts)
+
+
 if __name__ == "__main__":
     # testing mypy accepts protocol type
     patch_specs_generator: PatchSpecsGenerator = RandomPatchSpecsGenerator(
         [(1, 1, 6, 6), (1, 1, 4, 4)]
     )
+    patch_specs_generator = ChunkedPatchSpecsGenerator(
+        [(1, 1, 6, 6), (1, 1, 4, 4)], [(2, 2), None]
+    )
@@ -1,12 +1,24 @@
 """Functions relating to reading image files of different formats."""
 
 __all__ = [
+    "ImageMetadata",
     "ReadFunc",
+    "ReadMetadataFunc",
     "get_read_func",
+    "read_metadata",
     "read_tiff",
+    "read_tiff_metadata",
     "read_zarr",
+    "read_zarr_metadata",
 ]
 
 from .get_func import ReadFunc, get_read_func
+from .metadata import (
+    ImageMetadata,
+    ReadMetadataFunc,
+    read_metadata,
+    read_tiff_metadata,
+    read_zarr_metadata,
+)
 from .tiff import read_tiff
 from .zarr import read_zarr
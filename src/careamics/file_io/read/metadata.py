@@ -0,0 +1,182 @@
+"""Functions to read the metadata of images without decoding their pixels."""
+
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Any, Callable, Optional, Protocol, Union
+
+import numpy as np
+import tifffile
+import zarr
+
+from careamics.config.support import SupportedData
+
+
+@dataclass
+class ImageMetadata:
+    """Dataclass to store the shape and data type of an image."""
+
+    shape: tuple[int, ...]
+    """Shape of the image, in the order of the axes of the file."""
+
+    dtype: np.dtype
+    """Data type of the image."""
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the decoded image in bytes.
+
+        Returns
+        -------
+        int
+            Size of the decoded image in bytes.
+        """
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+
+class ReadMetadataFunc(Protocol):
+    """Protocol for type hinting metadata read functions."""
+
+    def __call__(self, file_path: Path, *args, **kwargs) -> ImageMetadata:
+        """
+        Type hinted callables must match this function signature (not including self).
+
+        Parameters
+        ----------
+        file_path : pathlib.Path
+            Path to file.
+        *args
+            Other positional arguments.
+        **kwargs
+            Other keyword arguments.
+        """
+
+
+def read_tiff_metadata(file_path: Path, *args: Any, **kwargs: Any) -> ImageMetadata:
+    """
+    Read the shape and data type of a tiff file from its header.
+
+    The metadata is that of the first series of the file, which is the array read by
+    `read_tiff`.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        Path to a file.
+    *args : Any
+        Additional arguments.
+    **kwargs : Any
+        Additional keyword arguments.
+
+    Returns
+    -------
+    ImageMetadata
+        Shape and data type of the image.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a valid tiff.
+    """
+    if not fnmatch(
+        file_path.suffix, SupportedData.get_extension_pattern(SupportedData.TIFF)
+    ):
+        raise ValueError(f"File {file_path} is not a valid tiff.")
+
+    with tifffile.TiffFile(file_path) as tif:
+        series = tif.series[0]
+        return ImageMetadata(tuple(series.shape), np.dtype(series.dtype))
+
+
+def read_zarr_metadata(
+    file_path: Union[Path, str], *args: Any, data_path: str = "0", **kwargs: Any
+) -> ImageMetadata:
+    """
+    Read the shape and data type of a zarr array from its metadata.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path or str
+        Path to a zarr array or group.
+    *args : Any
+        Additional arguments.
+    data_path : str, optional
+        Path of the array within the group, by default "0". Ignored if `file_path`
+        points to an array.
+    **kwargs : Any
+        Additional keyword arguments.
+
+    Returns
+    -------
+    ImageMetadata
+        Shape and data type of the array.
+    """
+    source = zarr.open(str(file_path), mode="r")
+    array = source[data_path] if isinstance(source, zarr.hierarchy.Group) else source
+    return ImageMetadata(tuple(array.shape), np.dtype(array.dtype))
+
+
+READ_METADATA_FUNCS: dict[SupportedData, ReadMetadataFunc] = {
+    SupportedData.TIFF: read_tiff_metadata,
+}
+
+
+def read_metadata(
+    file_path: Path,
+    data_type: Union[str, SupportedData],
+    read_metadata_func: Optional[Callable] = None,
+    read_source_func: Optional[Callable] = None,
+    axes: Optional[str] = None,
+) -> ImageMetadata:
+    """
+    Read the shape and data type of an image, without decoding it if possible.
+
+    The metadata of tiff files and zarr arrays is read from their headers. For other
+    data types, `read_metadata_func` is used if provided, and the image is otherwise
+    read with `read_source_func`, which decodes it.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+        Path to a file.
+    data_type : str or SupportedData
+        Data type of the file.
+    read_metadata_func : Callable, optional
+        Function returning the metadata of custom files, by default None. It receives
+        the file path and the axes.
+    read_source_func : Callable, optional
+        Function reading custom files, by default None. Only used if no
+        `read_metadata_func` is provided.
+    axes : str, optional
+        Axes of the data, passed to the read functions, by default None.
+
+    Returns
+    -------
+    ImageMetadata
+        Shape and data type of the image.
+
+    Raises
+    ------
+    ValueError
+        If the metadata of a custom file cannot be read, because neither
+        `read_metadata_func` nor `read_source_func` are provided.
+    """
+    if data_type in READ_METADATA_FUNCS:
+        return READ_METADATA_FUNCS[SupportedData(data_type)](file_path, axes)
+
+    if file_path.suffix == ".zarr" or any(
+        (file_path / name).exists() for name in (".zarray", ".zgroup")
+    ):
+        return read_zarr_metadata(file_path, axes)
+
+    if read_metadata_func is not None:
+        return read_metadata_func(file_path, axes)
+
+    if read_source_func is not None:
+        array = read_source_func(file_path, axes)
+        return ImageMetadata(tuple(array.shape), np.dtype(array.dtype))
+
+    raise ValueError(
+        f"Cannot read the metadata of {file_path}, provide a `read_metadata_func` or "
+        f"a `read_source_func`."
+    )
@@ -20,6 +20,7 @@ from careamics.config.support import (
     SupportedScheduler,
 )
 from careamics.config.tile_information import TileInformation
+from careamics.config.transformations import NormalizeModel
 from careamics.losses import loss_factory
 from careamics.models.lvae.likelihoods import (
     GaussianLikelihood,
@@ -33,6 +34,7 @@ from careamics.models.lvae.noise_models import (
 )
 from careamics.models.model_factory import model_factory
 from careamics.transforms import (
+    ComposeTorch,
     Denormalize,
     ImageRestorationTTA,
     N2VManipulateTorch,
@@ -106,6 +108,9 @@ class FCNModule(L.LightningModule):
         self.lr_scheduler_name = algorithm_config.lr_scheduler.name
         self.lr_scheduler_params = algorithm_config.lr_scheduler.parameters
 
+        # batched normalization and augmentations, created when the trainer sets up
+        self.batch_transform: Optional[ComposeTorch] = None
+
     def forward(self, x: Any) -> Any:
         """Forward pass.
 
@@ -121,6 +126,112 @@ class FCNModule(L.LightningModule):
         """
         return self.model(x)
 
+    def setup(self, stage: str) -> None:
+        """Create the batched transforms, if the data applies them on the device.
+
+        The transforms are created from the data configuration of the datamodule,
+        which is set up beforehand and records the data statistics. Without a
+        datamodule, the datasets are checked once their dataloaders are loaded (see
+        `on_train_start` and `on_validation_start`).
+
+        Parameters
+        ----------
+        stage : str
+            Stage, e.g. "fit" or "validate".
+        """
+        data_config = getattr(
+            getattr(self.trainer, "datamodule", None), "data_config", None
+        )
+        if data_config is not None and data_config.device_transforms:
+            self.batch_transform = ComposeTorch(
+                transform_list=[
+                    NormalizeModel(
+                        image_means=data_config.image_means,
+                        image_stds=data_config.image_stds,
+                        target_means=data_config.target_means,
+                        target_stds=data_config.target_stds,
+                    )
+                ]
+                + list(data_config.transforms)
+            )
+        else:
+            self.batch_transform = None
+
+    def _check_device_transforms(self, dataloaders: Any) -> None:
+        """Check that the batched transforms exist if the datasets expect them.
+
+        Without a datamodule recording the data configuration, e.g. when the
+        dataloaders are passed directly to the trainer, the batched transforms
+        cannot be created in `setup` and the batches would neither be normalized nor
+        augmented.
+
+        Parameters
+        ----------
+        dataloaders : Any
+            Dataloader, or sequence of dataloaders.
+
+        Raises
+        ------
+        ValueError
+            If a dataset applies its transforms on the device, but no data
+            configuration is available to create them.
+        """
+        if self.batch_transform is not None:
+            return
+
+        if not isinstance(dataloaders, (list, tuple)):
+            dataloaders = [dataloaders]
+        for dataloader in dataloaders:
+            data_config = getattr(
+                getattr(dataloader, "dataset", None), "data_config", None
+            )
+            if getattr(data_config, "device_transforms", False):
+                raise ValueError(
+                    "The data configuration sets `device_transforms`, but no data "
+                    "configuration is available to create the batched transforms. "
+                    "Pass the data through a datamodule with a `data_config` "
+                    "attribute (e.g. `TrainDataModule`)."
+                )
+
+    def _transform_batch(self, batch: Any) -> Any:
+        """Normalize and augment a batch on the device, if the data requires it.
+
+        Parameters
+        ----------
+        batch : Any
+            Batch, on the device.
+
+        Returns
+        -------
+        Any
+            Transformed batch.
+        """
+        if self.batch_transform is None:
+            return batch
+
+        return list(self.batch_transform(*batch))
+
+    def on_train_start(self) -> None:
+        """Check that the training batches can be transformed on the device."""
+        self._check_device_transforms(self.trainer.train_dataloader)
+
+    def on_validation_start(self) -> None:
+        """Check that the validation batches can be transformed on the device."""
+        self._check_device_transforms(self.trainer.val_dataloaders)
+
+    def on_train_epoch_start(self) -> None:
+        """Propagate the current epoch to the training dataset, if it supports it.
+
+        Datasets drawing new patches at every epoch (e.g. `CareamicsDataset`) derive
+        them from the epoch.
+        """
+        train_dataloader = self.trainer.train_dataloader
+        set_epoch = getattr(
+            getattr(train_dataloader, "dataset", None), "set_epoch", None
+        )
+        if callable(set_epoch):
+            set_epoch(self.current_epoch)
+
     def training_step(self, batch: Tensor, batch_idx: Any) -> Any:
         """Training step.
 
@@ -136,7 +247,7 @@ class FCNModule(L.LightningModule):
         Any
             Loss value.
         """
-        x, *targets = batch
+        x, *targets = self._transform_batch(batch)
         if self.use_n2v and self.n2v_preprocess is not None:
             x_preprocessed, *aux = self.n2v_preprocess(x)
         else:
@@ -160,7 +271,7 @@ class FCNModule(L.LightningModule):
         batch_idx : Any
             Batch index.
         """
-        x, *targets = batch
+        x, *targets = self._transform_batch(batch)
         if self.use_n2v and self.n2v_preprocess is not None:
             x_preprocessed, *aux = self.n2v_preprocess(x)
         else:
@@ -12,20 +12,25 @@ from careamics.config.data import DataConfig
 from careamics.config.support import SupportedData
 from careamics.config.transformations import TransformModel
 from careamics.dataset.dataset_utils import (
-    get_files_size,
+    get_decoded_files_size,
     list_files,
     validate_source_target_files,
 )
+from careamics.dataset.hybrid_dataset import HybridIterableDataset
 from careamics.dataset.in_memory_dataset import (
     InMemoryDataset,
 )
 from careamics.dataset.iterable_dataset import (
     PathIterableDataset,
 )
+from careamics.dataset_ng.dataset import CareamicsDataset
+from careamics.dataset_ng.patch_extractor.patch_extractor_factory import (
+    create_patch_extractors,
+)
 from careamics.file_io.read import get_read_func
 from careamics.utils import get_logger, get_ram_size
 
-DatasetType = Union[InMemoryDataset, PathIterableDataset]
+DatasetType = Union[InMemoryDataset, PathIterableDataset, CareamicsDataset]
 
 logger = get_logger(__name__)
 
@@ -36,10 +41,12 @@ class TrainDataModule(L.LightningDataModule):
 
     The data module can be used with Path, str or numpy arrays. In the case of
     numpy arrays, it loads and computes all the patches in memory. For Path and str
-    inputs, it calculates the total file size and estimate whether it can fit in
-    memory. If it does not, it iterates through the files. This behaviour can be
-    deactivated by setting `use_in_memory` to False, in which case it will
-    always use the iterating dataset to train on a Path or str.
+    inputs, it estimates the total size of the decoded files from their headers and
+    whether it fits in the memory budget (`memory_budget_mb` in the data
+    configuration, by default 80% of the available RAM). If it does not, it keeps as
+    many decoded files in memory as the budget allows and iterates through the other
+    files. This behaviour can be deactivated by setting `use_in_memory` to False, in
+    which case it will always use the iterating dataset to train on a Path or str.
 
     The data can be either a folder containing images or a single file.
 
@@ -52,6 +59,9 @@ class TrainDataModule(L.LightningDataModule):
     and provide a function that returns a numpy array from a path as
     `read_source_func` parameter. The function will receive a Path object and
     an axies string as arguments, the axes being derived from the `data_config`.
+    Optionally, a function returning the shape and data type of the custom files
+    without decoding them (see `careamics.file_io.read.ImageMetadata`) can be
+    provided as `read_metadata_func`, to estimate the memory needed by the data.
 
     You can also provide a `fnmatch` and `Path.rglob` compatible expression (e.g.
     "*.czi") to filter the files extension using `extension_filter`.
@@ -85,6 +95,9 @@ class TrainDataModule(L.LightningDataModule):
         validation, by default 5. Only used if `val_data` is None.
     use_in_memory : bool, optional
         Use in memory dataset if possible, by default True.
+    read_metadata_func : Callable, optional
+        Function returning the metadata of the source data, by default None. Only
+        used for `custom` data type.
 
     Attributes
     ----------
@@ -114,6 +127,9 @@ class TrainDataModule(L.LightningDataModule):
         Function to read the source data, used if `data_type` is `custom`.
     extension_filter : str
         Filter for file extensions, used if `data_type` is `custom`.
+    read_metadata_func : Optional[Callable]
+        Function returning the metadata of the source data, used if `data_type` is
+        `custom`.
     """
 
     def __init__(
@@ -128,6 +144,7 @@ class TrainDataModule(L.LightningDataModule):
         val_percentage: float = 0.1,
         val_minimum_split: int = 5,
         use_in_memory: bool = True,
+        read_metadata_func: Optional[Callable] = None,
     ) -> None:
         """
         Constructor.
@@ -161,6 +178,9 @@ class TrainDataModule(L.LightningDataModule):
             validation, by default 5. Only used if `val_data` is None.
         use_in_memory : bool, optional
             Use in memory dataset if possible, by default True.
+        read_metadata_func : Callable, optional
+            Function returning the metadata of the source data, by default None. Only
+            used for `custom` data type.
 
         Raises
         ------
@@ -245,8 +265,8 @@ class TrainDataModule(L.LightningDataModule):
         )
 
         # validation split
-        self.val_percentage = val_percentage
-        self.val_minimum_split = val_minimum_split
+        self.val_percentage: float = val_percentage
+        self.val_minimum_split: int = val_minimum_split
 
         # read source function corresponding to the requested type
         if data_config.data_type == SupportedData.CUSTOM.value:
@@ -259,6 +279,7 @@ class TrainDataModule(L.LightningDataModule):
             self.read_source_func = get_read_func(data_config.data_type)
 
         self.extension_filter: str = extension_filter
+        self.read_metadata_func: Optional[Callable] = read_metadata_func
 
     def prepare_data(self) -> None:
         """
@@ -284,7 +305,6 @@ class TrainDataModule(L.LightningDataModule):
             self.train_files = list_files(
                 self.train_data, self.data_type, self.extension_filter
             )
-            self.train_files_size = get_files_size(self.train_files)
 
             # list validation files
             if self.val_data is not None:
@@ -301,6 +321,17 @@ class TrainDataModule(L.LightningDataModule):
                 # verify that they match the training data
                 validate_source_target_files(self.train_files, self.train_target_files)
 
+            # size of the decoded training data, in MB, read from the file headers
+            self.train_files_size = get_decoded_files_size(
+                self.train_files, self.read_metadata_func, self.data_config.axes
+            )
+            if self.train_data_target is not None:
+                self.train_files_size += get_decoded_files_size(
+                    self.train_target_files,
+                    self.read_metadata_func,
+                    self.data_config.axes,
+                )
+
             if self.val_data_target is not None:
                 self.val_target_files = list_files(
                     self.val_data_target, self.data_type, self.extension_filter
@@ -319,8 +350,11 @@ class TrainDataModule(L.LightningDataModule):
         **kwargs : Any
             Unused.
         """
+        if self.data_config.use_next_gen_dataset:
+            self._setup_next_gen()
+
         # if numpy array
-        if self.data_type == SupportedData.ARRAY:
+        elif self.data_type == SupportedData.ARRAY:
             # mypy checks
             assert isinstance(self.train_data, np.ndarray)
             if self.train_data_target is not None:
@@ -355,10 +389,16 @@ class TrainDataModule(L.LightningDataModule):
 
         # else we read files
         else:
-            # Heuristics, if the file size is smaller than 80% of the RAM,
-            # we run the training in memory, otherwise we switch to iterable dataset
+            # if the decoded files fit in the memory budget (by default 80% of the
+            # RAM), we run the training in memory, otherwise we keep as many files
+            # in memory as possible and iterate over the others
             # The switch is deactivated if use_in_memory is False
-            if self.use_in_memory and self.train_files_size < get_ram_size() * 0.8:
+            memory_budget = (
+                self.data_config.memory_budget_mb
+                if self.data_config.memory_budget_mb is not None
+                else get_ram_size() * 0.8
+            )
+            if self.use_in_memory and self.train_files_size < memory_budget:
                 # train dataset
                 self.train_dataset = InMemoryDataset(
                     data_config=self.data_config,
@@ -388,15 +428,29 @@ class TrainDataModule(L.LightningDataModule):
 
             # else if the data is too large, load file by file during training
             else:
-                # create training dataset
-                self.train_dataset = PathIterableDataset(
-                    data_config=self.data_config,
-                    src_files=self.train_files,
-                    target_files=(
-                        self.train_target_files if self.train_data_target else None
-                    ),
-                    read_source_func=self.read_source_func,
-                )
+                # create training dataset, keeping the files fitting in the memory
+                # budget in memory
+                if self.use_in_memory:
+                    self.train_dataset = HybridIterableDataset(
+                        data_config=self.data_config,
+                        src_files=self.train_files,
+                        target_files=(
+                            self.train_target_files if self.train_data_target else None
+                        ),
+                        read_source_func=self.read_source_func,
+                        memory_budget=memory_budget,
+                        read_metadata_func=self.read_metadata_func,
+                    )
+                else:
+                    self.train_dataset = PathIterableDataset(
+                        data_config=self.data_config,
+                        src_files=self.train_files,
+                        target_files=(
+                            self.train_target_files if self.train_data_target else None
+                        ),
+                        read_source_func=self.read_source_func,
+                        read_metadata_func=self.read_metadata_func,
+                    )
 
                 # create validation dataset
                 if self.val_data is not None:
@@ -408,6 +462,7 @@ class TrainDataModule(L.LightningDataModule):
                             self.val_target_files if self.val_data_target else None
                         ),
                         read_source_func=self.read_source_func,
+                        read_metadata_func=self.read_metadata_func,
                     )
                 elif len(self.train_files) <= self.val_minimum_split:
                     raise ValueError(
@@ -422,6 +477,74 @@ class TrainDataModule(L.LightningDataModule):
                         minimum_number=self.val_minimum_split,
                     )
 
+    def _setup_next_gen(self) -> None:
+        """Create the next-generation training and validation datasets.
+
+        Arrays are used in memory, while files are loaded in memory if
+        `use_in_memory` is True, and memory-mapped otherwise (if supported by the
+        data type).
+        """
+        # wrap arrays in lists, as extractors are created from sequences of sources
+        train_data: list[Any]
+        val_data: Optional[list[Any]]
+        train_target: Optional[list[Any]]
+        val_target: Optional[list[Any]]
+        extractor_kwargs: dict[str, Any] = {}
+        if self.data_type == SupportedData.ARRAY:
+            train_data = [self.train_data]
+            val_data = [self.val_data] if self.val_data is not None else None
+            train_target = (
+                [self.train_data_target] if self.train_data_target is not None else None
+            )
+            val_target = (
+                [self.val_data_target] if self.val_data_target is not None else None
+            )
+        else:
+            train_data = self.train_files
+            val_data = self.val_files if self.val_data is not None else None
+            train_target = (
+                self.train_target_files if self.train_data_target is not None else None
+            )
+            val_target = (
+                self.val_target_files if self.val_data_target is not None else None
+            )
+            if self.data_type == SupportedData.CUSTOM:
+                extractor_kwargs["read_func"] = self.read_source_func
+
+        train_extractor, val_extractor, train_target_extractor, val_target_extractor = (
+            create_patch_extractors(
+                self.data_config,
+                train_data=train_data,
+                val_data=val_data,
+                train_data_target=train_target,
+                val_data_target=val_target,
+                in_memory=self.use_in_memory,
+                **extractor_kwargs,
+            )
+        )
+
+        self.train_dataset = CareamicsDataset(
+            data_config=self.data_config,
+            input_extractor=train_extractor,
+            target_extractor=train_target_extractor,
+            seed=self.data_config.patch_seed,
+        )
+
+        if val_extractor is not None:
+            # statistics were recorded in the configuration by the training dataset
+            self.val_dataset = CareamicsDataset(
+                data_config=self.data_config,
+                input_extractor=val_extractor,
+                target_extractor=val_target_extractor,
+                seed=self.train_dataset.seed,
+            )
+        else:
+            # split by image stacks if there are enough of them, by patches otherwise
+            self.val_dataset = self.train_dataset.split_dataset(
+                percentage=self.val_percentage,
+                minimum_number=self.val_minimum_split,
+            )
+
     def get_data_statistics(self) -> tuple[list[float], list[float]]:
         """Return training data statistics.
 
@@ -448,6 +571,14 @@ class TrainDataModule(L.LightningDataModule):
         if isinstance(self.train_dataset, IterableDataset):
             del train_dataloader_params["shuffle"]
 
+        # chunk-aware patches are already in a random order of the chunks, shuffling
+        # them would break the runs of patches sharing a chunk
+        if (
+            isinstance(self.train_dataset, CareamicsDataset)
+            and self.data_config.chunk_aware_patching
+        ):
+            train_dataloader_params["shuffle"] = False
+
         return DataLoader(
             self.train_dataset,
             batch_size=self.batch_size,
@@ -486,6 +617,7 @@ def create_train_datamodule(
     val_minimum_patches: int = 5,
     dataloader_params: Optional[dict] = None,
     use_in_memory: bool = True,
+    read_metadata_func: Optional[Callable] = None,
 ) -> TrainDataModule:
     """Create a TrainDataModule.
 
@@ -501,10 +633,12 @@ def create_train_datamodule(
 
     The data module can be used with Path, str or numpy arrays. In the case of
     numpy arrays, it loads and computes all the patches in memory. For Path and str
-    inputs, it calculates the total file size and estimate whether it can fit in
-    memory. If it does not, it iterates through the files. This behaviour can be
-    deactivated by setting `use_in_memory` to False, in which case it will
-    always use the iterating dataset to train on a Path or str.
+    inputs, it estimates the total size of the decoded files from their headers and
+    whether it fits in the memory budget (`memory_budget_mb` in the data
+    configuration, by default 80% of the available RAM). If it does not, it keeps as
+    many decoded files in memory as the budget allows and iterates through the other
+    files. This behaviour can be deactivated by setting `use_in_memory` to False, in
+    which case it will always use the iterating dataset to train on a Path or str.
 
     To use array data, set `data_type` to `array` and pass a numpy array to
     `train_data`.
@@ -559,6 +693,9 @@ def create_train_datamodule(
         Pytorch dataloader parameters, by default {}.
     use_in_memory : bool, optional
         Use in memory dataset if possible, by default True.
+    read_metadata_func : Callable, optional
+        Function returning the metadata of the source data, used if `data_type` is
+        `custom`, by default None.
 
     Returns
     -------
@@ -651,4 +788,5 @@ def create_train_datamodule(
         val_percentage=val_percentage,
         val_minimum_split=val_minimum_patches,
         use_in_memory=use_in_memory,
+        read_metadata_func=read_metadata_func,
     )
@@ -2,6 +2,7 @@
 
 __all__ = [
     "Compose",
+    "ComposeTorch",
     "Denormalize",
     "ImageRestorationTTA",
     "N2VManipulate",
@@ -13,6 +14,7 @@ __all__ = [
 ]
 
 from .compose import Compose, get_all_transforms
+from .compose_torch import ComposeTorch
 from .n2v_manipulate import N2VManipulate
 from .n2v_manipulate_torch import N2VManipulateTorch
 from .normalize import Denormalize, Normalize
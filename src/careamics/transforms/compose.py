@@ -2,6 +2,7 @@
 
 from typing import Optional, Union, cast
 
+import numpy as np
 from numpy.typing import NDArray
 
 from careamics.config.transformations import NORM_AND_SPATIAL_UNION
@@ -33,6 +34,12 @@ def get_all_transforms() -> dict[str, type]:
 class Compose:
     """A class chaining transforms together.
 
+    When the transforms are spatial transforms (flips and 90 degree rotations) and at
+    most one normalization, the chain is planned ahead and applied in one go: the
+    random flips and rotations, drawn in the order of the transforms, are folded into
+    a single view of the input, which is then normalized into a newly allocated
+    array. The patch and target are therefore only copied once.
+
     Parameters
     ----------
     transform_list : list[TransformModel]
@@ -63,6 +70,68 @@ class Compose:
             all_transforms[t.name](**t.model_dump()) for t in transform_list
         ]
 
+        # plan the fused chain, normalization commutes with flips and rotations
+        normalizations = [t for t in self.transforms if isinstance(t, Normalize)]
+        self._fused = len(normalizations) <= 1 and all(
+            isinstance(t, (Normalize, XYFlip, XYRandomRotate90))
+            for t in self.transforms
+        )
+        self._normalize: Optional[Normalize] = (
+            normalizations[0] if len(normalizations) == 1 else None
+        )
+
+    def _fused_transforms(
+        self, patch: NDArray, target: Optional[NDArray]
+    ) -> tuple[Optional[NDArray], ...]:
+        """Apply the planned chain of transforms on the input data.
+
+        Parameters
+        ----------
+        patch : np.ndarray
+            Input data.
+        target : Optional[np.ndarray]
+            Target data, by default None.
+
+        Returns
+        -------
+        tuple[np.ndarray, Optional[np.ndarray]]
+            The output of the transformations.
+        """
+        # compose the flips and rotations as views of the inputs
+        transformed = False
+        for t in self.transforms:
+            if isinstance(t, XYFlip):
+                axis = t.sample_axis()
+                if axis is not None:
+                    patch = np.flip(patch, axis=axis)
+                    target = np.flip(target, axis=axis) if target is not None else None
+                    transformed = True
+            elif isinstance(t, XYRandomRotate90):
+                n_rot = t.sample_rotations()
+                if n_rot != 0:
+                    patch = np.rot90(patch, k=n_rot, axes=(-2, -1))
+                    target = (
+                        np.rot90(target, k=n_rot, axes=(-2, -1))
+                        if target is not None
+                        else None
+                    )
+                    transformed = True
+
+        # copy the views once, into the normalized arrays if there is normalization
+        params: tuple[Optional[NDArray], ...]
+        if self._normalize is not None:
+            params = self._normalize(patch, target)[:2]
+        elif transformed:
+            params = (
+                np.ascontiguousarray(patch),
+                np.ascontiguousarray(target) if target is not None else None,
+            )
+        else:
+            params = (patch, target)
+
+        # avoid None values that create problems for collating
+        return tuple(p for p in params if p is not None)
+
     def _chain_transforms(
         self, patch: NDArray, target: Optional[NDArray]
     ) -> tuple[Optional[NDArray], ...]:
@@ -137,6 +206,8 @@ class Compose:
             The output of the transformations.
         """
         # TODO: solve casting Compose.__call__ ouput
+        if self._fused:
+            return cast(tuple[NDArray, ...], self._fused_transforms(patch, target))
         return cast(tuple[NDArray, ...], self._chain_transforms(patch, target))
 
     def transform_with_additional_arrays(
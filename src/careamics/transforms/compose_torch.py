@@ -0,0 +1,272 @@
+"""Batched transforms applied on the device of the batches."""
+
+from typing import Optional
+
+import torch
+
+from careamics.config.transformations import (
+    NORM_AND_SPATIAL_UNION,
+    NormalizeModel,
+    XYFlipModel,
+    XYRandomRotate90Model,
+)
+
+
+class ComposeTorch:
+    """
+    Chain transforms on batches of patches, on the device of the batches.
+
+    This is the batched counterpart of `Compose`, for the normalization and the random
+    flips and 90 degree rotations. Each patch of the batch is flipped and rotated
+    independently, all patches being transformed at once, such that the transforms
+    can run on the training device rather than in the dataloader workers. Each random
+    transform has its own random number generator, seeded by its configuration.
+
+    Batches are expected to be of shape BC(Z)YX, and are returned as float32.
+
+    Parameters
+    ----------
+    transform_list : list of NORM_AND_SPATIAL_UNION
+        Transform models, applied in order.
+
+    Attributes
+    ----------
+    transform_list : list of NORM_AND_SPATIAL_UNION
+        Transform models, applied in order.
+    eps : float
+        Epsilon value added to the standard deviations, as in `Normalize`.
+    """
+
+    def __init__(self, transform_list: list[NORM_AND_SPATIAL_UNION]) -> None:
+        """Constructor.
+
+        Parameters
+        ----------
+        transform_list : list of NORM_AND_SPATIAL_UNION
+            Transform models, applied in order.
+        """
+        self.transform_list = transform_list
+        self.eps = 1e-6
+
+        # random number generators of each transform, created on the batch device
+        self._generators: dict[int, torch.Generator] = {}
+
+    def _get_generator(self, index: int, device: torch.device) -> torch.Generator:
+        """
+        Return the random number generator of a transform, on a device.
+
+        Parameters
+        ----------
+        index : int
+            Index of the transform.
+        device : torch.device
+            Device of the batch.
+
+        Returns
+        -------
+        torch.Generator
+            Random number generator.
+        """
+        rng = self._generators.get(index)
+        if rng is None or rng.device != device:
+            rng = torch.Generator(device=device)
+            seed = getattr(self.transform_list[index], "seed", None)
+            if seed is not None:
+                rng.manual_seed(seed)
+            else:
+                rng.seed()
+            self._generators[index] = rng
+
+        return rng
+
+    def __call__(
+        self, batch: torch.Tensor, target: Optional[torch.Tensor] = None
+    ) -> tuple[torch.Tensor, ...]:
+        """Apply the transforms to the batch and the target batch (optional).
+
+        Parameters
+        ----------
+        batch : torch.Tensor
+            Batch of patches, shape BC(Z)YX.
+        target : torch.Tensor, optional
+            Batch of targets, by default None.
+
+        Returns
+        -------
+        tuple of torch.Tensor
+            Transformed batch, and transformed target if provided.
+        """
+        batch = batch.to(torch.float32)
+        if target is not None:
+            target = target.to(torch.float32)
+
+        for i, transform in enumerate(self.transform_list):
+            if isinstance(transform, NormalizeModel):
+                batch = self._normalize(
+                    batch, transform.image_means, transform.image_stds
+                )
+                if (
+                    target is not None
+                    and transform.target_means is not None
+                    and transform.target_stds is not None
+                ):
+                    target = self._normalize(
+                        target, transform.target_means, transform.target_stds
+                    )
+                continue
+
+            rng = self._get_generator(i, batch.device)
+            if isinstance(transform, XYFlipModel):
+                batch, target = self._flip(batch, target, transform, rng)
+            elif isinstance(transform, XYRandomRotate90Model):
+                batch, target = self._rotate90(batch, target, transform, rng)
+            else:
+                raise ValueError(f"Unsupported batched transform ({transform.name}).")
+
+        if target is None:
+            return (batch,)
+        return batch, target
+
+    def _normalize(
+        self, batch: torch.Tensor, means: list[float], stds: list[float]
+    ) -> torch.Tensor:
+        """
+        Normalize each channel of a batch.
+
+        Parameters
+        ----------
+        batch : torch.Tensor
+            Batch of patches, shape BC(Z)YX.
+        means : list of float
+            Mean value per channel.
+        stds : list of float
+            Standard deviation value per channel.
+
+        Returns
+        -------
+        torch.Tensor
+            Normalized batch.
+        """
+        if len(means) != batch.shape[1]:
+            raise ValueError(
+                f"Number of means (got a list of size {len(means)}) and number of "
+                f"channels (got shape {tuple(batch.shape)} for BC(Z)YX) do not match."
+            )
+
+        stats_shape = (1, -1) + (1,) * (batch.ndim - 2)
+        mean = torch.tensor(means, dtype=batch.dtype, device=batch.device)
+        std = torch.tensor(stds, dtype=batch.dtype, device=batch.device)
+        return (batch - mean.view(stats_shape)) / (std.view(stats_shape) + self.eps)
+
+    @staticmethod
+    def _sample_mask(
+        batch: torch.Tensor, p: float, rng: torch.Generator
+    ) -> torch.Tensor:
+        """
+        Draw which patches of a batch are transformed.
+
+        Parameters
+        ----------
+        batch : torch.Tensor
+            Batch of patches, shape BC(Z)YX.
+        p : float
+            Probability of transforming a patch.
+        rng : torch.Generator
+            Random number generator.
+
+        Returns
+        -------
+        torch.Tensor
+            Boolean mask of the transformed patches, broadcastable to the batch.
+        """
+        applied = torch.rand(batch.shape[0], generator=rng, device=batch.device) < p
+        return applied.view((-1,) + (1,) * (batch.ndim - 1))
+
+    def _flip(
+        self,
+        batch: torch.Tensor,
+        target: Optional[torch.Tensor],
+        transform: XYFlipModel,
+        rng: torch.Generator,
+    ) -> tuple[torch.Tensor, Optional[torch.Tensor]]:
+        """
+        Flip each patch along one of the allowed axes, with probability `p`.
+
+        Parameters
+        ----------
+        batch : torch.Tensor
+            Batch of patches, shape BC(Z)YX.
+        target : torch.Tensor, optional
+            Batch of targets.
+        transform : XYFlipModel
+            Flip configuration.
+        rng : torch.Generator
+            Random number generator.
+
+        Returns
+        -------
+        tuple of torch.Tensor
+            Flipped batch and target.
+        """
+        axes = [
+            axis
+            for axis, allowed in zip((-2, -1), (transform.flip_y, transform.flip_x))
+            if allowed
+        ]
+        applied = self._sample_mask(batch, transform.p, rng)
+        choice = torch.randint(
+            len(axes), applied.shape, generator=rng, device=batch.device
+        )
+
+        for i, axis in enumerate(axes):
+            selected = applied & (choice == i)
+            batch = torch.where(selected, batch.flip(axis), batch)
+            if target is not None:
+                target = torch.where(selected, target.flip(axis), target)
+
+        return batch, target
+
+    def _rotate90(
+        self,
+        batch: torch.Tensor,
+        target: Optional[torch.Tensor],
+        transform: XYRandomRotate90Model,
+        rng: torch.Generator,
+    ) -> tuple[torch.Tensor, Optional[torch.Tensor]]:
+        """
+        Rotate each patch by a random multiple of 90 degrees, with probability `p`.
+
+        Parameters
+        ----------
+        batch : torch.Tensor
+            Batch of patches, shape BC(Z)YX, with square YX dimensions.
+        target : torch.Tensor, optional
+            Batch of targets.
+        transform : XYRandomRotate90Model
+            Rotation configuration.
+        rng : torch.Generator
+            Random number generator.
+
+        Returns
+        -------
+        tuple of torch.Tensor
+            Rotated batch and target.
+        """
+        if batch.shape[-1] != batch.shape[-2]:
+            raise ValueError(
+                f"Batched 90 degree rotations require square YX dimensions, got "
+                f"shape {tuple(batch.shape)}."
+            )
+
+        applied = self._sample_mask(batch, transform.p, rng)
+        n_rot = torch.randint(1, 4, applied.shape, generator=rng, device=batch.device)
+
+        for k in range(1, 4):
+            selected = applied & (n_rot == k)
+            batch = torch.where(selected, torch.rot90(batch, k, dims=(-2, -1)), batch)
+            if target is not None:
+                target = torch.where(
+                    selected, torch.rot90(target, k, dims=(-2, -1)), target
+                )
+
+        return batch, target
@@ -117,29 +117,26 @@ class N2VManipulate(Transform):
         tuple[np.ndarray, np.ndarray, np.ndarray]
             Masked patch, original patch, and mask.
         """
-        masked = np.zeros_like(patch)
-        mask = np.zeros_like(patch)
+        # all the channels are manipulated independently, in a single pass
         if self.strategy == SupportedPixelManipulation.UNIFORM:
-            # Iterate over the channels to apply manipulation separately
-            for c in range(patch.shape[0]):
-                masked[c, ...], mask[c, ...] = uniform_manipulate(
-                    patch=patch[c, ...],
-                    mask_pixel_percentage=self.masked_pixel_percentage,
-                    subpatch_size=self.roi_size,
-                    remove_center=self.remove_center,
-                    struct_params=self.struct_mask,
-                    rng=self.rng,
-                )
+            masked, mask = uniform_manipulate(
+                patch=patch,
+                mask_pixel_percentage=self.masked_pixel_percentage,
+                subpatch_size=self.roi_size,
+                remove_center=self.remove_center,
+                struct_params=self.struct_mask,
+                rng=self.rng,
+                channel_first=True,
+            )
         elif self.strategy == SupportedPixelManipulation.MEDIAN:
-            # Iterate over the channels to apply manipulation separately
-            for c in range(patch.shape[0]):
-                masked[c, ...], mask[c, ...] = median_manipulate(
-                    patch=patch[c, ...],
-                    mask_pixel_percentage=self.masked_pixel_percentage,
-                    subpatch_size=self.roi_size,
-                    struct_params=self.struct_mask,
-                    rng=self.rng,
-                )
+            masked, mask = median_manipulate(
+                patch=patch,
+                mask_pixel_percentage=self.masked_pixel_percentage,
+                subpatch_size=self.roi_size,
+                struct_params=self.struct_mask,
+                rng=self.rng,
+                channel_first=True,
+            )
         else:
             raise ValueError(f"Unknown masking strategy ({self.strategy}).")
 
@@ -147,4 +144,4 @@ class N2VManipulate(Transform):
         #     - Don't include in Compose and apply after if algorithm is N2V?
         #     - or just don't return patch? but then mask is in the target position
         # TODO why return patch?
-        return masked, patch, mask
+        return masked, patch, mask.astype(patch.dtype)
@@ -113,31 +113,30 @@ class N2VManipulateTorch:
         tuple[torch.Tensor, torch.Tensor, torch.Tensor]
             Masked patch, original patch, and mask.
         """
-        masked = torch.zeros_like(batch)
-        mask = torch.zeros_like(batch, dtype=torch.uint8)
+        # merge the batch and channel axes, so that all the channels are manipulated
+        # independently in a single pass
+        samples = batch.reshape(-1, *batch.shape[2:])
 
         if self.strategy == SupportedPixelManipulation.UNIFORM:
-            # Iterate over the channels to apply manipulation separately
-            for c in range(batch.shape[1]):
-                masked[:, c, ...], mask[:, c, ...] = uniform_manipulate_torch(
-                    patch=batch[:, c, ...],
-                    mask_pixel_percentage=self.masked_pixel_percentage,
-                    subpatch_size=self.roi_size,
-                    remove_center=self.remove_center,
-                    struct_params=self.struct_mask,
-                    rng=self.rng,
-                )
+            masked, mask = uniform_manipulate_torch(
+                patch=samples,
+                mask_pixel_percentage=self.masked_pixel_percentage,
+                subpatch_size=self.roi_size,
+                remove_center=self.remove_center,
+                struct_params=self.struct_mask,
+                rng=self.rng,
+            )
         elif self.strategy == SupportedPixelManipulation.MEDIAN:
-            # Iterate over the channels to apply manipulation separately
-            for c in range(batch.shape[1]):
-                masked[:, c, ...], mask[:, c, ...] = median_manipulate_torch(
-                    batch=batch[:, c, ...],
-                    mask_pixel_percentage=self.masked_pixel_percentage,
-                    subpatch_size=self.roi_size,
-                    struct_params=self.struct_mask,
-                    rng=self.rng,
-                )
+            masked, mask = median_manipulate_torch(
+                batch=samples,
+                mask_pixel_percentage=self.masked_pixel_percentage,
+                subpatch_size=self.roi_size,
+                struct_params=self.struct_mask,
+                rng=self.rng,
+            )
         else:
             raise ValueError(f"Unknown masking strategy ({self.strategy}).")
 
+        masked = masked.reshape(batch.shape)
+        mask = mask.reshape(batch.shape)
         return masked, batch, mask
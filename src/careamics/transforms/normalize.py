@@ -160,7 +160,11 @@ class Normalize(Transform):
         NDArray
             Normalized image patch.
         """
-        return ((patch - mean) / (std + self.eps)).astype(np.float32)
+        # normalize into a single float32 array, without intermediate arrays
+        norm_patch = np.empty(patch.shape, dtype=np.float32)
+        np.subtract(patch, mean, out=norm_patch)
+        norm_patch /= std + self.eps
+        return norm_patch
 
 
 class Denormalize:
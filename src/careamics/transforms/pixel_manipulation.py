@@ -5,6 +5,7 @@ Pixel manipulation is used in N2V and similar algorithm to replace the value of
 masked pixels.
 """
 
+from functools import lru_cache
 from typing import Optional
 
 import numpy as np
@@ -17,6 +18,7 @@ def _apply_struct_mask(
     coords: np.ndarray,
     struct_params: StructMaskParameters,
     rng: Optional[np.random.Generator] = None,
+    channel_first: bool = False,
 ) -> np.ndarray:
     """Apply structN2V masks to patch.
 
@@ -29,13 +31,17 @@ def _apply_struct_mask(
     Parameters
     ----------
     patch : np.ndarray
-        Patch to be manipulated, 2D or 3D.
+        Patch to be manipulated, 2D or 3D, with a leading channel axis if
+        `channel_first` is True.
     coords : np.ndarray
         Coordinates of the ROI(subpatch) centers.
     struct_params : StructMaskParameters
         Parameters for the structN2V mask (axis and span).
     rng : np.random.Generator or None
         Random number generator.
+    channel_first : bool, optional
+        Whether the first axis of the patch is a channel axis, in which case the random
+        values are drawn within the range of each channel, by default False.
 
     Returns
     -------
@@ -75,7 +81,15 @@ def _apply_struct_mask(
     mix = np.delete(mix, mix[:, moving_axis] > max_bound, axis=0)
 
     # replace neighbouring pixels with random values from flat dist
-    patch[tuple(mix.T)] = rng.uniform(patch.min(), patch.max(), size=mix.shape[0])
+    if channel_first:
+        spatial_axes = tuple(range(1, patch.ndim))
+        channels = mix[:, 0]
+        patch[tuple(mix.T)] = rng.uniform(
+            patch.min(axis=spatial_axes)[channels],
+            patch.max(axis=spatial_axes)[channels],
+        )
+    else:
+        patch[tuple(mix.T)] = rng.uniform(patch.min(), patch.max(), size=mix.shape[0])
 
     return patch
 
@@ -105,10 +119,58 @@ def _odd_jitter_func(step: float, rng: np.random.Generator) -> np.ndarray:
     return np.floor(step) if odd_jitter == 0 else np.ceil(step)
 
 
+@lru_cache(maxsize=32)
+def _get_stratified_grid(
+    mask_pixel_perc: float, shape: tuple[int, ...]
+) -> tuple[np.ndarray, float]:
+    """
+    Compute the regular grid from which the masked pixels are drawn.
+
+    The grid only depends on the patch shape and masking percentage, it is therefore
+    computed once and cached. The returned array is read-only.
+
+    Parameters
+    ----------
+    mask_pixel_perc : float
+        Actual (quasi) percentage of masked pixels across the whole image.
+    shape : tuple[int, ...]
+        Shape of the input patch.
+
+    Returns
+    -------
+    tuple[np.ndarray, float]
+        Grid coordinates, shape (n_points, ndim), and largest step of the grid.
+    """
+    mask_pixel_distance = np.round((100 / mask_pixel_perc) ** (1 / len(shape))).astype(
+        np.int32
+    )
+
+    # Define a grid of coordinates for each axis in the input patch and the step size
+    pixel_coords = []
+    steps = []
+    for axis_size in shape:
+        # make sure axis size is evenly divisible by box size
+        num_pixels = int(np.ceil(axis_size / mask_pixel_distance))
+        axis_pixel_coords, step = np.linspace(
+            0, axis_size, num_pixels, dtype=np.int32, endpoint=False, retstep=True
+        )
+        # explain
+        pixel_coords.append(axis_pixel_coords.T)
+        steps.append(step)
+
+    # Create a meshgrid of coordinates for each axis in the input patch
+    coordinate_grid_list = np.meshgrid(*pixel_coords)
+    coordinate_grid = np.array(coordinate_grid_list).reshape(len(shape), -1).T
+    coordinate_grid.flags.writeable = False
+
+    return coordinate_grid, float(max(steps))
+
+
 def _get_stratified_coords(
     mask_pixel_perc: float,
     shape: tuple[int, ...],
     rng: Optional[np.random.Generator] = None,
+    n_samples: Optional[int] = None,
 ) -> np.ndarray:
     """
     Generate coordinates of the pixels to mask.
@@ -116,6 +178,10 @@ def _get_stratified_coords(
     Randomly selects the coordinates of the pixels to mask in a stratified way, i.e.
     the distance between masked pixels is approximately the same.
 
+    If `n_samples` is not None, independent coordinates are drawn at once for each
+    sample (e.g. channel) of a stack of patches, and the sample index is prepended to
+    the coordinates.
+
     Parameters
     ----------
     mask_pixel_perc : float
@@ -125,6 +191,8 @@ def _get_stratified_coords(
         Shape of the input patch.
     rng : np.random.Generator or None
         Random number generator.
+    n_samples : int or None, optional
+        Number of samples, by default None.
 
     Returns
     -------
@@ -139,101 +207,121 @@ def _get_stratified_coords(
     if rng is None:
         rng = np.random.default_rng()
 
-    mask_pixel_distance = np.round((100 / mask_pixel_perc) ** (1 / len(shape))).astype(
-        np.int32
+    # Only the random jitter is drawn at each call, the grid is cached
+    coordinate_grid, max_step = _get_stratified_grid(
+        float(mask_pixel_perc), tuple(int(s) for s in shape)
     )
 
-    # Define a grid of coordinates for each axis in the input patch and the step size
-    pixel_coords = []
-    steps = []
-    for axis_size in shape:
-        # make sure axis size is evenly divisible by box size
-        num_pixels = int(np.ceil(axis_size / mask_pixel_distance))
-        axis_pixel_coords, step = np.linspace(
-            0, axis_size, num_pixels, dtype=np.int32, endpoint=False, retstep=True
-        )
-        # explain
-        pixel_coords.append(axis_pixel_coords.T)
-        steps.append(step)
-
-    # Create a meshgrid of coordinates for each axis in the input patch
-    coordinate_grid_list = np.meshgrid(*pixel_coords)
-    coordinate_grid = np.array(coordinate_grid_list).reshape(len(shape), -1).T
-
+    size = (
+        coordinate_grid.shape
+        if n_samples is None
+        else (n_samples, *coordinate_grid.shape)
+    )
     grid_random_increment = rng.integers(
-        _odd_jitter_func(float(max(steps)), rng)  # type: ignore
-        * np.ones_like(coordinate_grid).astype(np.int32)
-        - 1,
-        size=coordinate_grid.shape,
-        endpoint=True,
+        int(_odd_jitter_func(max_step, rng)) - 1, size=size, endpoint=True
+    )
+    coordinate_grid = np.clip(
+        coordinate_grid + grid_random_increment, 0, np.array(shape) - 1
+    )
+    if n_samples is None:
+        return coordinate_grid
+
+    # prepend the sample index to the coordinates of each sample
+    samples = np.broadcast_to(
+        np.arange(n_samples)[:, np.newaxis, np.newaxis],
+        (*coordinate_grid.shape[:-1], 1),
+    )
+    return np.concatenate([samples, coordinate_grid], axis=-1).reshape(
+        -1, len(shape) + 1
     )
-    coordinate_grid += grid_random_increment
-    coordinate_grid = np.clip(coordinate_grid, 0, np.array(shape) - 1)
-    return coordinate_grid
 
 
-def _create_subpatch_center_mask(
-    subpatch: np.ndarray, center_coords: np.ndarray
+def _get_subpatch_offsets(
+    subpatch_size: int,
+    ndim: int,
+    struct_params: Optional[StructMaskParameters] = None,
 ) -> np.ndarray:
-    """Create a mask with the center of the subpatch masked.
+    """Compute the offsets of the subpatch pixels used to compute the median.
+
+    The center of the subpatch is excluded, or, if `struct_params` is not None, the
+    pixels of the structN2V mask centered on it.
 
     Parameters
     ----------
-    subpatch : np.ndarray
-        Subpatch to be manipulated.
-    center_coords : np.ndarray
-        Coordinates of the original center before possible crop.
+    subpatch_size : int
+        Size of the subpatch.
+    ndim : int
+        Number of spatial dimensions.
+    struct_params : StructMaskParameters or None, optional
+        Parameters for the structN2V mask (axis and span).
 
     Returns
     -------
     np.ndarray
-        Mask with the center of the subpatch masked.
+        Offsets with respect to the subpatch center, shape (n_offsets, ndim).
     """
-    mask = np.ones(subpatch.shape)
-    mask[tuple(center_coords)] = 0
-    return np.ma.make_mask(mask)  # type: ignore
+    span = np.arange(-(subpatch_size // 2), int(np.ceil(subpatch_size / 2)))
+    offsets = np.stack(np.meshgrid(*[span] * ndim, indexing="ij"), axis=-1).reshape(
+        -1, ndim
+    )
+
+    if struct_params is None:
+        excluded = np.all(offsets == 0, axis=1)
+    else:
+        # pixels of the structN2V mask, along the moving axis through the center
+        moving_axis = ndim - 1 - struct_params.axis
+        other_axes = [i for i in range(ndim) if i != moving_axis]
+        excluded = np.all(offsets[:, other_axes] == 0, axis=1) & (
+            np.abs(offsets[:, moving_axis]) <= (struct_params.span - 1) // 2
+        )
 
+    return offsets[~excluded]
 
-def _create_subpatch_struct_mask(
-    subpatch: np.ndarray, center_coords: np.ndarray, struct_params: StructMaskParameters
+
+def _get_subpatch_medians(
+    patch: np.ndarray, centers: np.ndarray, offsets: np.ndarray
 ) -> np.ndarray:
-    """Create a structN2V mask for the subpatch.
+    """Compute the medians of the subpatches centered on each coordinate.
+
+    The subpatches of all centers are gathered at once from the patch padded with
+    infinite values, which are then ignored in the median. Only the subpatches close
+    to the borders of the patch contain padding values.
 
     Parameters
     ----------
-    subpatch : np.ndarray
-        Subpatch to be manipulated.
-    center_coords : np.ndarray
-        Coordinates of the original center before possible crop.
-    struct_params : StructMaskParameters
-        Parameters for the structN2V mask (axis and span).
+    patch : np.ndarray
+        Image patch, 2D or 3D.
+    centers : np.ndarray
+        Coordinates of the subpatch centers, shape (n_centers, ndim).
+    offsets : np.ndarray
+        Offsets of the subpatch pixels, shape (n_offsets, ndim).
 
     Returns
     -------
     np.ndarray
-        StructN2V mask for the subpatch.
+        Median of each subpatch, shape (n_centers,).
     """
-    # TODO no test for this function!
-    # Create a mask with the center of the subpatch masked
-    mask_placeholder = np.ones(subpatch.shape)
-
-    # reshape to move the struct axis to the first position
-    mask_reshaped = np.moveaxis(mask_placeholder, struct_params.axis, 0)
-
-    # create the mask index for the struct axis
-    mask_index = slice(
-        max(0, center_coords.take(struct_params.axis) - (struct_params.span - 1) // 2),
-        min(
-            1 + center_coords.take(struct_params.axis) + (struct_params.span - 1) // 2,
-            subpatch.shape[struct_params.axis],
-        ),
+    pad = np.abs(offsets).max(axis=0)
+    padded = np.pad(
+        patch.astype(np.result_type(patch.dtype, np.float32)),
+        [(p, p) for p in pad],
+        constant_values=np.inf,
     )
-    mask_reshaped[struct_params.axis][mask_index] = 0
 
-    # reshape back to the original shape
-    mask = np.moveaxis(mask_reshaped, 0, struct_params.axis)
+    # gather the subpatches using flat indices in the padded patch
+    strides = np.array(padded.strides) // padded.itemsize
+    flat_centers = (centers + pad) @ strides
+    values = padded.ravel()[flat_centers[:, np.newaxis] + offsets @ strides]
 
-    return np.ma.make_mask(mask)  # type: ignore
+    # median of the values within the patch, sorted before the padding values
+    n_valid = np.full(len(values), values.shape[1])
+    border = np.any((centers < pad) | (centers >= np.array(patch.shape) - pad), axis=1)
+    n_valid[border] = np.count_nonzero(values[border] != np.inf, axis=1)
+    values.sort(axis=1)
+    rows = np.arange(len(values))
+    lower = values[rows, np.maximum(n_valid - 1, 0) // 2]
+    upper = values[rows, n_valid // 2]
+    return np.where(n_valid > 0, (lower + upper) / 2, np.nan)
 
 
 def uniform_manipulate(
@@ -243,6 +331,7 @@ def uniform_manipulate(
     remove_center: bool = True,
     struct_params: Optional[StructMaskParameters] = None,
     rng: Optional[np.random.Generator] = None,
+    channel_first: bool = False,
 ) -> tuple[np.ndarray, np.ndarray]:
     """
     Manipulate pixels by replacing them with a neighbor values.
@@ -256,7 +345,8 @@ def uniform_manipulate(
     Parameters
     ----------
     patch : np.ndarray
-        Image patch, 2D or 3D, shape (y, x) or (z, y, x).
+        Image patch, 2D or 3D, shape (y, x) or (z, y, x), or C(Z)YX if `channel_first`
+        is True.
     mask_pixel_percentage : float
         Approximate percentage of pixels to be masked.
     subpatch_size : int
@@ -267,6 +357,9 @@ def uniform_manipulate(
         Parameters for the structN2V mask (axis and span).
     rng : np.random.Generator or None
         Random number generator.
+    channel_first : bool, optional
+        Whether the first axis of the patch is a channel axis, in which case all the
+        channels are manipulated independently in a single pass, by default False.
 
     Returns
     -------
@@ -279,7 +372,13 @@ def uniform_manipulate(
     # Get the coordinates of the pixels to be replaced
     transformed_patch = patch.copy()
 
-    subpatch_centers = _get_stratified_coords(mask_pixel_percentage, patch.shape, rng)
+    spatial_shape = patch.shape[1:] if channel_first else patch.shape
+    subpatch_centers = _get_stratified_coords(
+        mask_pixel_percentage,
+        spatial_shape,
+        rng,
+        n_samples=patch.shape[0] if channel_first else None,
+    )
 
     # Generate coordinate grid for subpatch
     roi_span_full = np.arange(
@@ -289,8 +388,12 @@ def uniform_manipulate(
     # Remove the center pixel from the grid if needed
     roi_span = roi_span_full[roi_span_full != 0] if remove_center else roi_span_full
 
-    # Randomly select coordinates from the grid
-    random_increment = rng.choice(roi_span, size=subpatch_centers.shape)
+    # Randomly select coordinates from the grid, within the same channel
+    random_increment = rng.choice(
+        roi_span, size=(len(subpatch_centers), len(spatial_shape))
+    )
+    if channel_first:
+        random_increment = np.pad(random_increment, ((0, 0), (1, 0)))
 
     # Clip the coordinates to the patch size
     replacement_coords = np.clip(
@@ -308,7 +411,7 @@ def uniform_manipulate(
 
     if struct_params is not None:
         transformed_patch = _apply_struct_mask(
-            transformed_patch, subpatch_centers, struct_params
+            transformed_patch, subpatch_centers, struct_params, rng, channel_first
         )
 
     return (
@@ -323,6 +426,7 @@ def median_manipulate(
     subpatch_size: int = 11,
     struct_params: Optional[StructMaskParameters] = None,
     rng: Optional[np.random.Generator] = None,
+    channel_first: bool = False,
 ) -> tuple[np.ndarray, np.ndarray]:
     """
     Manipulate pixels by replacing them with the median of their surrounding subpatch.
@@ -337,7 +441,8 @@ def median_manipulate(
     Parameters
     ----------
     patch : np.ndarray
-        Image patch, 2D or 3D, shape (y, x) or (z, y, x).
+        Image patch, 2D or 3D, shape (y, x) or (z, y, x), or C(Z)YX if `channel_first`
+        is True.
     mask_pixel_percentage : floar
         Approximate percentage of pixels to be masked.
     subpatch_size : int
@@ -346,6 +451,9 @@ def median_manipulate(
         Parameters for the structN2V mask (axis and span).
     rng : np.random.Generator or None, optional
         Random number generato, by default None.
+    channel_first : bool, optional
+        Whether the first axis of the patch is a channel axis, in which case all the
+        channels are manipulated independently in a single pass, by default False.
 
     Returns
     -------
@@ -358,48 +466,27 @@ def median_manipulate(
     transformed_patch = patch.copy()
 
     # Get the coordinates of the pixels to be replaced
-    subpatch_centers = _get_stratified_coords(mask_pixel_percentage, patch.shape, rng)
-
-    # Generate coordinate grid for subpatch
-    roi_span = np.array(
-        [-np.floor(subpatch_size / 2), np.ceil(subpatch_size / 2)]
-    ).astype(np.int32)
-
-    subpatch_crops_span_full = subpatch_centers[np.newaxis, ...].T + roi_span
-
-    # Dimensions n dims, n centers, (min, max)
-    subpatch_crops_span_clipped = np.clip(
-        subpatch_crops_span_full,
-        a_min=np.zeros_like(patch.shape)[:, np.newaxis, np.newaxis],
-        a_max=np.array(patch.shape)[:, np.newaxis, np.newaxis],
+    spatial_shape = patch.shape[1:] if channel_first else patch.shape
+    subpatch_centers = _get_stratified_coords(
+        mask_pixel_percentage,
+        spatial_shape,
+        rng,
+        n_samples=patch.shape[0] if channel_first else None,
     )
 
-    for idx in range(subpatch_crops_span_clipped.shape[1]):
-        subpatch_coords = subpatch_crops_span_clipped[:, idx, ...]
-        idxs = [
-            slice(x[0], x[1]) if x[1] - x[0] > 0 else slice(0, 1)
-            for x in subpatch_coords
-        ]
-        subpatch = patch[tuple(idxs)]
-        subpatch_center_adjusted = subpatch_centers[idx] - subpatch_coords[:, 0]
-
-        if struct_params is None:
-            subpatch_mask = _create_subpatch_center_mask(
-                subpatch, subpatch_center_adjusted
-            )
-        else:
-            subpatch_mask = _create_subpatch_struct_mask(
-                subpatch, subpatch_center_adjusted, struct_params
-            )
-        transformed_patch[tuple(subpatch_centers[idx])] = np.median(
-            subpatch[subpatch_mask]
-        )
+    # Replace the pixels with the median of their subpatch, computed in one go
+    offsets = _get_subpatch_offsets(subpatch_size, len(spatial_shape), struct_params)
+    if channel_first:
+        offsets = np.pad(offsets, ((0, 0), (1, 0)))
+    transformed_patch[tuple(subpatch_centers.T)] = _get_subpatch_medians(
+        patch, subpatch_centers, offsets
+    )
 
-    mask = np.where(transformed_patch != patch, 1, 0).astype(np.uint8)
+    mask = (transformed_patch != patch).astype(np.uint8)
 
     if struct_params is not None:
         transformed_patch = _apply_struct_mask(
-            transformed_patch, subpatch_centers, struct_params
+            transformed_patch, subpatch_centers, struct_params, rng, channel_first
         )
 
     return (
@@ -1,8 +1,10 @@
 """N2V manipulation functions for PyTorch."""
 
+from functools import lru_cache
 from typing import Optional
 
 import torch
+import torch.nn.functional as F
 
 from .struct_mask_parameters import StructMaskParameters
 
@@ -20,6 +22,7 @@ def _apply_struct_mask_torch(
     by a random value.
 
     Note that the structN2V mask is applied in 2D at the coordinates given by `coords`.
+    The random values are drawn within the range of each sample of the batch.
 
     Parameters
     ----------
@@ -67,10 +70,14 @@ def _apply_struct_mask_torch(
     mix = mix[valid_indices]
 
     # Replace neighboring pixels with random values from a uniform distribution
-    random_values = torch.empty(len(mix), device=patch.device).uniform_(
-        patch.min().item(), patch.max().item(), generator=rng
+    # within the range of their sample, drawn for all the pixels at once
+    spatial_dims = tuple(range(1, patch.ndim))
+    sample_min = patch.amin(dim=spatial_dims)[mix[:, 0]]
+    sample_max = patch.amax(dim=spatial_dims)[mix[:, 0]]
+    random_values = sample_min + (sample_max - sample_min) * torch.rand(
+        len(mix), generator=rng, device=patch.device, dtype=sample_min.dtype
     )
-    patch[tuple(mix.T.tolist())] = random_values
+    patch[tuple(mix.T)] = random_values
 
     return patch
 
@@ -102,36 +109,32 @@ def _odd_jitter_func_torch(step: float, rng: torch.Generator) -> torch.Tensor:
     return step_floor if odd_jitter == 0 else step_floor + 1
 
 
-def _get_stratified_coords_torch(
-    mask_pixel_perc: float,
-    shape: tuple[int, ...],
-    rng: Optional[torch.Generator] = None,
-) -> torch.Tensor:
+@lru_cache(maxsize=32)
+def _get_stratified_grid_torch(
+    mask_pixel_perc: float, shape: tuple[int, ...], device: torch.device
+) -> tuple[torch.Tensor, int, torch.Tensor]:
     """
-    Generate coordinates of the pixels to mask.
+    Compute the regular grid from which the masked pixels are drawn.
 
-    # TODO add more details
-    Randomly selects the coordinates of the pixels to mask in a stratified way, i.e.
-    the distance between masked pixels is approximately the same.
+    The grid only depends on the patch shape, the masking percentage and the device,
+    it is therefore computed once and cached. The returned tensors must not be
+    modified in place.
 
     Parameters
     ----------
     mask_pixel_perc : float
-        Actual (quasi) percentage of masked pixels across the whole image. Used in
-        calculating the distance between masked pixels across each axis.
+        Actual (quasi) percentage of masked pixels across the whole image.
     shape : tuple[int, ...]
         Shape of the input patch.
-    rng : torch.Generator or None
-        Random number generator.
+    device : torch.device
+        Device of the grid.
 
     Returns
     -------
-    np.ndarray
-        Array of coordinates of the masked pixels.
+    tuple[torch.Tensor, int, torch.Tensor]
+        Grid coordinates, shape (n_points, ndim), largest step of the grid and largest
+        valid coordinates.
     """
-    if rng is None:
-        rng = torch.Generator()
-
     # Calculate the maximum distance between masked pixels. Inversely proportional to
     # the percentage of masked pixels.
     mask_pixel_distance = round((100 / mask_pixel_perc) ** (1 / len(shape)))
@@ -154,7 +157,7 @@ def _get_stratified_coords_torch(
 
         # calculate the step size between coordinates
         step = (
-            axis_pixel_coords[1] - axis_pixel_coords[0]
+            int(axis_pixel_coords[1] - axis_pixel_coords[0])
             if len(axis_pixel_coords) > 1
             else axis_size
         )
@@ -166,23 +169,57 @@ def _get_stratified_coords_torch(
     coordinate_grid_list = torch.meshgrid(*pixel_coords, indexing="ij")
     coordinate_grid = torch.stack(
         [g.flatten() for g in coordinate_grid_list], dim=-1
-    ).to(rng.device)
+    ).to(device)
+
+    max_coords = torch.tensor([v - 1 for v in shape], device=device)
+    return coordinate_grid, max(steps), max_coords
+
+
+def _get_stratified_coords_torch(
+    mask_pixel_perc: float,
+    shape: tuple[int, ...],
+    rng: Optional[torch.Generator] = None,
+) -> torch.Tensor:
+    """
+    Generate coordinates of the pixels to mask.
+
+    # TODO add more details
+    Randomly selects the coordinates of the pixels to mask in a stratified way, i.e.
+    the distance between masked pixels is approximately the same.
+
+    Parameters
+    ----------
+    mask_pixel_perc : float
+        Actual (quasi) percentage of masked pixels across the whole image. Used in
+        calculating the distance between masked pixels across each axis.
+    shape : tuple[int, ...]
+        Shape of the input patch.
+    rng : torch.Generator or None
+        Random number generator.
+
+    Returns
+    -------
+    np.ndarray
+        Array of coordinates of the masked pixels.
+    """
+    if rng is None:
+        rng = torch.Generator()
+
+    # Only the random jitter is drawn at each call, the grid is cached
+    coordinate_grid, max_step, max_coords = _get_stratified_grid_torch(
+        float(mask_pixel_perc), tuple(int(v) for v in shape), rng.device
+    )
 
     # add a random jitter increment so that the coordinates do not lie on the grid
     random_increment = torch.randint(
-        high=int(_odd_jitter_func_torch(float(max(steps)), rng)),
-        size=torch.tensor(coordinate_grid.shape).to(rng.device).tolist(),
+        high=int(_odd_jitter_func_torch(float(max_step), rng)),
+        size=coordinate_grid.shape,
         generator=rng,
         device=rng.device,
     )
-    coordinate_grid += random_increment
 
     # make sure no coordinate lie outside the range
-    return torch.clamp(
-        coordinate_grid,
-        torch.zeros_like(torch.tensor(shape)).to(device=rng.device),
-        torch.tensor([v - 1 for v in shape]).to(device=rng.device),
-    )
+    return torch.minimum((coordinate_grid + random_increment).clamp(min=0), max_coords)
 
 
 def uniform_manipulate_torch(
@@ -207,7 +244,8 @@ def uniform_manipulate_torch(
     Parameters
     ----------
     patch : torch.Tensor
-        Image patch, 2D or 3D, shape (y, x) or (z, y, x). # TODO batch and channel.
+        Batch of image patches, 2D or 3D, shape (batch, y, x) or (batch, z, y, x). The
+        batch axis can merge the batch and channel axes.
     mask_pixel_percentage : float
         Approximate percentage of pixels to be masked.
     subpatch_size : int
@@ -261,6 +299,9 @@ def uniform_manipulate_torch(
         )
     ]
 
+    # the replacement pixels are taken from the same batch sample
+    random_increment[:, 0] = 0
+
     # compute the replacement pixel coordinates
     replacement_coords = torch.clamp(
         subpatch_centers + random_increment,
@@ -285,6 +326,52 @@ def uniform_manipulate_torch(
     return transformed_patch, mask
 
 
+def _get_subpatch_offsets_torch(
+    subpatch_size: int,
+    ndim: int,
+    struct_params: Optional[StructMaskParameters] = None,
+    device: Optional[torch.device] = None,
+) -> torch.Tensor:
+    """Compute the offsets of the ROI pixels used to compute the median.
+
+    The center of the ROI is excluded, or, if `struct_params` is not None, the pixels
+    of the structN2V mask centered on it.
+
+    Parameters
+    ----------
+    subpatch_size : int
+        Size of the ROI.
+    ndim : int
+        Number of spatial dimensions.
+    struct_params : StructMaskParameters or None, optional
+        Parameters for the structN2V mask (axis and span).
+    device : torch.device, optional
+        Device of the offsets.
+
+    Returns
+    -------
+    torch.Tensor
+        Offsets with respect to the ROI center, shape (num_offsets, ndim).
+    """
+    pad_value = subpatch_size // 2
+    span = torch.arange(-pad_value, pad_value + 1, device=device)
+    offsets = torch.stack(torch.meshgrid([span] * ndim, indexing="ij"), dim=-1).reshape(
+        -1, ndim
+    )
+
+    if struct_params is None:
+        excluded = (offsets == 0).all(dim=1)
+    else:
+        # pixels of the structN2V mask, along the moving axis through the center
+        moving_axis = ndim - 1 - struct_params.axis
+        other_axes = [i for i in range(ndim) if i != moving_axis]
+        excluded = (offsets[:, other_axes] == 0).all(dim=1) & (
+            offsets[:, moving_axis].abs() <= (struct_params.span - 1) // 2
+        )
+
+    return offsets[~excluded]
+
+
 def median_manipulate_torch(
     batch: torch.Tensor,
     mask_pixel_percentage: float,
@@ -305,7 +392,8 @@ def median_manipulate_torch(
     Parameters
     ----------
     batch : torch.Tensor
-        Image patch, 2D or 3D, shape (y, x) or (z, y, x).
+        Batch of image patches, 2D or 3D, shape (batch, y, x) or (batch, z, y, x). The
+        batch axis can merge the batch and channel axes.
     mask_pixel_percentage : float
         Approximate percentage of pixels to be masked.
     subpatch_size : int
@@ -327,92 +415,45 @@ def median_manipulate_torch(
         device=batch.device
     )  # (num_coordinates, batch + num_spatial_dims)
 
-    # Calculate the padding value for the input tensor
-    pad_value = subpatch_size // 2
+    # Offsets of the ROI pixels, excluding the center or the structN2V mask
+    offsets = _get_subpatch_offsets_torch(
+        subpatch_size, batch.ndim - 1, struct_params, device=batch.device
+    )  # (num_offsets, num_spatial_dims)
 
-    # Generate all offsets for the ROIs. Iteration starting from 1 to skip the batch
-    offsets = torch.meshgrid(
-        [
-            torch.arange(-pad_value, pad_value + 1, device=batch.device)
-            for _ in range(1, subpatch_center_coordinates.shape[1])
-        ],
-        indexing="ij",
+    # Pad the spatial dimensions with NaNs, which are ignored in the medians
+    pad_value = subpatch_size // 2
+    padded = F.pad(
+        batch if batch.is_floating_point() else batch.float(),
+        [pad_value] * 2 * (batch.ndim - 1),
+        value=float("nan"),
     )
-    offsets = torch.stack(
-        [axis_offset.flatten() for axis_offset in offsets], dim=1
-    )  # (subpatch_size**2, num_spatial_dims)
-
-    # Create the list to assemble coordinates of the ROIs centers for each axis
-    coords_axes = []
-    # Create the list to assemble the span of coordinates defining the ROIs for each
-    # axis
-    coords_expands = []
-    for d in range(subpatch_center_coordinates.shape[1]):
-        coords_axes.append(subpatch_center_coordinates[:, d])
-        if d == 0:
-            # For batch dimension coordinates are not expanded (no offsets)
-            coords_expands.append(
-                subpatch_center_coordinates[:, d]
-                .unsqueeze(1)
-                .expand(-1, subpatch_size ** offsets.shape[1])
-            )  # (num_coordinates, subpatch_size**num_spacial_dims)
-        else:
-            # For spatial dimensions, coordinates are expanded with offsets, creating
-            # spans
-            coords_expands.append(
-                (
-                    subpatch_center_coordinates[:, d].unsqueeze(1) + offsets[:, d - 1]
-                ).clamp(0, batch.shape[d] - 1)
-            )  # (num_coordinates, subpatch_size**num_spacial_dims)
-
-    # create array of rois by indexing the batch with gathered coordinates
-    rois = batch[
-        tuple(coords_expands)
-    ]  # (num_coordinates, subpatch_size**num_spacial_dims)
-
-    if struct_params is not None:
-        # Create the structN2V mask
-        h, w = torch.meshgrid(
-            torch.arange(subpatch_size), torch.arange(subpatch_size), indexing="ij"
-        )
-        center_idx = subpatch_size // 2
-        halfspan = (struct_params.span - 1) // 2
-
-        # Determine the axis along which to apply the mask
-        if struct_params.axis == 0:
-            center_axis = h
-            span_axis = w
-        else:
-            center_axis = w
-            span_axis = h
-
-        # Create the mask
-        struct_mask = (
-            ~(
-                (center_axis == center_idx)
-                & (span_axis >= center_idx - halfspan)
-                & (span_axis <= center_idx + halfspan)
-            )
-        ).flatten()
-        rois_filtered = rois[:, struct_mask]
-    else:
-        # Remove the center pixel value from the rois
-        center_idx = (subpatch_size ** offsets.shape[1]) // 2
-        rois_filtered = torch.cat(
-            [rois[:, :center_idx], rois[:, center_idx + 1 :]], dim=1
-        )
 
-    # compute the medians.
-    medians = rois_filtered.median(dim=1).values  # (num_coordinates,)
+    # Gather all the ROIs at once using flat indices in the padded batch, in 32 bits
+    # if possible, which halves the size of the (num_coordinates, num_offsets) indices
+    index_dtype = torch.int32 if padded.numel() < 2**31 else torch.int64
+    strides = torch.tensor(padded.stride(), device=batch.device)
+    padded_centers = subpatch_center_coordinates.clone()
+    padded_centers[:, 1:] += pad_value
+    flat_centers = (padded_centers * strides).sum(dim=1).to(index_dtype)
+    flat_offsets = (offsets * strides[1:]).sum(dim=1).to(index_dtype)
+    flat_indices = flat_centers.unsqueeze(1) + flat_offsets.unsqueeze(0)
+    rois = (
+        padded.flatten()
+        .index_select(0, flat_indices.flatten())
+        .view(flat_indices.shape)
+    )  # (num_coordinates, num_offsets)
+
+    # compute the medians of the values within the batch
+    medians = rois.nanmedian(dim=1).values  # (num_coordinates,)
 
     # Update the output tensor with medians
     output_batch = batch.clone()
-    output_batch[tuple(coords_axes)] = medians
-    mask = torch.where(output_batch != batch, 1, 0).to(torch.uint8)
+    output_batch[tuple(subpatch_center_coordinates.T)] = medians.to(batch.dtype)
+    mask = (output_batch != batch).to(torch.uint8)
 
     if struct_params is not None:
         output_batch = _apply_struct_mask_torch(
-            output_batch, subpatch_center_coordinates, struct_params
+            output_batch, subpatch_center_coordinates, struct_params, rng
         )
 
     return output_batch, mask
@@ -101,12 +101,10 @@ class XYFlip(Transform):
         Tuple[np.ndarray, Optional[np.ndarray]]
             Transformed patch and target.
         """
-        if self.rng.random() > self.p:
+        axis = self.sample_axis()
+        if axis is None:
             return patch, target, additional_arrays
 
-        # choose an axis to flip
-        axis = self.rng.choice(self.axis_indices)
-
         patch_transformed = self._apply(patch, axis)
         target_transformed = self._apply(target, axis) if target is not None else None
         additional_transformed = {
@@ -115,6 +113,20 @@ class XYFlip(Transform):
 
         return patch_transformed, target_transformed, additional_transformed
 
+    def sample_axis(self) -> Optional[int]:
+        """Draw whether the transform is applied, and the axis to flip.
+
+        Returns
+        -------
+        int or None
+            Axis to flip, or None if the transform is not applied.
+        """
+        if self.rng.random() > self.p:
+            return None
+
+        # choose an axis to flip
+        return int(self.rng.choice(self.axis_indices))
+
     def _apply(self, patch: NDArray, axis: int) -> NDArray:
         """Apply the transform to the image.
 
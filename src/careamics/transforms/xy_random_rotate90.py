@@ -72,12 +72,10 @@ class XYRandomRotate90(Transform):
         tuple[np.ndarray, Optional[np.ndarray]]
             Transformed patch and target.
         """
-        if self.rng.random() > self.p:
+        n_rot = self.sample_rotations()
+        if n_rot == 0:
             return patch, target, additional_arrays
 
-        # number of rotations
-        n_rot = self.rng.integers(1, 4)
-
         axes = (-2, -1)
         patch_transformed = self._apply(patch, n_rot, axes)
         target_transformed = (
@@ -90,6 +88,20 @@ class XYRandomRotate90(Transform):
 
         return patch_transformed, target_transformed, additional_transformed
 
+    def sample_rotations(self) -> int:
+        """Draw whether the transform is applied, and the number of rotations.
+
+        Returns
+        -------
+        int
+            Number of 90 degree rotations, 0 if the transform is not applied.
+        """
+        if self.rng.random() > self.p:
+            return 0
+
+        # number of rotations
+        return int(self.rng.integers(1, 4))
+
     def _apply(self, patch: NDArray, n_rot: int, axes: tuple[int, int]) -> NDArray:
         """Apply the transform to the image.
 
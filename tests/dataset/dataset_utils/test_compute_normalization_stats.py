@@ -1,7 +1,10 @@
 import numpy as np
 import pytest
 
-from careamics.dataset.dataset_utils.running_stats import compute_normalization_stats
+from careamics.dataset.dataset_utils.running_stats import (
+    WelfordStatistics,
+    compute_normalization_stats,
+)
 
 
 @pytest.mark.parametrize("samples, channels", [[1, 2], [1, 2]])
@@ -26,3 +29,36 @@ def test_compute_normalization_stats(samples, channels):
     for ch in range(array.shape[1]):
         assert np.isclose(mean[ch], array[:, ch, ...].mean())
         assert np.isclose(std[ch], array[:, ch, ...].std())
+
+
+def test_merge_welford_statistics():
+    """Test that merging the statistics of arrays of different shapes yields the
+    statistics of all the pixels."""
+    rng = np.random.default_rng(42)
+    arrays = [rng.normal(i, i + 1, (i + 1, 3, 16 * (i + 1), 16)) for i in range(4)]
+
+    stats = WelfordStatistics()
+    for array in arrays:
+        stats.merge(WelfordStatistics.from_array(array))
+    mean, std = stats.finalize()
+
+    pixels = np.concatenate(
+        [np.moveaxis(array, 1, 0).reshape(3, -1) for array in arrays], axis=1
+    )
+    assert np.allclose(mean, pixels.mean(axis=1))
+    assert np.allclose(std, pixels.std(axis=1))
+
+
+def test_welford_statistics_from_array_blocks(monkeypatch):
+    """Test that accumulating the statistics over blocks of pixels yields the
+    statistics of the whole array."""
+    from careamics.dataset.dataset_utils import running_stats
+
+    monkeypatch.setattr(running_stats, "STATISTICS_BLOCK_SIZE", 100)
+    rng = np.random.default_rng(42)
+    array = rng.normal(5, 2, (3, 2, 32, 32)).astype(np.float32)
+
+    mean, std = WelfordStatistics.from_array(array).finalize()
+
+    assert np.allclose(mean, array.mean(axis=(0, 2, 3), dtype=np.float64))
+    assert np.allclose(std, array.std(axis=(0, 2, 3), dtype=np.float64))
@@ -0,0 +1,246 @@
+import numpy as np
+import pytest
+import tifffile
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.utils.data import DataLoader
+
+from careamics.config import DataConfig, InferenceConfig
+from careamics.dataset import (
+    IterablePredDataset,
+    IterableTiledPredDataset,
+    PathIterableDataset,
+)
+from careamics.dataset.dataset_utils.iterate_over_files import (
+    balance_files,
+    get_worker_shard,
+    iterate_over_files,
+    shard_across_ranks,
+)
+
+
+def test_balance_files():
+    """Test that files are balanced across workers by size."""
+    sizes = [100, 1, 1, 1, 1, 50, 50]
+    assignment = balance_files(sizes, num_workers=2)
+
+    assert sorted(i for files in assignment for i in files) == list(range(len(sizes)))
+    loads = [sum(sizes[i] for i in files) for files in assignment]
+    assert max(loads) - min(loads) <= 2
+
+    # files of equal size are distributed as with a round-robin
+    assert balance_files([1] * 5, num_workers=2) == [[0, 2, 4], [1, 3]]
+
+
+@pytest.mark.parametrize("num_workers", [1, 2, 3])
+def test_get_worker_shard(tmp_path, num_workers):
+    """Test that every file is assigned to exactly one worker."""
+    files = []
+    for i in range(5):
+        file = tmp_path / f"array{i}.tif"
+        tifffile.imwrite(file, np.zeros((8 * (i + 1), 8), dtype=np.uint8))
+        files.append(file)
+
+    shards = [
+        get_worker_shard(files, worker_id, num_workers, split_samples=True)
+        for worker_id in range(num_workers)
+    ]
+    assigned = sorted(i for shard in shards for i, _ in shard)
+    assert assigned == list(range(len(files)))
+
+
+def test_get_worker_shard_split_samples(tmp_path):
+    """Test that samples are split between workers if there are fewer files."""
+    files = [tmp_path / "array0.tif", tmp_path / "array1.tif"]
+    n_samples = 7
+    num_workers = 5
+
+    samples = {0: [], 1: []}
+    for worker_id in range(num_workers):
+        shard = get_worker_shard(files, worker_id, num_workers, split_samples=True)
+        assert len(shard) == 1
+        file_idx, sample_slice = shard[0]
+        samples[file_idx].extend(range(n_samples)[sample_slice])
+
+    assert sorted(samples[0]) == list(range(n_samples))
+    assert sorted(samples[1]) == list(range(n_samples))
+
+    # without splitting, some workers are idle
+    shards = [
+        get_worker_shard(files, worker_id, num_workers, split_samples=False)
+        for worker_id in range(num_workers)
+    ]
+    assert sum(len(shard) for shard in shards) == len(files)
+
+
+@pytest.mark.parametrize("axes, shape", [("SYX", (7, 8, 8)), ("TCYX", (7, 2, 8, 8))])
+def test_iterate_over_files_split_samples_pages(monkeypatch, tmp_path, axes, shape):
+    """Test that workers sharing a tiff file only decode the pages of their
+    samples."""
+    from torch.utils.data import _utils
+
+    array = np.arange(np.prod(shape), dtype=np.uint16).reshape(shape)
+    file = tmp_path / "array.tif"
+    tifffile.imwrite(file, array)
+    expected = array if "C" in axes else array[:, np.newaxis]
+
+    keys = []
+    imread = tifffile.imread
+
+    def _imread(*args, **kwargs):
+        keys.append(kwargs.get("key"))
+        return imread(*args, **kwargs)
+
+    monkeypatch.setattr(tifffile, "imread", _imread)
+
+    config = DataConfig(data_type="tiff", patch_size=(8, 8), axes=axes)
+    num_workers = 3
+    n_pages = []
+    samples = []
+    for worker_id in range(num_workers):
+        keys.clear()
+        monkeypatch.setattr(
+            _utils.worker,
+            "_worker_info",
+            _utils.worker.WorkerInfo(
+                id=worker_id, num_workers=num_workers, seed=0, dataset=None
+            ),
+        )
+        ((sample, _),) = list(iterate_over_files(config, [file], split_samples=True))
+        assert np.array_equal(sample, expected[worker_id::num_workers])
+        n_pages.append(sum(len(key) for key in keys))
+        samples.append(len(sample))
+
+    # every page is decoded once, by the worker of its sample
+    assert sum(samples) == shape[0]
+    assert sum(n_pages) == int(np.prod(shape[:-2]))
+
+
+@pytest.mark.parametrize(
+    "sizes, world_size, expected",
+    [
+        ([1, 1, 1, 1], 2, [[0, 2], [1, 3]]),
+        ([64, 16, 4], 2, [[0], [1, 2]]),
+        ([4], 2, [[0], [0]]),
+    ],
+)
+def test_shard_across_ranks(sizes, world_size, expected):
+    """Test that files are balanced across ranks by size."""
+    shards = [shard_across_ranks(sizes, rank, world_size) for rank in range(world_size)]
+    assert shards == expected
+
+
+@pytest.mark.parametrize(
+    "sizes, world_size, expected",
+    [
+        ([1, 1, 1, 1], 2, [[0, 2], [1, 3]]),
+        ([4], 2, [[0], []]),
+        ([4, 2], 3, [[0], [1], []]),
+    ],
+)
+def test_shard_across_ranks_no_repeat(sizes, world_size, expected):
+    """Test that files are assigned to a single rank if they are not repeated."""
+    shards = [
+        shard_across_ranks(sizes, rank, world_size, repeat=False)
+        for rank in range(world_size)
+    ]
+    assert shards == expected
+
+
+def _iterate_distributed(rank, world_size, init_file, files, output_dir):
+    """Iterate over the datasets in a gloo process group and record the patches."""
+    dist.init_process_group(
+        "gloo", init_method=f"file://{init_file}", rank=rank, world_size=world_size
+    )
+    try:
+        config = DataConfig(
+            data_type="tiff",
+            patch_size=(8, 8),
+            axes="YX",
+            image_means=[0],
+            image_stds=[1],
+        )
+        dataset = PathIterableDataset(config, files)
+        values = [round(float(patch[0][0, 0, 0])) for patch in dataset]
+
+        # the rank is not available in the workers, but recorded in the dataset
+        dataloader = DataLoader(
+            dataset, batch_size=5, num_workers=2, multiprocessing_context="fork"
+        )
+        n_batches = len(list(dataloader))
+
+        pred_config = InferenceConfig(
+            data_type="tiff", axes="YX", image_means=[0], image_stds=[1]
+        )
+        pred_dataset = IterablePredDataset(pred_config, files)
+        pred_values = [round(float(patch[0][0, 0, 0])) for patch in pred_dataset]
+
+        tiled_config = InferenceConfig(
+            data_type="tiff",
+            axes="YX",
+            image_means=[0],
+            image_stds=[1],
+            tile_size=(16, 16),
+            tile_overlap=(8, 8),
+        )
+        tiled_dataset = IterableTiledPredDataset(tiled_config, files)
+        tiled_values = [
+            round(float(tile[0][0, 0, 0]))
+            for tile, tile_info in tiled_dataset
+            if tile_info.last_tile
+        ]
+
+        np.save(output_dir / f"rank_{rank}.npy", np.array(values))
+        np.save(output_dir / f"rank_{rank}_batches.npy", np.array(n_batches))
+        np.save(output_dir / f"rank_{rank}_pred.npy", np.array(pred_values))
+        np.save(output_dir / f"rank_{rank}_tiled.npy", np.array(tiled_values))
+        np.save(
+            output_dir / f"rank_{rank}_indices.npy", np.array(pred_dataset.file_indices)
+        )
+    finally:
+        dist.destroy_process_group()
+
+
+def test_iterate_over_files_distributed(tmp_path):
+    """Test that ranks yield the same number of patches and batches from files of
+    different sizes, and that prediction datasets predict each file exactly once."""
+    files = []
+    for i, size in enumerate([64, 32, 16]):
+        file = tmp_path / f"array{i}.tif"
+        tifffile.imwrite(file, np.full((size, size), i, dtype=np.uint8))
+        files.append(file)
+
+    world_size = 2
+    mp.spawn(
+        _iterate_distributed,
+        args=(world_size, tmp_path / "init", files, tmp_path),
+        nprocs=world_size,
+    )
+
+    rank_values = [
+        np.load(tmp_path / f"rank_{rank}.npy").tolist() for rank in range(world_size)
+    ]
+    # the largest file (64 patches) goes to the first rank, the second rank repeats
+    # the patches of the two other files (16 and 4 patches)
+    assert [len(values) for values in rank_values] == [64, 64]
+    assert set(rank_values[0]) == {0}
+    assert set(rank_values[1]) == {1, 2}
+
+    # 2 workers of 32 patches, in batches of 5
+    rank_batches = [
+        int(np.load(tmp_path / f"rank_{rank}_batches.npy"))
+        for rank in range(world_size)
+    ]
+    assert rank_batches == [14, 14]
+
+    # each file is predicted by a single rank, the pixel values being the file
+    # indices, and the predictions can be put back in order
+    pred_files = []
+    for rank in range(world_size):
+        file_indices = np.load(tmp_path / f"rank_{rank}_indices.npy").tolist()
+        pred_values = np.load(tmp_path / f"rank_{rank}_pred.npy").tolist()
+        tiled_values = np.load(tmp_path / f"rank_{rank}_tiled.npy").tolist()
+        assert pred_values == file_indices
+        assert tiled_values == file_indices
+        pred_files.extend(file_indices)
+    assert sorted(pred_files) == [0, 1, 2]
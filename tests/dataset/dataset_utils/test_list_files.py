@@ -6,10 +6,68 @@ import tifffile
 
 from careamics.config.support import SupportedData
 from careamics.dataset.dataset_utils import (
+    get_decoded_files_size,
+    get_decoded_size,
     get_files_size,
+    get_number_of_patches,
     list_files,
     validate_source_target_files,
 )
+from careamics.file_io.read import ImageMetadata
+
+
+def test_get_decoded_size_compressed_tiff(tmp_path: Path):
+    """Test that the decoded size of a compressed TIFF is read from its header."""
+    image = np.zeros((64, 64), dtype=np.uint16)
+    file = tmp_path / "image.tif"
+    tifffile.imwrite(file, image, compression="zlib")
+
+    # compressed file is much smaller than the decoded data
+    assert file.stat().st_size < image.nbytes
+    assert get_decoded_size(file) == image.nbytes / 1024**2
+    assert get_decoded_files_size([file, file]) == 2 * image.nbytes / 1024**2
+
+
+def test_get_decoded_size_other_files(tmp_path: Path):
+    """Test that the size on disk is returned for files without known header."""
+    file = tmp_path / "image.npy"
+    np.save(file, np.ones((10, 10)))
+
+    assert get_decoded_size(file) == file.stat().st_size / 1024**2
+
+
+def test_get_decoded_size_custom_metadata(tmp_path: Path):
+    """Test that the decoded size of custom files uses the metadata function."""
+    file = tmp_path / "image.npy"
+    np.save(file, np.ones((10, 10)))
+
+    def read_metadata_func(file_path, *args, **kwargs):
+        return ImageMetadata((100, 100), np.dtype(np.float32))
+
+    assert get_decoded_size(file, read_metadata_func) == 100 * 100 * 4 / 1024**2
+
+
+@pytest.mark.parametrize(
+    "shape, axes, patch_size, expected",
+    [
+        ((64, 64), "YX", (16, 16), 16),
+        ((3, 2, 60, 64), "STYX", (16, 16), 6 * 15),
+        ((2, 3, 16, 32, 32), "SCZYX", (8, 16, 16), 2 * 8),
+    ],
+)
+def test_get_number_of_patches(tmp_path: Path, shape, axes, patch_size, expected):
+    """Test that the number of random patches of a file matches the patches
+    extracted by `extract_patches_random`."""
+    from careamics.dataset.dataset_utils import reshape_array
+    from careamics.dataset.patching.random_patching import extract_patches_random
+
+    image = np.zeros(shape, dtype=np.uint8)
+    file = tmp_path / "image.tif"
+    tifffile.imwrite(file, image)
+
+    assert get_number_of_patches(file, axes, patch_size) == expected
+    patches = extract_patches_random(reshape_array(image, axes), patch_size)
+    assert len(list(patches)) == expected
 
 
 def test_get_files_size_tiff(tmp_path: Path):
@@ -0,0 +1,21 @@
+import pytest
+
+from careamics.dataset.dataset_utils import parallel_map
+
+
+def _square(x: int) -> int:
+    return x * x
+
+
+@pytest.mark.parametrize("num_workers", [0, 1, 3])
+@pytest.mark.parametrize("pool", ["thread", "process"])
+def test_parallel_map_order(num_workers, pool):
+    """Test that the results are returned in the order of the items."""
+    items = list(range(20))
+    assert parallel_map(_square, items, num_workers, pool) == [i * i for i in items]
+
+
+def test_parallel_map_invalid_pool():
+    """Test that an unknown pool type raises an error."""
+    with pytest.raises(ValueError):
+        parallel_map(_square, [1, 2], num_workers=2, pool="cluster")
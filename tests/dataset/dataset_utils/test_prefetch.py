@@ -0,0 +1,29 @@
+import pytest
+
+from careamics.dataset.dataset_utils import prefetch
+
+
+@pytest.mark.parametrize("depth", [0, 1, 3])
+def test_prefetch_order(depth):
+    """Test that prefetched items are yielded in order."""
+    assert list(prefetch(range(20), depth)) == list(range(20))
+
+
+def test_prefetch_exception():
+    """Test that exceptions raised by the iterable reach the consumer."""
+
+    def _generator():
+        yield 1
+        raise RuntimeError("Failed to read file.")
+
+    iterator = prefetch(_generator(), depth=2)
+    assert next(iterator) == 1
+    with pytest.raises(RuntimeError):
+        next(iterator)
+
+
+def test_prefetch_early_close():
+    """Test that closing the consumer early stops the background thread."""
+    iterator = prefetch(iter(range(1000)), depth=2)
+    assert next(iterator) == 0
+    iterator.close()
@@ -0,0 +1,73 @@
+import copy
+import pickle
+from multiprocessing.reduction import ForkingPickler
+
+import numpy as np
+import pytest
+
+from careamics.dataset.dataset_utils import SharedArray, share_arrays
+from careamics.dataset.dataset_utils.shared_memory import (
+    get_shared_state,
+    set_shared_state,
+)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.float16, np.float32])
+def test_shared_array(dtype):
+    """Test that the shared array holds a copy of the array."""
+    array = np.arange(2 * 3 * 16, dtype=dtype).reshape((2, 3, 16))
+    shared = SharedArray(array)
+
+    assert shared.array.dtype == dtype
+    assert np.array_equal(shared.array, array)
+    assert not np.shares_memory(shared.array, array)
+
+
+def test_shared_array_pickling():
+    """Test that only a handle is sent to worker processes, and that the array is
+    sent by value otherwise."""
+    array = np.ones((256, 256), dtype=np.float32)
+    shared = SharedArray(array)
+
+    # worker processes share the memory
+    buffer = ForkingPickler.dumps(shared)
+    assert len(buffer) < array.nbytes / 100
+    unpickled = pickle.loads(buffer)
+    assert np.array_equal(unpickled.array, array)
+
+    # standard pickling copies the data
+    unpickled = pickle.loads(pickle.dumps(shared))
+    assert np.array_equal(unpickled.array, array)
+
+
+def test_shared_state():
+    """Test removing and restoring the shared views of the attributes."""
+
+    class Holder:
+        def __init__(self):
+            self.data = np.ones((4, 4))
+            self.images = [np.zeros((2, 2)), np.ones((3, 3))]
+            self.other = None
+
+    holder = Holder()
+    shared = share_arrays(holder, ["data", "images", "other"])
+    assert set(shared) == {"data", "images"}
+    assert holder.data is shared["data"].array
+
+    state = get_shared_state(holder.__dict__, shared)
+    assert state["data"] is None and state["images"] is None
+    assert holder.data is not None
+
+    restored = set_shared_state(state, shared)
+    assert restored["data"] is shared["data"].array
+    assert restored["images"][1] is shared["images"][1].array
+
+    # reassigned attributes are kept as is
+    holder.data = np.zeros(3)
+    state = get_shared_state(holder.__dict__, shared)
+    assert np.array_equal(state["data"], np.zeros(3))
+    assert "data" not in state["_shared_views"]
+
+    # copies hold the same values
+    copied = copy.deepcopy(shared["images"][1])
+    assert np.array_equal(copied.array, holder.images[1])
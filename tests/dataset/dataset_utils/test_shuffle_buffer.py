@@ -0,0 +1,33 @@
+import numpy as np
+
+from careamics.dataset.dataset_utils import shuffle_buffer
+
+
+def _patches(n_patches):
+    return [(np.full((1, 8, 8), i, dtype=np.float32), None) for i in range(n_patches)]
+
+
+def test_shuffle_buffer():
+    """Test that the shuffle buffer yields every patch once, in a different order."""
+    patches = _patches(100)
+    patch_nbytes = patches[0][0].nbytes
+
+    shuffled = list(
+        shuffle_buffer(
+            patches, max_bytes=10 * patch_nbytes, rng=np.random.default_rng(42)
+        )
+    )
+    values = [int(patch[0, 0, 0]) for patch, _ in shuffled]
+
+    assert sorted(values) == list(range(100))
+    assert values != list(range(100))
+
+    # patches are delayed by at most the buffer capacity
+    assert all(value < i + 10 for i, value in enumerate(values))
+
+
+def test_shuffle_buffer_too_small():
+    """Test that patches are yielded in order if the buffer cannot hold two."""
+    patches = _patches(10)
+    shuffled = list(shuffle_buffer(patches, max_bytes=patches[0][0].nbytes))
+    assert [int(patch[0, 0, 0]) for patch, _ in shuffled] == list(range(10))
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import tifffile
+
+from careamics.dataset.dataset_utils import reshape_array
+from careamics.dataset.dataset_utils.tiff_pages import (
+    read_tiff_fraction,
+    read_tiff_samples,
+)
+
+
+@pytest.mark.parametrize(
+    "axes, shape",
+    [
+        ("SYX", (5, 8, 8)),
+        ("TCYX", (5, 2, 8, 8)),
+        ("STYX", (2, 5, 8, 8)),
+        ("SCZYX", (4, 2, 3, 8, 8)),
+    ],
+)
+def test_read_tiff_samples(tmp_path, axes, shape):
+    """Test that reading samples matches slicing the reshaped array."""
+    array = np.arange(np.prod(shape), dtype=np.uint16).reshape(shape)
+    file = tmp_path / "array.tif"
+    tifffile.imwrite(file, array)
+    expected = reshape_array(array, axes)
+
+    samples = read_tiff_samples(file, axes, slice(1, None, 2))
+    assert np.array_equal(samples, expected[1::2])
+
+    samples = read_tiff_samples(file, axes, np.array([0, 3]))
+    assert np.array_equal(samples, expected[[0, 3]])
+
+
+def test_read_tiff_samples_single_page(tmp_path):
+    """Test that files without sample axis are not read."""
+    file = tmp_path / "array.tif"
+    tifffile.imwrite(file, np.zeros((8, 8), dtype=np.uint16))
+
+    assert read_tiff_samples(file, "YX", slice(None)) is None
+
+
+@pytest.mark.parametrize(
+    "axes, shape",
+    [
+        ("SYX", (8, 8, 8)),
+        ("CZYX", (2, 8, 8, 8)),
+        ("STCYX", (2, 4, 2, 8, 8)),
+    ],
+)
+def test_read_tiff_fraction(tmp_path, axes, shape):
+    """Test that the drawn pages are a subset of the array, with all channels."""
+    array = np.arange(np.prod(shape), dtype=np.uint16).reshape(shape)
+    file = tmp_path / "array.tif"
+    tifffile.imwrite(file, array)
+    expected = reshape_array(array, axes)
+    n_channels = expected.shape[1]
+    # one image per drawn position, Z being drawn alongside S
+    images = np.moveaxis(expected, 1, -3).reshape(-1, n_channels, 8, 8)
+
+    pages = read_tiff_fraction(file, axes, 0.25, np.random.default_rng(42))
+    pages = np.moveaxis(pages, 1, -3).reshape(-1, n_channels, 8, 8)
+
+    assert len(pages) == int(np.ceil(0.25 * len(images)))
+    for page in pages:
+        assert any(np.array_equal(page, image) for image in images)
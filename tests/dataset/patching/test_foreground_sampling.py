@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from careamics.dataset.patching.foreground_sampling import (
+    ForegroundIndex,
+    sample_patch_coordinates,
+)
+
+
+def _sparse_array(shape, foreground):
+    """Array of zeros with a bright region."""
+    array = np.zeros(shape, dtype=np.float32)
+    array[(..., *foreground)] = 100
+    return array
+
+
+@pytest.mark.parametrize(
+    "shape, patch_size, foreground",
+    [
+        ((1, 128, 128), (16, 16), (slice(100, 120), slice(10, 30))),
+        ((2, 32, 64, 64), (8, 16, 16), (slice(4, 10), slice(40, 50), slice(5, 15))),
+    ],
+)
+def test_foreground_index(shape, patch_size, foreground):
+    """Test that the foreground patches drawn from the index contain foreground."""
+    array = _sparse_array(shape, foreground)
+    index = ForegroundIndex.from_array(array, patch_size)
+    assert len(index) > 0
+
+    rng = np.random.default_rng(42)
+    coords = index.sample(rng, 100)
+    assert coords.shape == (100, len(patch_size))
+    assert np.all(coords >= 0)
+    assert np.all(coords <= np.array(shape[-len(patch_size) :]) - patch_size)
+
+    for patch_coords in coords:
+        patch = array[
+            (..., *[slice(c, c + p) for c, p in zip(patch_coords, patch_size)])
+        ]
+        assert patch.any()
+
+
+def test_foreground_index_threshold():
+    """Test that no foreground is found above the maximum intensity."""
+    array = _sparse_array((1, 64, 64), (slice(10, 20), slice(10, 20)))
+
+    assert len(ForegroundIndex.from_array(array, (16, 16), threshold=100)) == 0
+    assert len(ForegroundIndex.from_array(array, (16, 16), threshold=50)) > 0
+
+
+def test_foreground_index_small_image():
+    """Test that images smaller than the patch have an empty index."""
+    array = np.ones((1, 8, 8))
+    assert len(ForegroundIndex.from_array(array, (16, 16))) == 0
+
+
+@pytest.mark.parametrize("foreground_ratio", [0, 0.5, 1])
+def test_sample_patch_coordinates(foreground_ratio):
+    """Test that the fraction of foreground patches follows the ratio."""
+    array = _sparse_array((1, 256, 256), (slice(10, 30), slice(200, 220)))
+    patch_size = (16, 16)
+    index = ForegroundIndex.from_array(array, patch_size)
+
+    rng = np.random.default_rng(42)
+    coords = sample_patch_coordinates(
+        rng, array.shape[1:], patch_size, 1000, index, foreground_ratio
+    )
+    assert coords.shape == (1000, 2)
+
+    is_foreground = [array[0, y : y + 16, x : x + 16].any() for y, x in coords]
+    # uniform patches rarely contain the foreground
+    assert np.mean(is_foreground) == pytest.approx(foreground_ratio, abs=0.06)
+
+
+def test_sample_patch_coordinates_empty_index():
+    """Test that patches are drawn uniformly if the index is empty."""
+    index = ForegroundIndex.from_array(np.zeros((1, 64, 64)), (16, 16), threshold=1)
+
+    coords = sample_patch_coordinates(
+        np.random.default_rng(42), (64, 64), (16, 16), 50, index, 1.0
+    )
+    assert coords.shape == (50, 2)
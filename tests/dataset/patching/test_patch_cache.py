@@ -0,0 +1,174 @@
+import os
+
+import numpy as np
+import pytest
+import tifffile
+
+from careamics.config import DataConfig
+from careamics.config.support import SupportedData
+from careamics.dataset import InMemoryDataset, PathIterableDataset
+from careamics.dataset.patching.patch_cache import (
+    PatchCache,
+    compute_cache_key,
+    get_patch_cache_dir,
+)
+from careamics.dataset.patching.patching import PatchedOutput, Stats
+
+
+@pytest.fixture
+def tiff_files(tmp_path, ordered_array):
+    files = []
+    for i in range(2):
+        file_path = tmp_path / f"array_{i}.tif"
+        tifffile.imwrite(file_path, ordered_array((32, 32)) + i)
+        files.append(file_path)
+
+    return files
+
+
+def test_cache_key(tiff_files):
+    """Test that the cache key depends on the files, axes and patch size."""
+    key = compute_cache_key(tiff_files, None, "YX", [8, 8])
+
+    assert key == compute_cache_key(tiff_files, None, "YX", [8, 8])
+    assert key != compute_cache_key(tiff_files[:1], None, "YX", [8, 8])
+    assert key != compute_cache_key(tiff_files, tiff_files, "YX", [8, 8])
+    assert key != compute_cache_key(tiff_files, None, "SYX", [8, 8])
+    assert key != compute_cache_key(tiff_files, None, "YX", [16, 16])
+    assert key != compute_cache_key(tiff_files, None, "YX", [8, 8], mode="other")
+
+    # modifying a file invalidates the key
+    stat = tiff_files[0].stat()
+    os.utime(tiff_files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert key != compute_cache_key(tiff_files, None, "YX", [8, 8])
+
+
+def test_cache_patches_round_trip(tmp_path):
+    """Test saving and loading patches from the cache."""
+    cache = PatchCache(tmp_path / "cache")
+    patches = np.random.rand(4, 1, 8, 8).astype(np.float32)
+    output = PatchedOutput(
+        patches, None, Stats(np.array([1.0]), np.array([2.0])), Stats((), ())
+    )
+
+    assert cache.load_patches("key") is None
+    cache.save_patches("key", output)
+    assert "key" in cache
+
+    loaded = cache.load_patches("key")
+    assert isinstance(loaded.patches, np.memmap)
+    assert np.array_equal(loaded.patches, patches)
+    assert loaded.targets is None
+    assert loaded.image_stats.get_statistics() == ([1.0], [2.0])
+    assert loaded.target_stats.get_statistics() == ([], [])
+    assert loaded.target_stats == output.target_stats
+
+    cache.clear()
+    assert "key" not in cache
+
+
+@pytest.mark.parametrize("in_memory_patching", ["array", "coordinates"])
+def test_in_memory_dataset_cache(monkeypatch, tmp_path, tiff_files, in_memory_patching):
+    """Test that the in-memory dataset loads its patches from the cache."""
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+
+    def get_config():
+        return DataConfig(
+            data_type=SupportedData.TIFF.value,
+            patch_size=[8, 8],
+            axes="YX",
+            in_memory_patching=in_memory_patching,
+            cache_patches=True,
+        )
+
+    read_paths = []
+
+    def read_func(file_path, *args, **kwargs):
+        read_paths.append(file_path)
+        return tifffile.imread(file_path)
+
+    dataset = InMemoryDataset(
+        data_config=get_config(), inputs=tiff_files, read_source_func=read_func
+    )
+    assert len(list(get_patch_cache_dir().iterdir())) == 1
+    assert len(read_paths) == 2
+
+    cached_dataset = InMemoryDataset(
+        data_config=get_config(), inputs=tiff_files, read_source_func=read_func
+    )
+    assert len(read_paths) == 2
+    assert len(cached_dataset) == len(dataset)
+    assert np.allclose(
+        cached_dataset.get_data_statistics(), dataset.get_data_statistics()
+    )
+
+    # the statistics of the missing targets are identical on cache hits and misses
+    assert cached_dataset.target_stats == dataset.target_stats == Stats((), ())
+    assert not cached_dataset.target_stats.means
+    if in_memory_patching == "array":
+        assert isinstance(cached_dataset.data, np.memmap)
+    else:
+        assert isinstance(cached_dataset.images[0], np.memmap)
+
+    patches = np.stack([dataset[i][0] for i in range(len(dataset))])
+    cached_patches = np.stack([cached_dataset[i][0] for i in range(len(dataset))])
+    assert np.allclose(np.sort(patches, axis=None), np.sort(cached_patches, axis=None))
+
+
+def test_iterable_dataset_cache(monkeypatch, tmp_path, tiff_files):
+    """Test that the iterable dataset loads its statistics from the cache."""
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+
+    def get_config():
+        return DataConfig(
+            data_type=SupportedData.TIFF.value,
+            patch_size=[8, 8],
+            axes="YX",
+            cache_patches=True,
+        )
+
+    read_paths = []
+
+    def read_func(file_path, *args, **kwargs):
+        read_paths.append(file_path)
+        return tifffile.imread(file_path)
+
+    dataset = PathIterableDataset(
+        data_config=get_config(), src_files=tiff_files, read_source_func=read_func
+    )
+    assert len(read_paths) == 2
+
+    cached_dataset = PathIterableDataset(
+        data_config=get_config(), src_files=tiff_files, read_source_func=read_func
+    )
+    assert len(read_paths) == 2
+    assert np.allclose(
+        cached_dataset.get_data_statistics(), dataset.get_data_statistics()
+    )
+
+
+def test_cache_eviction(tmp_path):
+    """Test that the least recently used entries are removed above the maximum size."""
+    patches = np.zeros((16, 1, 64, 64), dtype=np.float32)  # 256 KB
+    output = PatchedOutput(patches, None, Stats((), ()), Stats((), ()))
+    cache = PatchCache(tmp_path / "cache", max_size_mb=0.6)
+
+    cache.save_patches("first", output)
+    cache.save_patches("second", output)
+    os.utime(tmp_path / "cache" / "first", ns=(0, 0))
+    os.utime(tmp_path / "cache" / "second", ns=(0, 1))
+
+    # using the first entry makes the second one the least recently used
+    assert cache.load_patches("first") is not None
+    cache.save_patches("third", output)
+
+    assert "first" in cache
+    assert "second" not in cache
+    assert "third" in cache
+
+    # the entry just saved is kept even if it alone exceeds the maximum size
+    small_cache = PatchCache(tmp_path / "cache", max_size_mb=0.1)
+    small_cache.save_patches("fourth", output)
+    assert "fourth" in small_cache
+    assert "first" not in small_cache
+    assert "third" not in small_cache
@@ -61,3 +61,50 @@ def test_random_patching_unsupervised(ordered_array, shape, patch_size):
         assert coords.min() == 0
         assert coords.max() == max(array.shape) - max(patch_size)
         assert len(np.unique(coords, axis=0)) >= min_unique_patches
+
+
+def test_random_patching_foreground():
+    """Test that the patches are drawn among the foreground patches."""
+    array = np.zeros((2, 1, 128, 128), dtype=np.float32)
+    array[:, :, 100:120, 10:30] = 100
+
+    patches = [
+        patch
+        for patch, _ in extract_patches_random(
+            array, patch_size=(16, 16), target=array, seed=42, foreground_ratio=1
+        )
+    ]
+
+    assert len(patches) == 2 * 64
+    assert all(patch.any() for patch in patches)
+
+
+def test_random_patching_foreground_indices(monkeypatch):
+    """Test that the foreground indices are built once per sample and reused."""
+    from careamics.dataset.patching import random_patching
+
+    array = np.zeros((2, 1, 64, 64), dtype=np.float32)
+    array[:, :, 40:60, 10:30] = 100
+
+    n_built = []
+    from_array = random_patching.ForegroundIndex.from_array
+
+    def _from_array(*args, **kwargs):
+        n_built.append(1)
+        return from_array(*args, **kwargs)
+
+    monkeypatch.setattr(random_patching.ForegroundIndex, "from_array", _from_array)
+
+    foreground_indices = {}
+    for _ in range(3):
+        list(
+            extract_patches_random(
+                array,
+                patch_size=(16, 16),
+                foreground_ratio=1,
+                foreground_indices=foreground_indices,
+            )
+        )
+
+    assert sorted(foreground_indices) == [0, 1]
+    assert len(n_built) == 2
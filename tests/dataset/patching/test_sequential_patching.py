@@ -6,6 +6,7 @@ from careamics.dataset.patching.sequential_patching import (
     _compute_overlap,
     _compute_patch_steps,
     _compute_patch_views,
+    extract_patch_coordinates_sequential,
     extract_patches_sequential,
 )
 
@@ -74,6 +75,44 @@ def test_extract_patches_sequential_2d_supervised(array_2D, patch_size):
     assert np.array_equal(patches, targets)
 
 
+@pytest.mark.parametrize(
+    "shape, patch_size",
+    [
+        ((1, 3, 10, 9), (4, 4)),
+        ((2, 1, 16, 16), (8, 4)),
+        ((1, 3, 8, 16, 16), (2, 8, 4)),
+        ((2, 1, 5, 10, 9), (4, 4, 8)),
+    ],
+)
+def test_extract_patch_coordinates_sequential(shape, patch_size):
+    """Test that the patch coordinates match the sequentially extracted patches."""
+    array = np.arange(np.prod(shape)).reshape(shape)
+
+    coordinates = extract_patch_coordinates_sequential(array, patch_size)
+    patches, _ = extract_patches_sequential(array, patch_size=patch_size)
+    assert coordinates.shape == (patches.shape[0], len(shape) - 1)
+
+    # slice the patches from the coordinates
+    sliced = np.stack(
+        [
+            array[
+                (
+                    sample,
+                    ...,
+                    *[slice(c, c + p) for c, p in zip(start, patch_size)],
+                )
+            ]
+            for sample, *start in coordinates
+        ]
+    )
+    assert sliced.shape == patches.shape
+
+    # sequential patches are shuffled, compare them sorted by their first value
+    order_sliced = np.argsort(sliced.reshape(sliced.shape[0], -1)[:, 0])
+    order_patches = np.argsort(patches.reshape(patches.shape[0], -1)[:, 0])
+    assert np.array_equal(sliced[order_sliced], patches[order_patches])
+
+
 @pytest.mark.parametrize(
     "shape, patch_sizes, expected",
     [
@@ -0,0 +1,208 @@
+import importlib
+import pickle
+from multiprocessing.reduction import ForkingPickler
+
+import numpy as np
+import pytest
+import tifffile
+
+from careamics.config import DataConfig
+from careamics.config.support import SupportedData
+from careamics.dataset import (
+    HybridIterableDataset,
+    PathIterableDataset,
+    iterable_dataset,
+)
+from careamics.dataset.dataset_utils.iterate_over_files import (
+    _read_samples,
+    read_tiff_samples,
+)
+
+
+def _write_files(tmp_path, ordered_array, n_files):
+    """Write ordered arrays to TIFF files."""
+    array = ordered_array((32, 32))
+    files = []
+    for i in range(n_files):
+        file_path = tmp_path / f"array_{i}.tif"
+        tifffile.imwrite(file_path, array + i)
+        files.append(file_path)
+
+    return files
+
+
+@pytest.mark.parametrize("n_fitting", [0, 2, 4])
+def test_memory_budget(tmp_path, ordered_array, n_fitting):
+    """Test that the files fitting in the memory budget are kept in memory."""
+    files = _write_files(tmp_path, ordered_array, 4)
+    file_size = 32 * 32 * 4 / 1024**2
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=[8, 8],
+        axes="YX",
+        transforms=[],
+    )
+    dataset = HybridIterableDataset(
+        data_config=config,
+        src_files=files,
+        memory_budget=(n_fitting + 0.5) * file_size,
+    )
+    assert dataset.get_number_of_cached_files() == n_fitting
+
+
+def test_memory_budget_filled(tmp_path, ordered_array):
+    """Test that smaller files following a file exceeding the budget are cached."""
+    files = _write_files(tmp_path, ordered_array, 4)
+    tifffile.imwrite(files[0], ordered_array((64, 64)))
+    file_size = 32 * 32 * 4 / 1024**2
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=[8, 8],
+        axes="YX",
+        transforms=[],
+    )
+    dataset = HybridIterableDataset(
+        data_config=config,
+        src_files=files,
+        memory_budget=3.5 * file_size,
+    )
+    assert dataset.get_number_of_cached_files() == 3
+    assert files[0] not in dataset._cache
+
+
+def test_partial_reads_of_uncached_files(monkeypatch, tmp_path, ordered_array):
+    """Test that the files that are not cached are partially read, while the cached
+    files are taken from memory."""
+    # a dimension of size 3 or 4 before YX would be written as RGB pages
+    array = ordered_array((5, 32, 32))
+    files = []
+    for i in range(4):
+        file_path = tmp_path / f"array_{i}.tif"
+        tifffile.imwrite(file_path, array + i)
+        files.append(file_path)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=[8, 8],
+        axes="SYX",
+        transforms=[],
+    )
+    dataset = HybridIterableDataset(
+        data_config=config,
+        src_files=files,
+        memory_budget=2.5 * array.size * 4 / 1024**2,
+    )
+    assert dataset.get_number_of_cached_files() == 2
+    read_func = dataset._get_read_func()
+
+    read_files = []
+
+    def _read_tiff_samples(file_path, *args, **kwargs):
+        read_files.append(file_path)
+        return read_tiff_samples(file_path, *args, **kwargs)
+
+    # the module is shadowed by the function of the same name in the package
+    module = importlib.import_module(
+        "careamics.dataset.dataset_utils.iterate_over_files"
+    )
+    monkeypatch.setattr(module, "read_tiff_samples", _read_tiff_samples)
+
+    for i, file in enumerate(files):
+        # splitting the samples between workers
+        samples = _read_samples(file, "SYX", read_func, slice(0, None, 2))
+        assert np.array_equal(samples[:, 0], array[::2] + i)
+
+        # statistics computed on half of the pages
+        sample = iterable_dataset._read_statistics_sample(
+            file, "SYX", read_func, 0.5, 0
+        )
+        assert len(sample) == (5 if file in dataset._cache else 3)
+
+    assert read_files == files[2:]
+
+
+def test_shared_memory(tmp_path, ordered_array):
+    """Test that only a handle to the decoded files is sent to worker processes."""
+    files = _write_files(tmp_path, ordered_array, 4)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=[8, 8],
+        axes="YX",
+        transforms=[],
+        shared_memory=True,
+    )
+    dataset = HybridIterableDataset(
+        data_config=config,
+        src_files=files,
+        memory_budget=1,
+    )
+    assert dataset.get_number_of_cached_files() == 4
+
+    buffer = ForkingPickler.dumps(dataset)
+    assert len(buffer) < 32 * 32 * 4
+
+    restored = pickle.loads(buffer)
+    assert restored.get_number_of_cached_files() == 4
+    for file in files:
+        assert np.array_equal(restored._cache[file], dataset._cache[file])
+    assert len(list(restored)) == len(list(dataset))
+
+
+def test_same_as_iterable_dataset(tmp_path, ordered_array):
+    """Test that the hybrid dataset yields the same patches as the iterable dataset,
+    with the same statistics."""
+    files = _write_files(tmp_path, ordered_array, 4)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=[8, 8],
+        axes="YX",
+        transforms=[],
+    )
+    iterable = PathIterableDataset(data_config=config, src_files=files)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=[8, 8],
+        axes="YX",
+        transforms=[],
+    )
+    hybrid = HybridIterableDataset(
+        data_config=config,
+        src_files=files,
+        target_files=files,
+        memory_budget=2 * (2 * 32 * 32 * 4) / 1024**2,
+    )
+    assert hybrid.get_number_of_cached_files() == 2
+    assert np.allclose(hybrid.image_stats.means, iterable.image_stats.means)
+    assert np.allclose(hybrid.image_stats.stds, iterable.image_stats.stds)
+
+    # patches and targets are identical, and cover all the files
+    patches = list(hybrid)
+    assert len(patches) == len(list(iterable))
+    for patch, target in patches:
+        assert np.allclose(patch, target)
+
+
+def test_split_dataset_shares_cache(tmp_path, ordered_array):
+    """Test that the split dataset shares the decoded files."""
+    files = _write_files(tmp_path, ordered_array, 6)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=[8, 8],
+        axes="YX",
+    )
+    dataset = HybridIterableDataset(
+        data_config=config,
+        src_files=files,
+        memory_budget=1,
+    )
+    valset = dataset.split_dataset(percentage=0.1, minimum_number=2)
+
+    assert valset._cache is dataset._cache
+    assert dataset.get_number_of_cached_files() == 4
+    assert valset.get_number_of_cached_files() == 2
@@ -1,6 +1,11 @@
+import pickle
+from multiprocessing.reduction import ForkingPickler
+
 import numpy as np
 import pytest
 import tifffile
+import torch
+from torch.utils.data import DataLoader
 
 from careamics.config import DataConfig
 from careamics.config.support import SupportedData
@@ -63,7 +68,12 @@ def test_extracting_val_array(ordered_array, percentage):
     assert len(dataset) == total_n_patches - n_patches
 
     # check that none of the validation patch values are in the original dataset
-    assert np.in1d(valset.data, dataset.data).sum() == 0
+    val_patches = valset.data[valset.patch_indices]
+    train_patches = dataset.data[dataset.patch_indices]
+    assert np.in1d(val_patches, train_patches).sum() == 0
+
+    # check that the patches are shared
+    assert valset.data is dataset.data
 
 
 @pytest.mark.parametrize("percentage", [0.1, 0.6])
@@ -103,4 +113,226 @@ def test_extracting_val_files(tmp_path, ordered_array, percentage):
     assert len(dataset) == total_n_patches - n_patches
 
     # check that none of the validation patch values are in the original dataset
-    assert np.in1d(valset.data, dataset.data).sum() == 0
+    val_patches = valset.data[valset.patch_indices]
+    train_patches = dataset.data[dataset.patch_indices]
+    assert np.in1d(val_patches, train_patches).sum() == 0
+
+    # check that the patches are shared
+    assert valset.data is dataset.data
+
+
+@pytest.mark.parametrize(
+    "shape, axes, patch_size",
+    [
+        ((32, 32), "YX", [8, 8]),
+        ((2, 3, 32, 32), "SCYX", [8, 8]),
+        ((16, 32, 32), "ZYX", [8, 8, 8]),
+    ],
+)
+def test_patch_coordinates(ordered_array, shape, axes, patch_size):
+    """Test that indexing patch coordinates yields the same patches as extracting
+    them."""
+    array = ordered_array(shape)
+    target = -array
+
+    config = DataConfig(
+        data_type=SupportedData.ARRAY.value,
+        patch_size=patch_size,
+        axes=axes,
+        transforms=[],
+    )
+    dataset = InMemoryDataset(data_config=config, inputs=array, input_target=target)
+
+    config_coords = DataConfig(
+        data_type=SupportedData.ARRAY.value,
+        patch_size=patch_size,
+        axes=axes,
+        transforms=[],
+        in_memory_patching="coordinates",
+    )
+    dataset_coords = InMemoryDataset(
+        data_config=config_coords, inputs=array, input_target=target
+    )
+
+    # no patch is materialized
+    assert dataset_coords.data is None
+    assert len(dataset_coords) == len(dataset)
+    assert dataset_coords.get_data_statistics() == dataset.get_data_statistics()
+
+    # the same patches are returned, albeit in a different order
+    patches = np.stack([dataset[i][0] for i in range(len(dataset))])
+    patches_coords = np.stack([dataset_coords[i][0] for i in range(len(dataset))])
+    targets_coords = np.stack([dataset_coords[i][1] for i in range(len(dataset))])
+    assert np.array_equal(
+        np.sort(patches, axis=None), np.sort(patches_coords, axis=None)
+    )
+
+    # targets are sliced at the same position as the patches
+    means, stds = dataset_coords.image_stats.get_statistics()
+    t_means, t_stds = dataset_coords.target_stats.get_statistics()
+    assert np.allclose(
+        patches_coords * (stds[0] + 1e-6) + means[0],
+        -(targets_coords * (t_stds[0] + 1e-6) + t_means[0]),
+        atol=1e-3,
+    )
+
+
+def test_patch_coordinates_split_files(tmp_path, ordered_array):
+    """Test splitting an InMemoryDataset indexing patch coordinates from files."""
+    array = ordered_array((32, 32))
+    files = []
+    for i in range(2):
+        file_path = tmp_path / f"array_{i}.tif"
+        tifffile.imwrite(file_path, array + i)
+        files.append(file_path)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=[8, 8],
+        axes="YX",
+        in_memory_patching="coordinates",
+    )
+    dataset = InMemoryDataset(data_config=config, inputs=files)
+    assert len(dataset) == 2 * 16
+    assert np.allclose(dataset.image_stats.means, array.mean() + 0.5)
+
+    total_n_patches = len(dataset)
+    valset = dataset.split_dataset(0.25, 5)
+
+    # images are shared, coordinates are split
+    assert valset.images is dataset.images
+    assert len(valset) == 8
+    assert len(dataset) == total_n_patches - 8
+
+    coords = {tuple(c) for c in dataset.patch_coordinates}
+    val_coords = {tuple(c) for c in valset.patch_coordinates}
+    assert len(coords.intersection(val_coords)) == 0
+
+
+@pytest.mark.parametrize("in_memory_patching", ["array", "coordinates"])
+@pytest.mark.parametrize("loading_pool", ["thread", "process"])
+def test_parallel_loading(tmp_path, ordered_array, in_memory_patching, loading_pool):
+    """Test that loading files in parallel yields the same dataset as serially."""
+    array = ordered_array((32, 32))
+    files = []
+    for i in range(4):
+        file_path = tmp_path / f"array_{i}.tif"
+        tifffile.imwrite(file_path, array + i)
+        files.append(file_path)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=[8, 8],
+        axes="YX",
+        in_memory_patching=in_memory_patching,
+        transforms=[],
+    )
+    serial = InMemoryDataset(data_config=config, inputs=files, targets=files)
+
+    config.num_loading_workers = 2
+    config.loading_pool = loading_pool
+    parallel = InMemoryDataset(data_config=config, inputs=files, targets=files)
+
+    assert len(parallel) == len(serial)
+    assert np.allclose(parallel.image_stats.means, serial.image_stats.means)
+    assert np.allclose(parallel.target_stats.stds, serial.target_stats.stds)
+
+    # patches are shuffled in array mode, compare them as sorted rows
+    serial_patches = np.stack([serial[i][0].ravel() for i in range(len(serial))])
+    parallel_patches = np.stack([parallel[i][0].ravel() for i in range(len(parallel))])
+    assert np.array_equal(
+        np.unique(serial_patches, axis=0), np.unique(parallel_patches, axis=0)
+    )
+
+
+@pytest.mark.parametrize("in_memory_patching", ["array", "coordinates"])
+@pytest.mark.parametrize(
+    "storage_dtype, expected_dtype",
+    [("native", np.uint16), ("float32", np.float32), ("float16", np.float16)],
+)
+def test_storage_dtype(
+    ordered_array, in_memory_patching, storage_dtype, expected_dtype
+):
+    """Test that the data is stored in the requested data type, and that patches are
+    normalized to float32."""
+    array = ordered_array((32, 32)).astype(np.uint16)
+
+    config = DataConfig(
+        data_type=SupportedData.ARRAY.value,
+        patch_size=[8, 8],
+        axes="YX",
+        in_memory_patching=in_memory_patching,
+        storage_dtype=storage_dtype,
+        transforms=[],
+    )
+    dataset = InMemoryDataset(data_config=config, inputs=array)
+
+    stored = dataset.data if dataset.data is not None else dataset.images[0]
+    assert stored.dtype == expected_dtype
+
+    (patch,) = dataset[0]
+    assert patch.dtype == np.float32
+
+
+def test_storage_dtype_float16_overflow(ordered_array):
+    """Test that storing data exceeding the range of float16 raises an error."""
+    array = ordered_array((32, 32)).astype(np.uint16) + 65000
+
+    config = DataConfig(
+        data_type=SupportedData.ARRAY.value,
+        patch_size=[8, 8],
+        axes="YX",
+        storage_dtype="float16",
+    )
+    with pytest.raises(ValueError):
+        InMemoryDataset(data_config=config, inputs=array)
+
+
+@pytest.mark.parametrize("in_memory_patching", ["array", "coordinates"])
+def test_shared_memory(ordered_array, in_memory_patching):
+    """Test that only a handle to the data is sent to worker processes, and that the
+    datasets are restored with the same patches."""
+    array = ordered_array((4, 64, 64))
+
+    config = DataConfig(
+        data_type=SupportedData.ARRAY.value,
+        patch_size=[16, 16],
+        axes="SYX",
+        in_memory_patching=in_memory_patching,
+        shared_memory=True,
+        transforms=[],
+    )
+    dataset = InMemoryDataset(data_config=config, inputs=array)
+    valset = dataset.split_dataset(percentage=0.1, minimum_patches=2)
+    assert len(dataset) + len(valset) == 64
+
+    for ds in (dataset, valset):
+        buffer = ForkingPickler.dumps(ds)
+        assert len(buffer) < array.nbytes / 10
+
+        restored = pickle.loads(buffer)
+        assert len(restored) == len(ds)
+        for i in range(len(ds)):
+            assert np.array_equal(restored[i][0], ds[i][0])
+
+
+def test_shared_memory_spawn_workers(ordered_array):
+    """Test that spawned dataloader workers yield the same patches from the shared
+    memory."""
+    array = ordered_array((4, 64, 64))
+
+    config = DataConfig(
+        data_type=SupportedData.ARRAY.value,
+        patch_size=[16, 16],
+        axes="SYX",
+        shared_memory=True,
+        transforms=[],
+    )
+    dataset = InMemoryDataset(data_config=config, inputs=array)
+
+    loader = DataLoader(
+        dataset, batch_size=8, num_workers=2, multiprocessing_context="spawn"
+    )
+    patches = torch.cat([batch[0] for batch in loader]).numpy()
+    expected = np.stack([dataset[i][0] for i in range(len(dataset))])
+    assert np.array_equal(patches, expected)
@@ -3,6 +3,7 @@ import os
 import numpy as np
 import pytest
 import tifffile
+from torch.utils.data import DataLoader
 
 from careamics.config import DataConfig
 from careamics.config.support import SupportedData
@@ -238,3 +239,190 @@ def test_compute_mean_std_transform_welford_with_targets(
     assert np.allclose(
         target_array.std(axis=stats_axes), dataset.data_config.target_stds
     )
+
+
+@pytest.mark.parametrize("loading_pool", ["thread", "process"])
+def test_compute_mean_std_parallel(tmp_path, loading_pool):
+    """Test that statistics computed in parallel match the serial computation, and
+    that subsampling the files yields close statistics."""
+    n_files = 6
+    rng = np.random.default_rng(42)
+    array = rng.normal(100, 10, (n_files, 2, 32, 32)).astype(np.float32)
+
+    files = []
+    for i in range(n_files):
+        file = tmp_path / f"array{i}.tif"
+        tifffile.imwrite(file, array[i])
+        files.append(file)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=(8, 8),
+        axes="CYX",
+        num_loading_workers=3,
+        loading_pool=loading_pool,
+    )
+    dataset = PathIterableDataset(data_config=config, src_files=files)
+
+    assert np.allclose(array.mean(axis=(0, 2, 3)), dataset.image_stats.means)
+    assert np.allclose(array.std(axis=(0, 2, 3)), dataset.image_stats.stds)
+
+    # subsampled statistics
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=(8, 8),
+        axes="CYX",
+        statistics_fraction=0.25,
+    )
+    dataset = PathIterableDataset(data_config=config, src_files=files)
+
+    assert np.allclose(array.mean(axis=(0, 2, 3)), dataset.image_stats.means, rtol=0.01)
+    assert np.allclose(array.std(axis=(0, 2, 3)), dataset.image_stats.stds, rtol=0.05)
+
+
+@pytest.mark.parametrize(
+    "shape, axes",
+    [
+        ((40, 16, 16), "SYX"),
+        ((10, 2, 16, 16), "SCYX"),
+        ((2, 10, 16, 16), "CZYX"),
+        ((4, 5, 2, 16, 16), "STCYX"),
+    ],
+)
+def test_statistics_read_pages(monkeypatch, tmp_path, shape, axes):
+    """Test that subsampled statistics of a tiff file only decode a fraction of its
+    pages, keeping all the channels."""
+    rng = np.random.default_rng(42)
+    array = rng.normal(100, 10, shape).astype(np.float32)
+    file = tmp_path / "array.tif"
+    tifffile.imwrite(file, array)
+
+    # record the pages decoded
+    keys = []
+    imread = tifffile.imread
+
+    def _imread(*args, **kwargs):
+        keys.append(kwargs.get("key"))
+        return imread(*args, **kwargs)
+
+    monkeypatch.setattr(tifffile, "imread", _imread)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=(8, 8, 8) if "Z" in axes else (8, 8),
+        axes=axes,
+        statistics_fraction=0.2,
+    )
+    dataset = PathIterableDataset(data_config=config, src_files=[file])
+
+    # a fifth of the positions are drawn, with all their channels
+    n_channels = shape[axes.index("C")] if "C" in axes else 1
+    n_positions = int(np.prod(shape[:-2])) // n_channels
+    assert len(keys) == 1
+    assert len(set(keys[0])) == int(np.ceil(0.2 * n_positions)) * n_channels
+
+    channel_axis = axes.index("C") if "C" in axes else None
+    stats_axes = tuple(i for i in range(array.ndim) if i != channel_axis)
+    assert np.allclose(
+        array.mean(axis=stats_axes), dataset.image_stats.means, rtol=0.05
+    )
+    assert np.allclose(array.std(axis=stats_axes), dataset.image_stats.stds, rtol=0.1)
+
+
+@pytest.mark.parametrize("prefetch_files", [0, 2])
+def test_prefetch_files(tmp_path, ordered_array, prefetch_files):
+    """Test that reading files ahead yields the same number of patches."""
+    n_files = 4
+    array = ordered_array((32, 32))
+    files = []
+    for i in range(n_files):
+        file = tmp_path / f"array{i}.tif"
+        tifffile.imwrite(file, array)
+        files.append(file)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=(8, 8),
+        axes="YX",
+        prefetch_files=prefetch_files,
+    )
+    dataset = PathIterableDataset(data_config=config, src_files=files)
+
+    assert len(list(dataset)) == n_files * 16
+
+
+def test_shuffle_buffer(tmp_path):
+    """Test that patches from different files are mixed with a shuffle buffer."""
+    n_files = 4
+    files = []
+    for i in range(n_files):
+        file = tmp_path / f"array{i}.tif"
+        tifffile.imwrite(file, np.full((32, 32), i, dtype=np.float32))
+        files.append(file)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=(8, 8),
+        axes="YX",
+        transforms=[],
+        image_means=[0],
+        image_stds=[1],
+        shuffle_buffer_mb=32 * 8 * 8 * 4 / 1024**2,
+    )
+    dataset = PathIterableDataset(data_config=config, src_files=files)
+
+    file_indices = [round(float(patch[0, 0, 0])) for patch, *_ in dataset]
+    assert sorted(file_indices) == sorted(list(range(n_files)) * 16)
+    assert file_indices != sorted(file_indices)
+
+
+def test_split_samples_across_workers(tmp_path):
+    """Test that the samples of a single file are split between workers."""
+    file = tmp_path / "array.tif"
+    tifffile.imwrite(file, np.arange(4 * 16 * 16, dtype=np.float32).reshape(4, 16, 16))
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=(8, 8),
+        axes="SYX",
+        transforms=[],
+    )
+    dataset = PathIterableDataset(data_config=config, src_files=[file])
+
+    dataloader = DataLoader(dataset, batch_size=None, num_workers=2)
+    patches = list(dataloader)
+
+    # each of the 4 samples yields 4 patches, without duplicates across workers
+    assert len(patches) == 4 * 4
+
+
+def test_foreground_indices_cache(monkeypatch, tmp_path):
+    """Test that the foreground indices are built once per sample across epochs."""
+    from careamics.dataset.patching import random_patching
+
+    array = np.zeros((3, 32, 32), dtype=np.float32)
+    array[:, 10:20, 10:20] = 100
+    for i in range(2):
+        tifffile.imwrite(tmp_path / f"array{i}.tif", array)
+    files = sorted(tmp_path.glob("*.tif"))
+
+    n_built = []
+    from_array = random_patching.ForegroundIndex.from_array
+
+    def _from_array(*args, **kwargs):
+        n_built.append(1)
+        return from_array(*args, **kwargs)
+
+    monkeypatch.setattr(random_patching.ForegroundIndex, "from_array", _from_array)
+
+    config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=(8, 8),
+        axes="SYX",
+        foreground_ratio=0.5,
+    )
+    dataset = PathIterableDataset(data_config=config, src_files=files)
+    for _ in range(2):
+        assert len(list(dataset)) == 2 * 3 * 16
+
+    assert len(n_built) == 2 * 3
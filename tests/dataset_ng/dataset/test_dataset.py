@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+import zarr
+from torch.utils.data import DataLoader
+
+from careamics.config import DataConfig
+from careamics.dataset_ng.dataset import CareamicsDataset
+from careamics.dataset_ng.patch_extractor import PatchExtractor
+
+
+@pytest.mark.parametrize("supervised", [False, True])
+def test_getitems(ordered_array, supervised):
+    """Test that the batches extracted at once match the patches indexed one by
+    one."""
+    data_config = DataConfig(
+        data_type="array",
+        axes="SYX",
+        patch_size=[8, 8],
+        batch_size=4,
+        transforms=[],
+    )
+    array = ordered_array((3, 32, 32), dtype=np.float32)
+    dataset = CareamicsDataset(
+        data_config,
+        PatchExtractor.from_arrays([array], axes="SYX"),
+        PatchExtractor.from_arrays([array + 1], axes="SYX") if supervised else None,
+        seed=42,
+    )
+
+    indices = [5, 0, 17, 3]
+    items = dataset.__getitems__(indices)
+    assert len(items) == len(indices)
+    for item, index in zip(items, indices):
+        expected = dataset[index]
+        assert len(item) == len(expected)
+        for array_item, array_expected in zip(item, expected):
+            assert np.array_equal(array_item, array_expected)
+
+    # the dataloader fetches the batches at once
+    batch = next(iter(DataLoader(dataset, batch_size=4)))
+    assert np.array_equal(batch[0][2].numpy(), dataset[2][0])
+
+
+def test_lazy_statistics_and_foreground(monkeypatch, tmp_path):
+    """Test that lazily read stacks are only partially read to compute the
+    statistics and the foreground indices."""
+    rng = np.random.default_rng(42)
+    array = rng.normal(10, 2, (4, 256, 256)).astype(np.float32)
+    array[:, 100:140, 100:140] += 50
+    zarr.save_array(str(tmp_path / "data.zarr"), array, chunks=(1, 64, 64))
+
+    # count the chunks read from the zarr array
+    reads = []
+    getitem = zarr.Array.__getitem__
+
+    def _getitem(self, selection):
+        reads.append(selection)
+        return getitem(self, selection)
+
+    monkeypatch.setattr(zarr.Array, "__getitem__", _getitem)
+
+    data_config = DataConfig(
+        data_type="custom",
+        axes="SYX",
+        patch_size=[16, 16],
+        batch_size=4,
+        transforms=[],
+        statistics_fraction=0.25,
+        foreground_ratio=0.5,
+    )
+    dataset = CareamicsDataset(
+        data_config,
+        PatchExtractor.from_zarr_files(
+            [tmp_path / "data.zarr"], axes="SYX", data_path=None
+        ),
+        seed=42,
+    )
+
+    # a quarter of the 64 chunks are read, once
+    assert len(reads) == 16
+    assert np.allclose(dataset.image_stats.means, array.mean(), rtol=0.1)
+    assert np.allclose(dataset.image_stats.stds, array.std(), rtol=0.2)
+
+    # the foreground is indexed within the regions read
+    foreground = [index for index in dataset.foreground_indices[0] if len(index)]
+    assert len(foreground) > 0
+    for index in foreground:
+        coords = index.sample(rng, 100)
+        assert np.all(coords >= 100 - 16 - 4)
+        assert np.all(coords <= 140 + 4)
+
+
+@pytest.mark.parametrize("n_stacks, n_val_stacks", [(6, 0), (10, 5), (60, 6)])
+def test_split_dataset(ordered_array, n_stacks, n_val_stacks):
+    """Test that the image stacks are only split if most of them are kept for
+    training, the patches being split otherwise."""
+    data_config = DataConfig(
+        data_type="array",
+        axes="YX",
+        patch_size=[8, 8],
+        batch_size=4,
+        transforms=[],
+    )
+    arrays = [ordered_array((16, 16), dtype=np.float32) + i for i in range(n_stacks)]
+    dataset = CareamicsDataset(
+        data_config, PatchExtractor.from_arrays(arrays, axes="YX"), seed=42
+    )
+    n_patches = len(dataset)
+
+    valset = dataset.split_dataset()
+    n_train_stacks = len(dataset.input_extractor.image_stacks)
+    if n_val_stacks == 0:
+        # the minimum number of 5 stacks would leave a single stack for training
+        assert n_train_stacks == n_stacks
+        assert valset.fixed_patch_specs is not None
+        assert len(valset) == 5
+        assert len(dataset) == n_patches
+    else:
+        assert n_train_stacks == n_stacks - n_val_stacks
+        assert len(valset.input_extractor.image_stacks) == n_val_stacks
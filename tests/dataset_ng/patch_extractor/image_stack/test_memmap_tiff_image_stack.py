@@ -0,0 +1,91 @@
+import pickle
+
+import numpy as np
+import pytest
+import tifffile
+
+from careamics.dataset.dataset_utils import reshape_array
+from careamics.dataset_ng.patch_extractor.image_stack import MemmapTiffImageStack
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+@pytest.mark.parametrize(
+    "axes, shape, patch_size",
+    [
+        ("YX", (32, 48), (8, 8)),
+        ("SYX", (3, 32, 48), (8, 8)),
+        ("CYX", (2, 32, 48), (16, 8)),
+        ("TSCYX", (2, 3, 2, 32, 32), (8, 8)),
+        ("SZYX", (2, 16, 32, 32), (8, 8, 8)),
+    ],
+)
+def test_extract_patch(tmp_path, ordered_array, axes, shape, patch_size, compression):
+    """Test that the patches match those of the array reshaped to SC(Z)YX, for
+    memory-mapped and compressed files."""
+    array = ordered_array(shape, dtype=np.float32)
+    tifffile.imwrite(tmp_path / "data.tif", array, compression=compression)
+    image_stack = MemmapTiffImageStack.from_tiff(tmp_path / "data.tif", axes)
+
+    # compressed files cannot be memory-mapped
+    assert image_stack.is_memmap == (compression is None)
+
+    expected = reshape_array(array, axes)
+    assert tuple(image_stack.data_shape) == expected.shape
+
+    rng = np.random.default_rng(42)
+    spatial_shape = np.array(expected.shape[2:])
+    for _ in range(10):
+        sample_idx = int(rng.integers(expected.shape[0]))
+        coords = rng.integers(0, spatial_shape - np.array(patch_size), endpoint=True)
+        patch = image_stack.extract_patch(sample_idx, coords, patch_size)
+
+        slices = tuple(slice(c, c + p) for c, p in zip(coords, patch_size))
+        assert not isinstance(patch, np.memmap)
+        assert np.array_equal(patch, expected[(sample_idx, ..., *slices)])
+
+
+def test_tiled_tiff(tmp_path, ordered_array):
+    """Test that tiled files are read through the zarr interface."""
+    array = ordered_array((2, 64, 64), dtype=np.uint16)
+    tifffile.imwrite(tmp_path / "data.tif", array, tile=(16, 16))
+    image_stack = MemmapTiffImageStack.from_tiff(tmp_path / "data.tif", "SYX")
+
+    patch = image_stack.extract_patch(1, (10, 20), (16, 16))
+
+    assert not image_stack.is_memmap
+    assert np.array_equal(patch[0], array[1, 10:26, 20:36])
+
+
+def test_pickling(tmp_path, ordered_array):
+    """Test that the file handle is not pickled."""
+    array = ordered_array((2, 256, 256), dtype=np.float32)
+    tifffile.imwrite(tmp_path / "data.tif", array)
+    image_stack = MemmapTiffImageStack.from_tiff(tmp_path / "data.tif", "SYX")
+
+    buffer = pickle.dumps(image_stack)
+    assert len(buffer) < array.nbytes / 100
+
+    unpickled = pickle.loads(buffer)
+    assert unpickled._data is None
+    patch = unpickled.extract_patch(1, (10, 20), (8, 8))
+    assert np.array_equal(patch[0], array[1, 10:18, 20:28])
+
+
+@pytest.mark.parametrize(
+    "sample_idx, coords, error",
+    [
+        (2, (0, 0), IndexError),
+        (-1, (0, 0), IndexError),
+        (0, (-1, 0), ValueError),
+        (0, (0, -4), ValueError),
+        (0, (0, 28), ValueError),
+    ],
+)
+def test_out_of_bounds(tmp_path, ordered_array, sample_idx, coords, error):
+    """Test that out of bounds patches raise an error, rather than wrapping around."""
+    array = ordered_array((2, 32, 32), dtype=np.float32)
+    tifffile.imwrite(tmp_path / "data.tif", array)
+    image_stack = MemmapTiffImageStack.from_tiff(tmp_path / "data.tif", "SYX")
+
+    with pytest.raises(error):
+        image_stack.extract_patch(sample_idx, coords, (8, 8))
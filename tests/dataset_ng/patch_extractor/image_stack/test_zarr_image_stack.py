@@ -0,0 +1,145 @@
+import pickle
+
+import numpy as np
+import pytest
+import zarr
+
+from careamics.dataset.dataset_utils import reshape_array
+from careamics.dataset_ng.patch_extractor.image_stack import ZarrImageStack
+
+
+@pytest.mark.parametrize(
+    "axes, shape, chunks, patch_size",
+    [
+        ("YX", (32, 48), (8, 16), (8, 8)),
+        ("SYX", (3, 32, 48), (1, 8, 16), (8, 8)),
+        ("CYX", (2, 32, 48), (1, 10, 10), (16, 8)),
+        ("YXS", (32, 48, 2), (8, 8, 1), (8, 8)),
+        ("TSCYX", (2, 3, 2, 32, 32), (1, 1, 2, 16, 16), (8, 8)),
+        ("SZYX", (2, 16, 32, 32), (1, 4, 8, 8), (8, 8, 8)),
+        ("XCYT", (32, 2, 24, 3), (16, 2, 8, 1), (4, 8)),
+    ],
+)
+def test_extract_patch(tmp_path, ordered_array, axes, shape, chunks, patch_size):
+    """Test that the patches match those of the array reshaped to SC(Z)YX."""
+    array = ordered_array(shape, dtype=np.float32)
+    zarr.save_array(str(tmp_path / "data.zarr"), array, chunks=chunks)
+    image_stack = ZarrImageStack.from_zarr(tmp_path / "data.zarr", axes, None)
+
+    expected = reshape_array(array, axes)
+    assert tuple(image_stack.data_shape) == expected.shape
+
+    rng = np.random.default_rng(42)
+    spatial_shape = np.array(expected.shape[2:])
+    for _ in range(10):
+        sample_idx = int(rng.integers(expected.shape[0]))
+        coords = rng.integers(0, spatial_shape - np.array(patch_size), endpoint=True)
+        patch = image_stack.extract_patch(sample_idx, coords, patch_size)
+
+        slices = tuple(slice(c, c + p) for c, p in zip(coords, patch_size))
+        assert np.array_equal(patch, expected[(sample_idx, ..., *slices)])
+
+
+def test_group_data_path(tmp_path, ordered_array):
+    """Test reading an array within a zarr group."""
+    array = ordered_array((2, 32, 32), dtype=np.float32)
+    group = zarr.open_group(str(tmp_path / "data.zarr"), mode="w")
+    group.create_dataset("0", data=array, chunks=(1, 8, 8))
+
+    image_stack = ZarrImageStack.from_zarr(tmp_path / "data.zarr", "SYX")
+    patch = image_stack.extract_patch(1, (4, 12), (8, 8))
+
+    assert np.array_equal(patch[0], array[1, 4:12, 12:20])
+
+
+def test_chunk_cache(monkeypatch, tmp_path, ordered_array):
+    """Test that decoded chunks are cached, within the cache size."""
+    array = ordered_array((64, 64), dtype=np.float32)
+    zarr.save_array(str(tmp_path / "data.zarr"), array, chunks=(16, 16))
+    chunk_nbytes = 16 * 16 * 4
+    image_stack = ZarrImageStack.from_zarr(
+        tmp_path / "data.zarr", "YX", None, chunk_cache_size=2 * chunk_nbytes
+    )
+
+    # count the reads of the zarr array
+    reads = []
+    getitem = zarr.Array.__getitem__
+
+    def _getitem(self, selection):
+        reads.append(selection)
+        return getitem(self, selection)
+
+    monkeypatch.setattr(zarr.Array, "__getitem__", _getitem)
+
+    # a patch spanning 2 chunks
+    image_stack.extract_patch(0, (0, 8), (8, 16))
+    assert len(reads) == 2
+    assert list(image_stack._chunk_cache) == [(0, 0), (0, 1)]
+
+    # cached chunks are not read again, and become the most recently used
+    patch = image_stack.extract_patch(0, (4, 4), (8, 8))
+    assert len(reads) == 2
+    assert np.array_equal(patch[0], array[4:12, 4:12])
+    assert list(image_stack._chunk_cache) == [(0, 1), (0, 0)]
+
+    # the least recently used chunk is evicted
+    patch = image_stack.extract_patch(0, (16, 0), (8, 8))
+    assert len(reads) == 3
+    assert np.array_equal(patch[0], array[16:24, 0:8])
+    assert list(image_stack._chunk_cache) == [(0, 0), (1, 0)]
+    assert image_stack._chunk_cache_nbytes == 2 * chunk_nbytes
+
+
+def test_no_chunk_cache(tmp_path, ordered_array):
+    """Test that chunks are not cached with a cache size of 0."""
+    array = ordered_array((32, 32), dtype=np.float32)
+    zarr.save_array(str(tmp_path / "data.zarr"), array, chunks=(16, 16))
+    image_stack = ZarrImageStack.from_zarr(
+        tmp_path / "data.zarr", "YX", None, chunk_cache_size=0
+    )
+
+    patch = image_stack.extract_patch(0, (8, 8), (16, 16))
+    assert np.array_equal(patch[0], array[8:24, 8:24])
+    assert len(image_stack._chunk_cache) == 0
+
+
+def test_pickling(tmp_path, ordered_array):
+    """Test that the array handle and the chunk cache are not pickled."""
+    array = ordered_array((2, 32, 32), dtype=np.float32)
+    zarr.save_array(str(tmp_path / "data.zarr"), array, chunks=(1, 16, 16))
+    image_stack = ZarrImageStack.from_zarr(tmp_path / "data.zarr", "SYX", None)
+    image_stack.extract_patch(0, (0, 0), (8, 8))
+
+    unpickled = pickle.loads(pickle.dumps(image_stack))
+    assert unpickled._array is None
+    assert len(unpickled._chunk_cache) == 0
+
+    patch = unpickled.extract_patch(1, (10, 20), (8, 8))
+    assert np.array_equal(patch[0], array[1, 10:18, 20:28])
+
+
+@pytest.mark.parametrize(
+    "sample_idx, coords, error",
+    [
+        (2, (0, 0), IndexError),
+        (-1, (0, 0), IndexError),
+        (0, (-1, 0), ValueError),
+        (0, (0, 28), ValueError),
+    ],
+)
+def test_out_of_bounds(tmp_path, ordered_array, sample_idx, coords, error):
+    """Test that out of bounds patches raise an error."""
+    array = ordered_array((2, 32, 32), dtype=np.float32)
+    zarr.save_array(str(tmp_path / "data.zarr"), array, chunks=(1, 16, 16))
+    image_stack = ZarrImageStack.from_zarr(tmp_path / "data.zarr", "SYX", None)
+
+    with pytest.raises(error):
+        image_stack.extract_patch(sample_idx, coords, (8, 8))
+
+
+def test_wrong_axes(tmp_path, ordered_array):
+    """Test that axes not matching the array raise an error."""
+    zarr.save_array(str(tmp_path / "data.zarr"), ordered_array((2, 32, 32)))
+
+    with pytest.raises(ValueError):
+        ZarrImageStack.from_zarr(tmp_path / "data.zarr", "YX", None)
@@ -0,0 +1,132 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from careamics.dataset_ng.patch_extractor import (
+    PatchExtractor,
+    PatchSpecs,
+    PatchSpecsArray,
+)
+
+
+@pytest.fixture
+def patch_specs() -> PatchSpecsArray:
+    return PatchSpecsArray(
+        data_idx=np.array([0, 0, 1, 1], dtype=np.int32),
+        sample_idx=np.array([0, 1, 0, 2], dtype=np.int32),
+        coords=np.array([[0, 0], [4, 8], [12, 2], [6, 6]], dtype=np.int32),
+        patch_size=(8, 8),
+    )
+
+
+def test_indexing(patch_specs):
+    """Test that indexing returns patch specs with python integers."""
+    assert len(patch_specs) == 4
+
+    spec = patch_specs[2]
+    assert spec == PatchSpecs(
+        data_idx=1, sample_idx=0, coords=(12, 2), patch_size=(8, 8)
+    )
+    assert type(spec["data_idx"]) is int
+    assert all(type(c) is int for c in spec["coords"])
+
+    assert patch_specs[-1] == patch_specs[3]
+    assert list(patch_specs)[1]["coords"] == (4, 8)
+
+
+def test_slicing(patch_specs):
+    """Test that slicing returns a view of the arrays."""
+    sliced = patch_specs[1:3]
+
+    assert isinstance(sliced, PatchSpecsArray)
+    assert len(sliced) == 2
+    assert sliced[0] == patch_specs[1]
+    assert np.shares_memory(sliced.coords, patch_specs.coords)
+
+
+def test_concatenate(patch_specs):
+    """Test concatenating patch specs arrays, including none."""
+    concatenated = PatchSpecsArray.concatenate(
+        [patch_specs[:1], patch_specs[2:]], (8, 8)
+    )
+    assert [concatenated[i] for i in range(3)] == [
+        patch_specs[0],
+        patch_specs[2],
+        patch_specs[3],
+    ]
+
+    empty = PatchSpecsArray.concatenate([], (8, 8, 8))
+    assert len(empty) == 0
+    assert empty.coords.shape == (0, 3)
+
+
+def test_pickling(patch_specs):
+    """Test that the patch specs array can be sent to dataloader workers."""
+    unpickled = pickle.loads(pickle.dumps(patch_specs))
+
+    assert list(unpickled) == list(patch_specs)
+
+
+def test_mismatching_arrays():
+    """Test that arrays of different lengths or dimensions raise an error."""
+    with pytest.raises(ValueError):
+        PatchSpecsArray(
+            data_idx=np.zeros(3, dtype=np.int32),
+            sample_idx=np.zeros(2, dtype=np.int32),
+            coords=np.zeros((3, 2), dtype=np.int32),
+            patch_size=(8, 8),
+        )
+
+    with pytest.raises(ValueError):
+        PatchSpecsArray(
+            data_idx=np.zeros(3, dtype=np.int32),
+            sample_idx=np.zeros(3, dtype=np.int32),
+            coords=np.zeros((3, 3), dtype=np.int32),
+            patch_size=(8, 8),
+        )
+
+
+def test_extract_patches(patch_specs, ordered_array):
+    """Test that patches can be extracted from the patch specs array."""
+    arrays = [ordered_array((2, 32, 32)), ordered_array((3, 32, 32)) + 1]
+    patch_extractor = PatchExtractor.from_arrays(arrays, axes="SYX")
+
+    patches = patch_extractor.extract_patches(patch_specs)
+
+    assert len(patches) == 4
+    assert np.array_equal(patches[3][0], arrays[1][2, 6:14, 6:14])
+
+
+@pytest.mark.parametrize("as_list", [False, True])
+def test_extract_patch_batch(patch_specs, ordered_array, as_list):
+    """Test that the batch of patches matches the patches extracted one by one."""
+    arrays = [
+        ordered_array((2, 2, 32, 32), dtype=np.uint16),
+        ordered_array((3, 2, 32, 32), dtype=np.uint16) + 1,
+    ]
+    patch_extractor = PatchExtractor.from_arrays(arrays, axes="SCYX")
+    specs = list(patch_specs) if as_list else patch_specs
+
+    batch = patch_extractor.extract_patch_batch(specs)
+
+    assert batch.shape == (4, 2, 8, 8)
+    assert batch.dtype == np.float32
+    for patch, spec in zip(batch, specs):
+        assert np.array_equal(patch, patch_extractor.extract_patch(**spec))
+
+
+def test_extract_patch_batch_out(patch_specs, ordered_array):
+    """Test extracting a batch of patches into a preallocated array."""
+    arrays = [ordered_array((2, 32, 32)), ordered_array((3, 32, 32)) + 1]
+    patch_extractor = PatchExtractor.from_arrays(arrays, axes="SYX")
+    out = np.zeros((4, 1, 8, 8), dtype=np.float64)
+
+    batch = patch_extractor.extract_patch_batch(patch_specs, out=out)
+
+    assert batch is out
+    for patch, spec in zip(batch, patch_specs):
+        assert np.array_equal(patch, patch_extractor.extract_patch(**spec))
+
+    with pytest.raises(ValueError):
+        patch_extractor.extract_patch_batch(patch_specs, out=out[:3])
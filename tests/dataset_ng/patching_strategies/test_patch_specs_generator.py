@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+import zarr
+
+from careamics.dataset_ng.patch_extractor import PatchSpecsArray
+from careamics.dataset_ng.patch_extractor.image_stack import ZarrImageStack
+from careamics.dataset_ng.patching_strategies import (
+    ChunkedPatchSpecsGenerator,
+    RandomPatchSpecsGenerator,
+)
+
+
+@pytest.mark.parametrize(
+    "data_shapes, patch_size",
+    [
+        ([(2, 1, 32, 32), (1, 1, 19, 37)], (8, 8)),
+        ([(3, 2, 16, 32, 32)], (8, 16, 16)),
+    ],
+)
+def test_random_patch_specs(data_shapes, patch_size):
+    """Test the number, bounds and samples of the random patch specs."""
+    generator = RandomPatchSpecsGenerator(data_shapes)
+    patch_specs = generator.generate(patch_size, seed=42)
+
+    assert isinstance(patch_specs, PatchSpecsArray)
+    assert len(patch_specs) == generator.n_patches(patch_size, seed=42)
+
+    for data_idx, data_shape in enumerate(data_shapes):
+        selected = patch_specs.data_idx == data_idx
+        coords = patch_specs.coords[selected]
+        assert np.all(coords >= 0)
+        assert np.all(coords + np.array(patch_size) <= np.array(data_shape[2:]))
+
+        # each sample has the same number of patches
+        counts = np.bincount(patch_specs.sample_idx[selected])
+        assert len(counts) == data_shape[0]
+        assert np.all(counts == counts[0])
+
+
+def test_random_patch_specs_seed():
+    """Test that the patch specs are reproducible with the same seed."""
+    generator = RandomPatchSpecsGenerator([(2, 1, 64, 64)])
+
+    patch_specs = generator.generate((8, 8), seed=1)
+
+    assert np.array_equal(patch_specs.coords, generator.generate((8, 8), 1).coords)
+    assert not np.array_equal(patch_specs.coords, generator.generate((8, 8), 2).coords)
+
+
+def _chunk_keys(patch_specs, image_stacks, last=True):
+    """(data, sample, first chunk, last chunk) key of every patch, or (data, sample,
+    first chunk) if `last` is False."""
+    keys = []
+    for data_idx, sample_idx, coords in zip(
+        patch_specs.data_idx, patch_specs.sample_idx, patch_specs.coords
+    ):
+        chunks = np.array(image_stacks[data_idx].data_chunks[-len(coords) :])
+        first = np.array(coords) // chunks
+        key = (int(data_idx), int(sample_idx), tuple(first.tolist()))
+        if last:
+            last_chunk = (np.array(coords) + patch_specs.patch_size - 1) // chunks
+            key += (tuple(last_chunk.tolist()),)
+        keys.append(key)
+    return keys
+
+
+def _n_runs(keys):
+    """Number of runs of consecutive identical keys."""
+    return sum(i == 0 or key != keys[i - 1] for i, key in enumerate(keys))
+
+
+@pytest.fixture
+def chunked_stacks(tmp_path):
+    """Chunked zarr image stacks of different shapes."""
+    image_stacks = []
+    for i, (shape, chunks) in enumerate(
+        [((2, 64, 64), (1, 16, 32)), ((1, 48, 40), (1, 16, 16))]
+    ):
+        path = tmp_path / f"data{i}.zarr"
+        zarr.save_array(str(path), np.zeros(shape, dtype=np.float32), chunks=chunks)
+        image_stacks.append(ZarrImageStack.from_zarr(path, "SYX", None))
+    return image_stacks
+
+
+def test_chunked_patch_specs_runs(chunked_stacks):
+    """Test that the patches overlapping the same chunks form one contiguous run,
+    and the patches sharing their first chunk consecutive runs."""
+    generator = ChunkedPatchSpecsGenerator(
+        [stack.data_shape for stack in chunked_stacks],
+        [stack.data_chunks for stack in chunked_stacks],
+    )
+    patch_specs = generator.generate((8, 8), seed=42)
+    assert len(patch_specs) == generator.n_patches((8, 8), seed=42)
+
+    keys = _chunk_keys(patch_specs, chunked_stacks)
+    assert _n_runs(keys) == len(set(keys))
+    first_keys = _chunk_keys(patch_specs, chunked_stacks, last=False)
+    assert _n_runs(first_keys) == len(set(first_keys))
+
+    # some patches straddle chunk boundaries
+    assert len(set(keys)) > len(set(first_keys))
+
+    # same patches as the random generator, in a different order
+    random_specs = RandomPatchSpecsGenerator(
+        [stack.data_shape for stack in chunked_stacks]
+    ).generate((8, 8), seed=42)
+    assert sorted(keys) == sorted(_chunk_keys(random_specs, chunked_stacks))
+
+
+@pytest.mark.parametrize("batch_size, num_workers", [(4, 2), (5, 3)])
+def test_chunked_patch_specs_workers(chunked_stacks, batch_size, num_workers):
+    """Test that each run is read by a single worker, apart from the last runs."""
+    generator = ChunkedPatchSpecsGenerator(
+        [stack.data_shape for stack in chunked_stacks],
+        [stack.data_chunks for stack in chunked_stacks],
+        batch_size=batch_size,
+        num_workers=num_workers,
+    )
+    patch_specs = generator.generate((8, 8), seed=42)
+    assert len(patch_specs) == generator.n_patches((8, 8), seed=42)
+
+    # batches are sent to the workers in turn
+    workers: dict[tuple, set[int]] = {}
+    for i, key in enumerate(_chunk_keys(patch_specs, chunked_stacks)):
+        workers.setdefault(key, set()).add((i // batch_size) % num_workers)
+
+    n_shared = sum(len(key_workers) > 1 for key_workers in workers.values())
+    assert n_shared <= num_workers
+    assert n_shared < len(workers) / 4
+
+
+@pytest.mark.parametrize("n_workers", [0, 2])
+def test_chunked_patch_specs_distributed(chunked_stacks, n_workers):
+    """Test that the strided subsets of a distributed sampler without shuffling
+    receive separate runs, dealt to the workers of each rank."""
+    batch_size, world_size = 4, 2
+    generator = ChunkedPatchSpecsGenerator(
+        [stack.data_shape for stack in chunked_stacks],
+        [stack.data_chunks for stack in chunked_stacks],
+        batch_size=batch_size,
+        num_workers=n_workers,
+        world_size=world_size,
+    )
+    patch_specs = generator.generate((8, 8), seed=42)
+    keys = _chunk_keys(patch_specs, chunked_stacks)
+
+    # every patch is sent to a single rank, as by DistributedSampler(shuffle=False)
+    ranks: dict[tuple, set[int]] = {}
+    readers: dict[tuple, set[tuple[int, int]]] = {}
+    for rank in range(world_size):
+        rank_keys = keys[rank::world_size]
+        for i, key in enumerate(rank_keys):
+            ranks.setdefault(key, set()).add(rank)
+            worker_id = (i // batch_size) % max(n_workers, 1)
+            readers.setdefault(key, set()).add((rank, worker_id))
+
+    # only the runs at the boundary of the ranks, or shared at the end of the
+    # epoch by the workers of a rank, are read by several ranks or workers
+    assert sum(len(key_ranks) > 1 for key_ranks in ranks.values()) <= world_size - 1
+    n_shared = sum(len(key_readers) > 1 for key_readers in readers.values())
+    assert n_shared <= world_size * max(n_workers, 1)
+    assert n_shared < len(readers) / 4
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+import tifffile
+import zarr
+
+from careamics.config.support import SupportedData
+from careamics.file_io.read import (
+    ImageMetadata,
+    read_metadata,
+    read_tiff_metadata,
+    read_zarr_metadata,
+)
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_read_tiff_metadata(tmp_path, compression):
+    """Test reading the shape and data type of a tiff file from its header."""
+    array = np.zeros((3, 32, 64), dtype=np.uint16)
+    file = tmp_path / "image.tif"
+    tifffile.imwrite(file, array, compression=compression)
+
+    metadata = read_tiff_metadata(file)
+    assert metadata.shape == array.shape
+    assert metadata.dtype == array.dtype
+    assert metadata.nbytes == array.nbytes
+
+
+def test_read_tiff_metadata_invalid(tmp_path):
+    """Test that files that are not tiff raise an error."""
+    file = tmp_path / "image.txt"
+    file.write_text("test")
+
+    with pytest.raises(ValueError):
+        read_tiff_metadata(file)
+
+
+def test_read_zarr_metadata(tmp_path):
+    """Test reading the shape and data type of zarr arrays and groups."""
+    path = tmp_path / "array.zarr"
+    zarr.open(str(path), mode="w", shape=(4, 16, 16), chunks=(1, 8, 8), dtype="u1")
+    metadata = read_zarr_metadata(path)
+    assert metadata == ImageMetadata((4, 16, 16), np.dtype("u1"))
+
+    path = tmp_path / "group.zarr"
+    group = zarr.open_group(str(path), mode="w")
+    group.create_dataset("0", shape=(16, 16), dtype="f4")
+    assert read_zarr_metadata(path).shape == (16, 16)
+    assert read_metadata(path, SupportedData.CUSTOM).dtype == np.float32
+
+
+def test_read_metadata_custom(tmp_path):
+    """Test reading the metadata of custom files, with a metadata function or by
+    reading the file."""
+    array = np.ones((8, 16), dtype=np.float64)
+    file = tmp_path / "image.npy"
+    np.save(file, array)
+
+    def read_npy_metadata(file_path, *args, **kwargs):
+        mmap = np.load(file_path, mmap_mode="r")
+        return ImageMetadata(mmap.shape, mmap.dtype)
+
+    def read_npy(file_path, *args, **kwargs):
+        return np.load(file_path)
+
+    for kwargs in (
+        {"read_metadata_func": read_npy_metadata},
+        {"read_source_func": read_npy},
+    ):
+        metadata = read_metadata(file, SupportedData.CUSTOM, **kwargs)
+        assert metadata.shape == array.shape
+        assert metadata.nbytes == array.nbytes
+
+    with pytest.raises(ValueError):
+        read_metadata(file, SupportedData.CUSTOM)
@@ -1,3 +1,5 @@
+import warnings
+
 import pytest
 import torch
 
@@ -373,3 +375,52 @@ def test_prediction_callback_during_training(minimum_n2v_configuration, tiled):
     engine.train(train_source=array)
 
     assert not np.allclose(array, predict_after_val_callback.data)
+
+
+def test_device_transforms_during_training(minimum_n2v_configuration):
+    import numpy as np
+
+    from careamics import CAREamist
+    from careamics.config import Configuration
+
+    minimum_n2v_configuration["data_config"]["device_transforms"] = True
+    config = Configuration(**minimum_n2v_configuration)
+
+    # record the means of the batches entering the model
+    batch_means = []
+    array = np.arange(64 * 64, dtype=np.float32).reshape((64, 64))
+    engine = CAREamist(config)
+    engine.model.model.register_forward_pre_hook(
+        lambda module, inputs: batch_means.append(inputs[0].mean().item())
+    )
+    with warnings.catch_warnings():
+        warnings.filterwarnings("error", message=".*on_after_batch_transfer.*")
+        engine.train(train_source=array)
+
+    # the batches are normalized in the module, not in the dataset
+    assert engine.model.batch_transform is not None
+    assert engine.train_datamodule.train_dataset.patch_transform.transforms == []
+    assert len(batch_means) > 0
+    assert all(abs(mean) < 5 for mean in batch_means)
+
+
+def test_device_transforms_without_datamodule(minimum_n2v_configuration):
+    """Test that an error is raised if the batched transforms cannot be created."""
+    import numpy as np
+    from pytorch_lightning import Trainer
+    from torch.utils.data import DataLoader
+
+    from careamics.config import Configuration
+    from careamics.dataset import InMemoryDataset
+
+    minimum_n2v_configuration["data_config"]["device_transforms"] = True
+    config = Configuration(**minimum_n2v_configuration)
+
+    array = np.arange(64 * 64, dtype=np.float32).reshape((64, 64))
+    dataset = InMemoryDataset(data_config=config.data_config, inputs=array)
+    dataloader = DataLoader(dataset, batch_size=config.data_config.batch_size)
+
+    module = FCNModule(config.algorithm_config)
+    trainer = Trainer(max_epochs=1, logger=False, enable_checkpointing=False)
+    with pytest.raises(ValueError, match="device_transforms"):
+        trainer.fit(module, train_dataloaders=dataloader)
@@ -1,6 +1,7 @@
 import numpy as np
 import pytest
 from tifffile import imwrite
+from torch.utils.data import SequentialSampler
 
 from careamics.config import DataConfig
 from careamics.config.support import (
@@ -8,7 +9,12 @@ from careamics.config.support import (
     SupportedTransform,
 )
 from careamics.config.transformations import N2VManipulateModel, XYFlipModel
-from careamics.dataset import InMemoryDataset, PathIterableDataset
+from careamics.dataset import (
+    HybridIterableDataset,
+    InMemoryDataset,
+    PathIterableDataset,
+)
+from careamics.dataset_ng.dataset import CareamicsDataset
 from careamics.lightning import TrainDataModule, create_train_datamodule
 
 
@@ -159,3 +165,162 @@ def test_get_data_statistics(tmp_path):
     means, stds = data_module.get_data_statistics()
     assert np.allclose(means, data_mean)
     assert np.allclose(stds, data_std)
+
+
+@pytest.mark.parametrize(
+    "memory_budget_mb, use_in_memory, expected_dataset",
+    [
+        (None, True, InMemoryDataset),
+        (0.02, True, HybridIterableDataset),
+        (None, False, PathIterableDataset),
+    ],
+)
+def test_memory_budget(tmp_path, memory_budget_mb, use_in_memory, expected_dataset):
+    """Test that the dataset is chosen according to the memory budget and the
+    decoded size of the files."""
+    data = np.zeros((32, 32), dtype=np.float32)
+    for i in range(6):
+        # compressed files are much smaller on disk than decoded
+        imwrite(tmp_path / f"data_{i}.tif", data, compression="zlib")
+
+    data_config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=(16, 16),
+        axes="YX",
+        batch_size=2,
+        memory_budget_mb=memory_budget_mb,
+    )
+    data_module = TrainDataModule(
+        data_config=data_config,
+        train_data=tmp_path,
+        val_minimum_split=2,
+        use_in_memory=use_in_memory,
+    )
+    data_module.prepare_data()
+    assert data_module.train_files_size == 6 * data.nbytes / 1024**2
+
+    data_module.setup()
+    assert type(data_module.train_dataset) is expected_dataset
+
+    # the 4kB files are compressed, but only 5 of them fit in a 20kB budget
+    if expected_dataset is HybridIterableDataset:
+        assert (
+            data_module.train_dataset.get_number_of_cached_files()
+            + (data_module.val_dataset.get_number_of_cached_files())
+            == 5
+        )
+
+
+@pytest.mark.parametrize("use_in_memory", [True, False])
+def test_next_gen_dataset(tmp_path, use_in_memory):
+    """Test the next-generation dataset with files, split for validation."""
+    rng = np.random.default_rng(42)
+    data = rng.integers(0, 255, (6, 3, 32, 32)).astype(np.float32)
+    for i in range(data.shape[0]):
+        imwrite(tmp_path / f"data_{i}.tif", data[i])
+
+    data_config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=(16, 16),
+        axes="CYX",
+        batch_size=2,
+        transforms=[],
+        use_next_gen_dataset=True,
+        patch_seed=42,
+    )
+    data_module = TrainDataModule(
+        data_config=data_config,
+        train_data=tmp_path,
+        val_minimum_split=2,
+        use_in_memory=use_in_memory,
+    )
+    data_module.prepare_data()
+    data_module.setup()
+    assert isinstance(data_module.train_dataset, CareamicsDataset)
+    assert isinstance(data_module.val_dataset, CareamicsDataset)
+
+    # 4 patches per 32x32 image, 2 images held out for validation
+    train_dataset = data_module.train_dataset
+    assert len(train_dataset) == 4 * 4
+    assert len(data_module.val_dataset) == 2 * 4
+
+    means, stds = data_module.get_data_statistics()
+    assert np.allclose(means, data.mean(axis=(0, 2, 3)))
+    assert np.allclose(stds, data.std(axis=(0, 2, 3)))
+
+    # patches are redrawn at each epoch, deterministically
+    (patch,) = train_dataset[0]
+    assert patch.shape == (3, 16, 16)
+    train_dataset.set_epoch(1)
+    specs_epoch_1 = train_dataset.patch_specs.coords.copy()
+    train_dataset.set_epoch(0)
+    assert np.array_equal(train_dataset[0][0], patch)
+    assert not np.array_equal(train_dataset.patch_specs.coords, specs_epoch_1)
+
+    # shuffling is supported
+    batch = next(iter(data_module.train_dataloader()))
+    assert batch[0].shape == (2, 3, 16, 16)
+
+
+def test_next_gen_dataset_array_split():
+    """Test that a single array is split by patches for validation."""
+    rng = np.random.default_rng(42)
+    data = rng.integers(0, 255, (20, 64, 64)).astype(np.float32)
+
+    data_config = DataConfig(
+        data_type=SupportedData.ARRAY.value,
+        patch_size=(16, 16),
+        axes="SYX",
+        batch_size=4,
+        transforms=[],
+        use_next_gen_dataset=True,
+        patch_seed=42,
+    )
+    data_module = TrainDataModule(data_config=data_config, train_data=data)
+    data_module.prepare_data()
+    data_module.setup()
+
+    # 16 patches per sample, 10% of them (32) split off for validation
+    assert len(data_module.train_dataset) == 20 * 16
+    assert len(data_module.val_dataset) == 32
+
+    # the validation patches are drawn once
+    val_dataset = data_module.val_dataset
+    val_coords = val_dataset.patch_specs.coords.copy()
+    val_dataset.set_epoch(1)
+    assert np.array_equal(val_dataset.patch_specs.coords, val_coords)
+
+    batch = next(iter(data_module.val_dataloader()))
+    assert batch[0].shape == (4, 1, 16, 16)
+
+
+def test_next_gen_chunk_aware_patching(tmp_path):
+    """Test that chunk-aware patches are emitted in runs, without shuffling."""
+    rng = np.random.default_rng(42)
+    data = rng.integers(0, 255, (6, 32, 32)).astype(np.float32)
+    for i in range(data.shape[0]):
+        imwrite(tmp_path / f"data_{i}.tif", data[i])
+
+    data_config = DataConfig(
+        data_type=SupportedData.TIFF.value,
+        patch_size=(8, 8),
+        axes="YX",
+        batch_size=2,
+        transforms=[],
+        use_next_gen_dataset=True,
+        patch_seed=42,
+        chunk_aware_patching=True,
+    )
+    data_module = TrainDataModule(
+        data_config=data_config,
+        train_data=tmp_path,
+        val_minimum_split=2,
+    )
+    data_module.prepare_data()
+    data_module.setup()
+
+    # tiff stacks have no chunks, the patches of each image form a single run
+    data_idx = data_module.train_dataset.patch_specs.data_idx
+    assert len(data_idx) == 4 * 16
+    assert np.count_nonzero(np.diff(data_idx)) == 3
+    assert isinstance(data_module.train_dataloader().sampler, SequentialSampler)
@@ -120,3 +120,37 @@ def test_compose_additional_arrays(ordered_array):
         array, **additional_arrays
     )
     assert np.array_equal(augmented, additional_augmented["arr"])
+
+
+@pytest.mark.parametrize("shape", [(2, 8, 8), (1, 4, 8, 8)])
+def test_fused_composition(ordered_array, shape):
+    """Test that the fused chain matches the transforms applied one by one."""
+    rng = np.random.default_rng(seed=42)
+    array = ordered_array(shape)
+    target = ordered_array(shape) + 5
+
+    for i in range(20):
+        transforms = [
+            NormalizeModel(
+                image_means=[0.5 for _ in range(shape[0])],
+                image_stds=[2.0 for _ in range(shape[0])],
+                target_means=[0.5 for _ in range(shape[0])],
+                target_stds=[2.0 for _ in range(shape[0])],
+            ),
+            XYFlipModel(seed=i),
+            XYRandomRotate90Model(seed=i + 1),
+        ]
+        rng.shuffle(transforms)
+
+        fused = Compose(transforms)
+        chained = Compose(transforms)
+        assert fused._fused
+
+        for _ in range(4):
+            fused_array, fused_target = fused(array, target)
+            chained_array, chained_target = chained._chain_transforms(array, target)
+
+            assert fused_array.dtype == np.float32
+            assert fused_array.flags.c_contiguous
+            assert np.allclose(fused_array, chained_array)
+            assert np.allclose(fused_target, chained_target)
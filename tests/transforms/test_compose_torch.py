@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+import torch
+
+from careamics.config.transformations import (
+    NormalizeModel,
+    XYFlipModel,
+    XYRandomRotate90Model,
+)
+from careamics.transforms import ComposeTorch, Normalize
+
+
+def _is_flip_or_rotation(patch: np.ndarray, original: np.ndarray) -> bool:
+    """Return whether a patch is a flip and 90 degree rotation of another."""
+    candidates = [
+        np.rot90(p, k, axes=(-2, -1))
+        for p in (original, np.flip(original, axis=-1))
+        for k in range(4)
+    ]
+    return any(np.array_equal(patch, c) for c in candidates)
+
+
+def test_normalization(ordered_array):
+    array = ordered_array((4, 2, 8, 8))
+    means = [float(array[:, 0].mean()), float(array[:, 1].mean())]
+    stds = [float(array[:, 0].std()), float(array[:, 1].std())]
+
+    compose = ComposeTorch([NormalizeModel(image_means=means, image_stds=stds)])
+    (batch,) = compose(torch.from_numpy(array))
+
+    normalize = Normalize(image_means=means, image_stds=stds)
+    expected = np.stack([normalize(patch)[0] for patch in array])
+
+    assert batch.dtype == torch.float32
+    assert np.allclose(batch.numpy(), expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("shape", [(16, 1, 8, 8), (16, 2, 4, 6, 6)])
+def test_flips_and_rotations(ordered_array, shape):
+    array = ordered_array(shape)
+    target = array + 1
+
+    compose = ComposeTorch(
+        [
+            XYFlipModel(name="XYFlip", seed=42),
+            XYRandomRotate90Model(name="XYRandomRotate90", seed=42),
+        ]
+    )
+    batch, batch_target = compose(torch.from_numpy(array), torch.from_numpy(target))
+
+    # each patch is transformed independently, and as its target
+    n_changed = 0
+    for i in range(shape[0]):
+        patch = batch[i].numpy()
+        assert _is_flip_or_rotation(patch, array[i])
+        assert np.array_equal(batch_target[i].numpy(), patch + 1)
+        n_changed += not np.array_equal(patch, array[i])
+
+    assert 0 < n_changed < shape[0]
+
+
+def test_seeded_compose(ordered_array):
+    array = torch.from_numpy(ordered_array((8, 1, 8, 8)))
+    transforms = [
+        XYFlipModel(name="XYFlip", seed=1),
+        XYRandomRotate90Model(name="XYRandomRotate90", seed=1),
+    ]
+
+    (batch_1,) = ComposeTorch(transforms)(array)
+    (batch_2,) = ComposeTorch(transforms)(array)
+
+    assert torch.equal(batch_1, batch_2)
+
+
+def test_rotation_non_square(ordered_array):
+    array = torch.from_numpy(ordered_array((2, 1, 8, 6)))
+    compose = ComposeTorch([XYRandomRotate90Model(name="XYRandomRotate90")])
+
+    with pytest.raises(ValueError):
+        compose(array)
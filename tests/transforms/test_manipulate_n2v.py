@@ -57,3 +57,72 @@ def test_manipulate_n2v_torch(strategy):
     diff_coords = torch.nonzero(tr_patch != orig_patch, as_tuple=False).T
     mask_coords = torch.nonzero(mask == 1, as_tuple=False).T
     assert torch.equal(diff_coords, mask_coords)
+
+
+@pytest.mark.parametrize(
+    "strategy",
+    [SupportedPixelManipulation.UNIFORM.value, SupportedPixelManipulation.MEDIAN.value],
+)
+@pytest.mark.parametrize("struct_mask_axis", ["none", "horizontal"])
+def test_manipulate_n2v_multichannel(strategy, struct_mask_axis):
+    """Test that the channels are masked independently, within their own values."""
+    # channels with disjoint ranges of values
+    array = np.stack(
+        [np.arange(32 * 32).reshape((32, 32)) + 10_000 * c for c in range(3)]
+    ).astype(np.float32)
+
+    aug = N2VManipulate(
+        roi_size=5,
+        masked_pixel_percentage=2,
+        strategy=strategy,
+        struct_mask_axis=struct_mask_axis,
+        struct_mask_span=3,
+        seed=42,
+    )
+    masked, orig_patch, mask = aug(array)
+    assert mask.dtype == array.dtype
+
+    # every channel is masked, at different positions
+    assert np.all(mask.sum(axis=(1, 2)) > 0)
+    assert not np.array_equal(mask[0], mask[1])
+
+    # the replacement values come from the same channel
+    for c in range(array.shape[0]):
+        assert np.all(masked[c] >= array[c].min())
+        assert np.all(masked[c] <= array[c].max())
+
+
+@pytest.mark.parametrize(
+    "strategy",
+    [SupportedPixelManipulation.UNIFORM, SupportedPixelManipulation.MEDIAN],
+)
+@pytest.mark.parametrize("struct_mask_axis", ["none", "horizontal"])
+def test_manipulate_n2v_torch_multichannel(strategy, struct_mask_axis):
+    """Test that the channels of a batch are masked in place of their own values."""
+    # batch of 4 patches with 3 channels of disjoint ranges of values
+    array = (
+        torch.arange(32 * 32).reshape(1, 1, 32, 32)
+        + 10_000 * torch.arange(3).reshape(1, 3, 1, 1)
+    ).repeat(4, 1, 1, 1)
+    array = array.float()
+
+    config = N2VManipulateModel(
+        roi_size=5,
+        masked_pixel_percentage=2,
+        strategy=strategy.value,
+        struct_mask_axis=struct_mask_axis,
+        struct_mask_span=3,
+    )
+    aug = N2VManipulateTorch(config, seed=42)
+    masked, orig_patch, mask = aug(array)
+    assert masked.shape == mask.shape == array.shape
+
+    # the mask matches the manipulated center pixels
+    if struct_mask_axis == "none":
+        assert torch.equal(mask.bool(), masked != array)
+    assert mask.sum() > 0
+
+    # the replacement values come from the same channel
+    for c in range(array.shape[1]):
+        assert torch.all(masked[:, c] >= array[:, c].min())
+        assert torch.all(masked[:, c] <= array[:, c].max())
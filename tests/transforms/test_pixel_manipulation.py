@@ -5,12 +5,14 @@ import torch
 from careamics.transforms.pixel_manipulation import (
     _apply_struct_mask,
     _get_stratified_coords,
+    _get_stratified_grid,
     median_manipulate,
     uniform_manipulate,
 )
 from careamics.transforms.pixel_manipulation_torch import (
     _apply_struct_mask_torch,
     _get_stratified_coords_torch,
+    _get_stratified_grid_torch,
     median_manipulate_torch,
     uniform_manipulate_torch,
 )
@@ -61,6 +63,39 @@ def test_get_stratified_coords(mask_pixel_perc, shape, num_iterations):
     assert np.sum(array == 0) < np.sum(shape)
 
 
+def test_stratified_grid_cached():
+    """Test that the grid is cached and that only the jitter changes between calls."""
+    _get_stratified_grid.cache_clear()
+    rng = np.random.default_rng(42)
+
+    coords_1 = _get_stratified_coords(1, (32, 32), rng)
+    coords_2 = _get_stratified_coords(1, (32, 32), rng)
+    assert _get_stratified_grid.cache_info().hits == 1
+    assert not np.array_equal(coords_1, coords_2)
+
+    # the cached grid cannot be modified by callers
+    grid, _ = _get_stratified_grid(1.0, (32, 32))
+    assert not grid.flags.writeable
+
+    # the coordinates are within the jitter of the grid
+    assert np.all(coords_1 - grid >= 0)
+    assert np.all(coords_1 - grid < 10)
+
+
+def test_stratified_grid_torch_cached():
+    """Test that the grid is cached per device and not modified by the jitter."""
+    _get_stratified_grid_torch.cache_clear()
+    rng = torch.Generator().manual_seed(42)
+
+    _get_stratified_coords_torch(1, (4, 32, 32), rng)
+    grid, _, _ = _get_stratified_grid_torch(1.0, (4, 32, 32), torch.device("cpu"))
+    grid_copy = grid.clone()
+    _get_stratified_coords_torch(1, (4, 32, 32), rng)
+
+    assert _get_stratified_grid_torch.cache_info().hits == 2
+    assert torch.equal(grid, grid_copy)
+
+
 @pytest.mark.parametrize("shape", [(8, 8), (3, 8, 8), (8, 8, 8)])
 def test_uniform_manipulate(ordered_array, shape):
     """Test the uniform_manipulate function.
@@ -155,6 +190,35 @@ def test_median_manipulate(ordered_array, shape):
         assert transform_patch[tuple(coords)] == np.median(roi)
 
 
+@pytest.mark.parametrize("struct_axis", [0, 1])
+def test_median_manipulate_struct(ordered_array, struct_axis):
+    """Test that the median excludes the structN2V mask of the subpatch."""
+    rng = np.random.default_rng(42)
+    patch = ordered_array((32, 32)).astype(np.float32)
+    struct_params = StructMaskParameters(axis=struct_axis, span=3)
+
+    # low masking percentage, so that struct masks do not cover other masked pixels
+    transform_patch, mask = median_manipulate(
+        patch,
+        subpatch_size=5,
+        mask_pixel_percentage=1,
+        struct_params=struct_params,
+        rng=rng,
+    )
+
+    for coords in np.argwhere(mask == 1):
+        roi_mask = np.zeros(patch.shape, dtype=bool)
+        roi_mask[tuple(slice(max(0, c - 2), c + 3) for c in coords)] = True
+
+        # struct mask along the x axis (axis 0) or the y axis (axis 1)
+        moving = 1 - struct_axis
+        struct_slice = list(coords)
+        struct_slice[moving] = slice(max(0, coords[moving] - 1), coords[moving] + 2)
+        roi_mask[tuple(struct_slice)] = False
+
+        assert transform_patch[tuple(coords)] == np.median(patch[roi_mask])
+
+
 @pytest.mark.parametrize(
     "coords, struct_axis, struct_span",
     [((2, 2), 1, 5), ((3, 4), 0, 5), ((9, 0), 0, 5), (((1, 2), (3, 4)), 1, 5)],
@@ -420,9 +484,41 @@ def test_median_manipulate_torch(ordered_array, shape):
         # Remove value of ROI center from ROI
         roi = roi[roi != patch[tuple(coords)]]
 
-        # Check that the pixel value comes from the actual ROI
-        if roi.numel() == subpatch_size**2 - 1:
-            assert torch.equal(transform_patch[tuple(coords)], torch.median(roi))
+        # Check that the pixel value is the median of the ROI, cropped at the borders
+        assert torch.equal(transform_patch[tuple(coords)], torch.median(roi))
+
+
+@pytest.mark.parametrize("struct_axis", [0, 1])
+def test_median_manipulate_torch_struct(ordered_array, struct_axis):
+    """Test that the median excludes the structN2V mask of the ROI."""
+    rng = torch.Generator().manual_seed(42)
+    patch = torch.from_numpy(ordered_array((2, 32, 32))).float()
+    struct_params = StructMaskParameters(axis=struct_axis, span=3)
+
+    # low masking percentage, so that struct masks do not cover other masked pixels
+    transform_patch, mask = median_manipulate_torch(
+        patch,
+        subpatch_size=5,
+        mask_pixel_percentage=1,
+        struct_params=struct_params,
+        rng=rng,
+    )
+
+    for coords in torch.nonzero(mask == 1).tolist():
+        roi_mask = torch.zeros(patch.shape, dtype=torch.bool)
+        roi_mask[
+            (coords[0],) + tuple(slice(max(0, c - 2), c + 3) for c in coords[1:])
+        ] = True
+
+        # struct mask along the x axis (axis 0) or the y axis (axis 1)
+        moving = 2 - struct_axis
+        struct_slice: list = list(coords)
+        struct_slice[moving] = slice(max(0, coords[moving] - 1), coords[moving] + 2)
+        roi_mask[tuple(struct_slice)] = False
+
+        assert torch.equal(
+            transform_patch[tuple(coords)], torch.median(patch[roi_mask])
+        )
 
 
 @pytest.mark.parametrize(